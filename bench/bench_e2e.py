@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import stub_server
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# ====================================================================================
+# 端到端基准测试：启动本地模拟服务（stub_server），在临时目录中依次运行各个入口脚本，
+# 报告每个脚本的耗时、峰值RSS、请求数与吞吐量（请求数和行数来自 Metrics 的运行报告）
+# 脚本按顺序共享同一个 database.csv：先由 GetThread 全量爬取建立数据库，后续脚本在其上运行
+# ====================================================================================
+ENTRIES = {
+    'GetThread':             (['GetThread.py'], {'S1_CRAWL_MODE': 'full'}),
+    'GetThread-incremental': (['GetThread.py'], {'S1_CRAWL_MODE': 'incremental'}),
+    'GetThread_Lite':        (['GetThread_Lite.py'], {}),
+    'GetVote':               (['GetVote.py'], {'S1_POLL_FORCE': '1'}),
+    'GetVote_Lite':          (['GetVote_Lite.py'], {}),
+    'ProcessScore':          (['ProcessScore.py'], {}),
+    'ProcessJson':           (['ProcessJson.py'], {}),
+    'Pipeline-lite':         (['Pipeline.py', 'lite'], {}),
+    'Pipeline-daily':        (['Pipeline.py', 'daily'], {'S1_CRAWL_MODE': 'incremental'}),
+    'Pipeline-all':          (['Pipeline.py', 'all'], {}),
+}
+DEFAULT_ENTRIES = ('GetThread', 'GetThread-incremental', 'GetThread_Lite', 'GetVote',
+                   'GetVote_Lite', 'ProcessScore', 'ProcessJson', 'Pipeline-daily')
+ROW_COUNTERS = ('rows_scored', 'rows_exported', 'polls', 'threads_new', 'threads_recent')
+
+
+def entry_env(name, base_url, report_file, poll_rate=0, fids=(83,), board_workers=0, page_workers=None):
+    """运行入口脚本的环境变量（指向模拟服务，使用模拟账号）"""
+    _, extra_env = ENTRIES[name]
+    return {
+        **os.environ,
+        'S1_BASE_URL': base_url,
+        'S1_USERNAME': 'bench',
+        'S1_PASSWORD': 'bench',
+        'S1_SESSION_CACHE': '',
+        'S1_POLL_RATE': str(poll_rate),
+        'S1_METRICS_REPORT': report_file,
+        'S1_FORUM_FIDS': ','.join(str(fid) for fid in fids),
+        'S1_BOARD_WORKERS': str(board_workers),
+        **({'S1_PAGE_WORKERS': str(page_workers)} if page_workers else {}),
+        **extra_env
+    }
+
+def run_entry(name, base_url, workdir, poll_rate, fids, board_workers=0, page_workers=None):
+    """在子进程中运行一个入口脚本，返回结果字典"""
+    script, _ = ENTRIES[name]
+    report_file = os.path.join(workdir, f"report-{name}.json")
+    env = entry_env(name, base_url, report_file, poll_rate, fids, board_workers, page_workers)
+    with open(os.path.join(workdir, f"log-{name}.txt"), 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(SRC, script[0])] + script[1:],
+                                cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 返回该子进程自己的资源使用（峰值RSS不受其他子进程影响）
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+    report = {}
+    if os.path.exists(report_file):
+        with open(report_file, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    requests = report.get('totals', {}).get('requests', 0)
+    counters = report.get('counters', {})
+    rows = next((counters[key] for key in ROW_COUNTERS if key in counters), 0)
+    return {
+        'entry': name,
+        'exit_code': proc.returncode,
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),   # Linux上ru_maxrss单位为KB
+        'requests': requests,
+        'retries': report.get('totals', {}).get('retries', 0),
+        'bytes_received': report.get('totals', {}).get('bytes_received', 0),
+        'requests_per_second': round(requests / elapsed, 1) if elapsed else 0,
+        'rows': rows,
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else 0,
+        'stages': report.get('stages', {}),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='离线端到端基准测试（本地模拟Stage1st接口）')
+    parser.add_argument('--threads', type=int, default=1000, help='模拟论坛的帖子数')
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='延迟的随机波动（毫秒）')
+    parser.add_argument('--failure-rate', type=float, default=0, help='返回失败响应的概率')
+    parser.add_argument('--failure-status', type=int, default=503, help='失败响应的状态码')
+    parser.add_argument('--rate-limit', type=int, default=0, help='模拟服务每秒最多接受的请求数（0为不限流）')
+    parser.add_argument('--throttle', choices=('429', 'flood'), default='429', help='模拟服务限流时的响应方式')
+    parser.add_argument('--no-etag', action='store_true', help='模拟服务的列表页不返回ETag（不支持条件请求，与Discuz相同）')
+    parser.add_argument('--poll-rate', type=float, default=0, help='GetVote 的速率上限（次/秒，0为不限速）')
+    parser.add_argument('--fids', type=int, nargs='+', default=[83], help='模拟的板块fid（帖子轮流分配到各板块）')
+    parser.add_argument('--board-workers', type=int, default=0, help='并发爬取的板块数（0为所有板块同时爬取）')
+    parser.add_argument('--page-workers', type=int, help='全量爬取时每个板块并发请求的列表页数（1为逐页爬取，默认使用 S1_PAGE_WORKERS）')
+    parser.add_argument('--entries', nargs='+', choices=sorted(ENTRIES), default=list(DEFAULT_ENTRIES),
+                        help='按顺序运行的入口（默认从全量爬取开始）')
+    parser.add_argument('--json', help='把结果写入该JSON文件，便于跟踪性能变化')
+    parser.add_argument('--keep', action='store_true', help='保留工作目录（日志与运行报告）')
+    args = parser.parse_args()
+
+    forum = stub_server.StubForum(args.threads, latency=args.latency, jitter=args.jitter,
+                                  failure_rate=args.failure_rate, failure_status=args.failure_status,
+                                  fids=args.fids, rate_limit=args.rate_limit, throttle=args.throttle,
+                                  etag=not args.no_etag)
+    server, base_url = stub_server.start(forum)
+    print(f"模拟服务: {base_url}，{len(forum.threads)} 个帖子（{len(args.fids)} 个板块共 {forum.total_pages} 页），"
+          f"延迟 {args.latency}±{args.jitter} 毫秒，失败率 {args.failure_rate}，限流 {args.rate_limit or '无'}")
+
+    workdir = tempfile.mkdtemp(prefix='s1-bench-')
+    results = []
+    try:
+        print(f"{'入口':<22}{'退出码':>6}{'耗时(秒)':>10}{'峰值RSS(MB)':>13}{'请求':>7}{'重试':>6}{'请求/秒':>9}{'行':>8}{'行/秒':>10}")
+        for name in args.entries:
+            result = run_entry(name, base_url, workdir, args.poll_rate, args.fids, args.board_workers,
+                               args.page_workers)
+            results.append(result)
+            print(f"{name:<22}{result['exit_code']:>6}{result['seconds']:>10.2f}{result['peak_rss_mb']:>13.1f}"
+                  f"{result['requests']:>7}{result['retries']:>6}{result['requests_per_second']:>9.1f}"
+                  f"{result['rows']:>8}{result['rows_per_second']:>10.1f}")
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"工作目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"模拟服务统计: {forum.stats}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'server': forum.stats, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.json}")
+    return 1 if any(result['exit_code'] for result in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import ForumParser
+from fixtures import forum_pages, synthetic_threads
+
+# ====================================================================================
+# 列表页解析基准测试：比较 bs4 与 fast 两种解析器的单页耗时，并校验结果一致
+# ====================================================================================
+BASE_URL = 'https://stage1st.com/2b'
+
+def time_parser(pages, parser, repeat):
+    results = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [ForumParser.parse_forum_page(html, BASE_URL, parser) for html in pages]
+    elapsed = time.perf_counter() - start
+    return results, elapsed / (repeat * len(pages))
+
+def main():
+    parser = argparse.ArgumentParser(description='列表页解析基准测试')
+    parser.add_argument('--pages', type=int, default=20, help='合成列表页数量')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数')
+    args = parser.parse_args()
+
+    pages = forum_pages(synthetic_threads(args.pages * 50))
+    print(f"合成列表页 {len(pages)} 页，平均 {sum(map(len, pages)) // len(pages)} 字节，fast后端: {ForumParser.FAST_BACKEND}")
+
+    reference, bs4_time = time_parser(pages, 'bs4', args.repeat)
+    print(f"bs4 : 每页 {bs4_time * 1000:.2f} 毫秒")
+    fast, fast_time = time_parser(pages, 'fast', args.repeat)
+    print(f"fast: 每页 {fast_time * 1000:.2f} 毫秒（{bs4_time / fast_time:.1f}x）")
+
+    mismatches = sum(1 for a, b in zip(reference, fast) if a != b)
+    print(f"结果不一致: {mismatches} 页")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import ProcessScore
+
+# ====================================================================================
+# 评分基准测试：在合成数据上比较逐行计算与批量计算，并校验输出逐位一致
+# ====================================================================================
+
+def synthetic_rows(count, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        # 约5%的帖子没有投票，其余票数跨度较大
+        scale = 0 if rng.random() < 0.05 else rng.choice((5, 50, 500, 5000))
+        rows.append({f'votes{i}': str(rng.randint(0, scale)) for i in range(1, 6)})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='评分计算基准测试')
+    parser.add_argument('--rows', type=int, default=1000000, help='合成数据行数')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    print(f"合成数据 {len(rows)} 行，NumPy: {'可用' if ProcessScore.np is not None else '不可用'}")
+
+    start = time.perf_counter()
+    expected = [(ProcessScore.calculate_score(row), ProcessScore.calculate_std_dev(row)) for row in rows]
+    per_row = time.perf_counter() - start
+    print(f"逐行计算: {per_row:.2f} 秒")
+
+    start = time.perf_counter()
+    ProcessScore.score_rows(rows)
+    batched = time.perf_counter() - start
+    print(f"批量计算: {batched:.2f} 秒（{per_row / batched:.1f}x）")
+
+    mismatches = sum(1 for row, (score, std_dev) in zip(rows, expected)
+                     if row['score'] != score or row['standard_deviation'] != std_dev)
+    print(f"输出不一致: {mismatches} 行")
+
+    start = time.perf_counter()
+    columns = ProcessScore.load_votes(rows)
+    prior = ProcessScore.global_prior([columns])
+    ProcessScore.bayes_rows(rows, prior, columns)
+    print(f"贝叶斯评分（先验 + 批量计算）: {time.perf_counter() - start:.2f} 秒")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import SearchIndex
+
+# ====================================================================================
+# 搜索基准测试：在合成的标题/别名数据上比较索引查询与线性扫描，并校验两者结果一致
+# ====================================================================================
+KANA = [chr(c) for c in range(0x30A1, 0x30F7)]
+LATIN_SYLLABLES = ('ka', 'ri', 'mo', 'na', 'to', 'shi', 're', 'zu', 'ga', 'ro', 'ne', 'ku', 'ma', 'yu', 'da', 'n')
+
+def vocabulary(rng, size=8000):
+    """随机生成的中文词、片假名词和拉丁字母词"""
+    common = [chr(c) for c in rng.sample(range(0x4E00, 0x9FA5), 3500)]
+    cjk = [''.join(rng.choice(common) for _ in range(rng.randint(2, 3))) for _ in range(size)]
+    kana = [''.join(rng.choice(KANA) for _ in range(rng.randint(3, 6))) for _ in range(size // 4)]
+    latin = [''.join(rng.choice(LATIN_SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+             for _ in range(size // 2)]
+    return cjk, kana, latin
+
+def synthetic_rows(count, seed=0):
+    rng = random.Random(seed)
+    cjk, kana, latin = vocabulary(rng)
+    rows = []
+    for i in range(count):
+        title = ''.join(rng.choice(cjk) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.3:
+            title += f" 第{rng.randint(2, 5)}季"
+        aliases = []
+        if rng.random() < 0.7:
+            aliases.append(' '.join(rng.choice(latin) for _ in range(rng.randint(1, 4))))
+        if rng.random() < 0.4:
+            aliases.append(''.join(rng.choice(kana) for _ in range(rng.randint(1, 3))))
+        rows.append({'tid': str(3000000 - i), 'title': title, 'aliases': aliases})
+    return rows
+
+def synthetic_queries(rows, count, seed=1):
+    """从随机行的标题/别名中截取子串作为查询（少量为单字），另加少量不存在的查询"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            queries.append(rng.choice(('不存在的作品', 'zzzz', 'ガンダムX', '0000')))
+            continue
+        row = rng.choice(rows)
+        text = rng.choice([row['title']] + row['aliases'])
+        length = 1 if rng.random() < 0.05 else min(len(text), rng.randint(2, 6))
+        start = rng.randint(0, len(text) - length)
+        queries.append(text[start:start + length])
+    return queries
+
+def linear_scan(texts, tids, query):
+    """线性扫描：与索引相同的规范化和排序规则"""
+    query = SearchIndex.normalize(query)
+    if not query:
+        return []
+    prefix = []
+    other = []
+    for tid, parts in zip(tids, texts):
+        if any(query in part for part in parts):
+            if any(part.startswith(query) for part in parts):
+                prefix.append(tid)
+            else:
+                other.append(tid)
+    return prefix + other
+
+def main():
+    parser = argparse.ArgumentParser(description='搜索索引基准测试')
+    parser.add_argument('--rows', type=int, default=100000, help='合成数据行数')
+    parser.add_argument('--queries', type=int, default=1000, help='查询次数')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    queries = synthetic_queries(rows, args.queries)
+
+    start = time.perf_counter()
+    builder = SearchIndex.IndexBuilder()
+    for row in rows:
+        builder.add(row)
+    content = builder.to_json()
+    index = SearchIndex.SearchIndex.loads(content)
+    data = content.encode('utf-8')
+    print(f"{len(rows)} 行，构建并加载索引 {time.perf_counter() - start:.2f} 秒，"
+          f"索引大小 {len(data) / 1e6:.1f} MB（gzip {len(gzip.compress(data)) / 1e6:.1f} MB）")
+
+    # 线性扫描使用预先规范化的文本，只比较查询本身的开销
+    tids = [row['tid'] for row in rows]
+    texts = [SearchIndex.row_texts(row) for row in rows]
+
+    start = time.perf_counter()
+    expected = [linear_scan(texts, tids, query) for query in queries]
+    scan = (time.perf_counter() - start) / len(queries)
+
+    # 先查询一遍解码倒排表，再计时
+    for query in queries:
+        index.search(query)
+    actual = []
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        actual.append(index.search(query))
+        timings.append(time.perf_counter() - start)
+    lookup = sum(timings) / len(timings)
+    median = sorted(timings)[len(timings) // 2]
+    p99 = sorted(timings)[int(len(timings) * 0.99)]
+
+    start = time.perf_counter()
+    limited_results = [index.search(query, limit=20) for query in queries]
+    limited = (time.perf_counter() - start) / len(queries)
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    hits = sum(len(result) for result in actual) / len(actual)
+    print(f"线性扫描: 平均每次 {scan * 1000:.3f} 毫秒")
+    print(f"索引查询: 平均每次 {lookup * 1000:.3f} 毫秒（{scan / lookup:.0f}x），中位数 {median * 1000:.3f} 毫秒，P99 {p99 * 1000:.3f} 毫秒，平均命中 {hits:.1f} 条")
+    print(f"索引查询（limit=20）: 平均每次 {limited * 1000:.3f} 毫秒")
+    limited_mismatches = sum(1 for a, b in zip(expected, limited_results) if a[:20] != b)
+    print(f"结果不一致: {mismatches}（limit=20: {limited_mismatches}）")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+# ====================================================================================
+# 流式处理基准测试：在不同行数的合成数据库上运行 ProcessScore / ProcessJson，
+# 每一步在独立子进程中执行并报告峰值RSS，行数增加十倍时峰值内存应基本不变
+# 第二轮在上一次导出的 database.min.json 存在时重新生成数据库（1%的行浏览量变化）再运行一遍，
+# 覆盖工作流取回上一次导出后的增量比较
+# ====================================================================================
+FIELDNAMES = ['title', 'tid', 'replies', 'views', 'post_time'] + [f'votes{i}' for i in range(1, 6)] + ['message']
+CATEGORIES = ('TV', 'MOV', 'OVA', 'WEB')
+STEPS = ('score', 'titles')
+
+def synthetic_rows(count, seed=0, changed_every=0):
+    """逐行生成合成数据（不在内存中保留整个数据集）；changed_every>0 时每隔这么多行改变一次浏览量"""
+    rng = random.Random(seed)
+    for i in range(count):
+        tid = 3000000 - i
+        scale = 0 if rng.random() < 0.05 else rng.choice((5, 50, 500))
+        row = {
+            'title': f"[{rng.randint(2010, 2026)}.{rng.choice((1, 4, 7, 10))}] [{rng.choice(CATEGORIES)}.{rng.randint(1, 24)}] 合成标题{tid}／Synthetic",
+            'tid': tid,
+            'replies': rng.randint(0, 300),
+            'views': rng.randint(50, 50000) + (1 if changed_every and i % changed_every == 0 else 0),
+            'post_time': f"2026-{rng.randint(1, 12)}-{rng.randint(1, 28)} 12:00",
+            'message': ''
+        }
+        for v in range(1, 6):
+            row[f'votes{v}'] = rng.randint(0, scale)
+        yield row
+
+def write_database(path, count, changed_every=0):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(synthetic_rows(count, changed_every=changed_every))
+
+def run_step(step):
+    """子进程：在当前目录的 database.csv 上执行一步，输出峰值RSS(KB)"""
+    if step == 'score':
+        import ProcessScore
+        ProcessScore.main()
+    else:
+        import ProcessJson
+        ProcessJson.process_csv_file('database.csv')
+    print(f"MAXRSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}")
+
+def measure(step, workdir):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--step', step],
+        cwd=workdir, capture_output=True, text=True, check=True
+    )
+    elapsed = time.perf_counter() - start
+    maxrss = int(result.stdout.rsplit('MAXRSS ', 1)[1])
+    return elapsed, maxrss
+
+def main():
+    parser = argparse.ArgumentParser(description='流式CSV/JSON处理内存基准测试')
+    parser.add_argument('--rows', type=int, nargs='+', default=[200000, 2000000], help='合成数据库行数（可给出多个）')
+    parser.add_argument('--step', choices=STEPS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.step:
+        run_step(args.step)
+        return
+
+    for count in args.rows:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, 'database.csv')
+            write_database(path, count)
+            size = os.path.getsize(path)
+            print(f"{count} 行（{size / 1e6:.0f} MB）")
+            for step in STEPS:
+                elapsed, maxrss = measure(step, workdir)
+                print(f"  {step:<7} 耗时 {elapsed:6.1f} 秒，峰值RSS {maxrss / 1024:6.1f} MB")
+
+            # 上一次导出存在时：逐行归并比较，生成增量文件
+            write_database(path, count, changed_every=100)
+            for step in STEPS:
+                elapsed, maxrss = measure(step, workdir)
+                print(f"  {step:<7} 耗时 {elapsed:6.1f} 秒，峰值RSS {maxrss / 1024:6.1f} MB（有上一次导出）")
+            with open(os.path.join(workdir, 'database.delta.json'), 'r', encoding='utf-8') as f:
+                delta = json.load(f)
+            print(f"  增量文件: 变化 {len(delta['changed'])} 行，删除 {len(delta['removed'])} 行")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import TitleParser
+
+# ====================================================================================
+# 标题解析基准测试：用 database.csv 中已解析的列还原出原始标题（[年.月] [类别.集数] 标题／别名），
+# 比较原来每次调用 re.match(字符串模式) 的实现与 TitleParser（先试标准模式，不匹配时才用宽松模式），
+# 并模拟一次常规运行：已解析的行被跳过，只有少量新帖子，加上每次运行都会被重新解析的失败标题
+# ====================================================================================
+LEGACY_PATTERN = r'\[(\d{4})\.(\d{1,2})\]\s*\[([^\.]+)\.(\d+)\]\s*([^／/]+)'
+
+
+def legacy_process_title(title):
+    """原 ProcessJson.process_title 的实现"""
+    match = re.match(LEGACY_PATTERN, title)
+    if match:
+        month = match.group(2).lstrip('0') or '0'
+        ep = match.group(4).lstrip('0') or '0'
+        return match.group(5).strip(), '', match.group(1), month, match.group(3), ep
+    return title, '', '', '', '', ''
+
+def raw_titles(path):
+    """由已解析的行还原原始标题；未解析成功的行直接使用title列"""
+    titles = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            if not row.get('year'):
+                titles.append(row['title'])
+                continue
+            names = [row['title']] + [alias for alias in row.get('aliases', '').split(';') if alias]
+            titles.append(f"[{row['year']}.{row['month']}] [{row['category']}.{row['ep']}] {'／'.join(names)}")
+    return titles
+
+def timed(func, titles, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for title in titles:
+            func(title)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='标题解析基准测试')
+    parser.add_argument('--database', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database.csv'))
+    parser.add_argument('--new', type=int, default=20, help='模拟一次运行中的新帖子数')
+    parser.add_argument('--failures', type=int, default=50, help='模拟的解析失败标题数（每次运行都会重新解析）')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    titles = raw_titles(args.database)
+    failures = [f"无法解析的标题 {i}" for i in range(args.failures)]
+    print(f"{len(titles)} 个标题（另加 {len(failures)} 个解析失败的标题），取 {args.repeat} 次中的最快结果")
+
+    # 结果校验：原实现能解析的标题两种实现应一致（别名除外：原实现丢弃别名）
+    mismatched = 0
+    for title in titles:
+        old = legacy_process_title(title)
+        new = TitleParser.parse(title)
+        if old[2] and old[:1] + old[2:] != new[:1] + new[2:]:
+            mismatched += 1
+    print(f"与原实现不一致的标题: {mismatched}")
+
+    legacy = timed(legacy_process_title, titles, args.repeat)
+    compiled = timed(TitleParser.parse, titles, args.repeat)
+    print(f"全部解析   原实现 {legacy * 1000:8.2f} 毫秒，预编译 {compiled * 1000:8.2f} 毫秒"
+          f"（{len(titles) / compiled:,.0f} 个/秒）")
+
+    # 解析失败的标题两个模式都要试一遍，单独计时
+    legacy_failed = timed(legacy_process_title, failures, args.repeat)
+    compiled_failed = timed(TitleParser.parse, failures, args.repeat)
+    print(f"失败标题   原实现 {legacy_failed * 1000:8.3f} 毫秒，预编译 {compiled_failed * 1000:8.3f} 毫秒")
+
+    # 常规运行：已解析的行被跳过，只有新帖子和失败标题需要处理
+    run_titles = titles[:args.new] + failures
+    legacy_run = timed(legacy_process_title, run_titles, args.repeat)
+    compiled_run = timed(TitleParser.parse, run_titles, args.repeat)
+    print(f"常规运行   原实现 {legacy_run * 1000:8.3f} 毫秒，预编译 {compiled_run * 1000:8.3f} 毫秒"
+          f"（{len(run_titles)} 个标题）")
+
+if __name__ == '__main__':
+    main()
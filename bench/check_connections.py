@@ -0,0 +1,148 @@
+import argparse
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import stub_server
+from bench_e2e import ENTRIES, SRC, entry_env
+
+sys.path.insert(0, SRC)
+import S1Client  # noqa: E402
+
+# ====================================================================================
+# 注入失败时的连接数检查：模拟服务按 --failure-rate 的概率返回503（--failure-status 0 时直接断开连接），
+# 并统计接受的TCP连接数
+#   会话: 同样的并发数和投票请求数下，比较
+#     requests.Session() —— 原来各脚本的做法（失败的请求直接记为错误）
+#     S1Client           —— create_session(pool_size=并发数)（失败由 JitterRetry 重试，连接池与并发数一致）
+#     S1Client 应完成全部请求，连接数不超过 并发数 + 断开的连接数
+#   流水线: 分别运行 GetThread、GetVote（每个脚本各自建立连接池并登录）与 Pipeline all（各阶段共用
+#     一个客户端），两者都应没有以HTTP错误结束的行、投票结果与模拟服务一致，且 Pipeline all 的
+#     TCP连接数更少、登录次数不多于分别运行
+# 任何一项不满足时退出码为1
+# ====================================================================================
+UNLIMITED = {'S1_ADAPTIVE_RATE': '0', 'S1_RATE_INITIAL': '0'}   # 共享限速器不限速
+COUNTERS = ('connections', 'requests', 'failures', 'logins')
+
+
+def post_poll(session, url, tid):
+    """请求一个投票，返回是否成功"""
+    try:
+        response = session.post(url, data={'sid': stub_server.SID, 'tid': tid}, timeout=10)
+    except requests.RequestException:
+        return False
+    return response.ok
+
+def compare_sessions(forum, base_url, workers):
+    """两种会话各请求一遍全部投票，返回 [(名称, 成功数, 计数器增量)]"""
+    url = f"{base_url}/api/app/poll/options"
+    tids = [thread['tid'] for thread in forum.threads]
+    results = []
+    for label, session in (
+        ('requests.Session()', requests.Session()),
+        (f'S1Client pool_size={workers}', S1Client.create_session(pool_size=workers)),
+    ):
+        before = dict(forum.stats)
+        with session, ThreadPoolExecutor(max_workers=workers) as executor:
+            ok = sum(executor.map(lambda tid: post_poll(session, url, tid), tids))
+        results.append((label, ok, {key: forum.stats[key] - before[key] for key in COUNTERS}))
+    return results
+
+def run(names, base_url, workdir, forum, env):
+    """依次运行入口脚本，返回 (最后一个非零的退出码, 计数器增量)"""
+    before = dict(forum.stats)
+    returncode = 0
+    for name in names:
+        script, _ = ENTRIES[name]
+        full_env = {**entry_env(name, base_url, os.path.join(workdir, f"report-{name}.json")), **env}
+        with open(os.path.join(workdir, f"log-{name}.txt"), 'a', encoding='utf-8') as log:
+            returncode = subprocess.call([sys.executable, os.path.join(SRC, script[0])] + script[1:],
+                                         cwd=workdir, env=full_env, stdout=log, stderr=subprocess.STDOUT) or returncode
+    return returncode, {key: forum.stats[key] - before[key] for key in COUNTERS}
+
+def check_database(workdir, forum):
+    """返回 database.csv 的问题列表：缺少帖子、以HTTP错误/请求异常结束的行、投票结果与模拟服务不一致的行"""
+    with open(os.path.join(workdir, 'database.csv'), 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    problems = []
+    if {row['tid'] for row in rows} != {thread['tid'] for thread in forum.threads}:
+        problems.append(f"database.csv 有 {len(rows)} 行，模拟服务有 {len(forum.threads)} 个帖子")
+    errors = sum(1 for row in rows if row.get('message', '').startswith(('HTTP错误', '请求异常')))
+    if errors:
+        problems.append(f"{errors} 行以HTTP错误结束")
+    wrong = 0
+    for row in rows:
+        poll = forum.poll(int(row['tid']))
+        want = [str(option['votes']) for option in poll['data']] if poll['success'] else ['0'] * 5
+        if [row.get(f'votes{i}') for i in range(1, 6)] != want:
+            wrong += 1
+    if wrong:
+        problems.append(f"{wrong} 行投票结果与模拟服务不一致")
+    return problems
+
+def describe(label, delta, extra=''):
+    print(f"{label:<28}{extra:>6}{delta['connections']:>9}{delta['requests']:>10}{delta['failures']:>6}{delta['logins']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description='检查注入失败时的TCP连接数和完成情况')
+    parser.add_argument('--threads', type=int, default=600, help='模拟论坛的帖子数')
+    parser.add_argument('--latency', type=float, default=5, help='每个请求的延迟（毫秒）')
+    parser.add_argument('--failure-rate', type=float, default=0.1, help='注入失败的概率')
+    parser.add_argument('--failure-status', type=int, default=503, help='失败响应的状态码（0为断开连接）')
+    parser.add_argument('--workers', type=int, default=8, help='投票请求的并发数')
+    parser.add_argument('--keep', action='store_true', help='保留工作目录')
+    args = parser.parse_args()
+
+    forum = stub_server.StubForum(args.threads, latency=args.latency, failure_rate=args.failure_rate,
+                                  failure_status=args.failure_status)
+    server, base_url = stub_server.start(forum)
+    workdir = tempfile.mkdtemp(prefix='s1-check-connections-')
+    failures = []
+    try:
+        print(f"{'':<28}{'成功':>6}{'TCP连接':>9}{'HTTP请求':>10}{'失败':>6}{'登录':>6}")
+        for label, ok, delta in compare_sessions(forum, base_url, args.workers):
+            describe(label, delta, str(ok))
+        if ok != args.threads:
+            failures.append(f"{label}: {args.threads} 个请求中只有 {ok} 个成功")
+        # 每个断开的连接都需要重新建立一个
+        limit = args.workers + (0 if args.failure_status else delta['failures'])
+        if delta['connections'] > limit:
+            failures.append(f"{label}: {delta['connections']} 个连接，超过 {limit}")
+
+        env = {**UNLIMITED, 'S1_POLL_WORKERS': str(args.workers)}
+        runs = {}
+        for label, names in (('GetThread + GetVote', ('GetThread', 'GetVote')), ('Pipeline all', ('Pipeline-all',))):
+            directory = os.path.join(workdir, names[-1])
+            os.makedirs(directory)
+            returncode, delta = run(names, base_url, directory, forum, env)
+            runs[label] = delta
+            describe(label, delta, '是' if not returncode else '否')
+            if returncode:
+                failures.append(f"{label}: 退出码 {returncode}")
+            failures += [f"{label}: {problem}" for problem in check_database(directory, forum)]
+        separate, pipeline = runs.values()
+        if not pipeline['failures']:
+            failures.append("Pipeline all 运行期间没有注入任何失败")
+        if pipeline['connections'] >= separate['connections'] or pipeline['logins'] > separate['logins']:
+            failures.append(f"Pipeline all 用了 {pipeline['connections']} 个连接、{pipeline['logins']} 次登录，"
+                            f"分别运行用了 {separate['connections']} 个连接、{separate['logins']} 次登录")
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"工作目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        for failure in failures:
+            print(f"失败: {failure}")
+        print("通过" if not failures else f"{len(failures)} 项检查失败")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
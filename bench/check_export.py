@@ -0,0 +1,92 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import stub_server
+from bench_e2e import run_entry
+
+# ====================================================================================
+# 导出变化检测的检查：对本地模拟服务依次运行 GetThread、Pipeline all，再把 Pipeline lite/daily
+# 各连续运行若干次（模拟服务的数据不变）。这些运行不应改变任何一行：
+#   database.min.json 内容和修改时间不变（update_time 保留），不生成新的增量文件
+#   （已有的增量文件不被改写，或新生成的增量文件为空）
+# 并检查JSON中除 aliases 外的值都是字符串（与CSV一致）。任何一项不满足时退出码为1
+# ====================================================================================
+
+
+def snapshot(workdir):
+    path = os.path.join(workdir, 'database.min.json')
+    with open(path, 'rb') as f:
+        digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    delta = os.path.join(workdir, 'database.delta.json')
+    delta_state = (os.path.getmtime(delta), os.path.getsize(delta)) if os.path.exists(delta) else None
+    return digest, os.path.getmtime(path), delta_state
+
+def delta_rows(workdir):
+    delta = os.path.join(workdir, 'database.delta.json')
+    if not os.path.exists(delta):
+        return 0
+    with open(delta, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return len(data.get('changed', {})) + len(data.get('removed', []))
+
+def non_string_fields(workdir):
+    with open(os.path.join(workdir, 'database.min.json'), 'r', encoding='utf-8') as f:
+        data = json.load(f)['data']
+    return sorted({key for row in data for key, value in row.items()
+                   if key != 'aliases' and not isinstance(value, str)})
+
+def main():
+    parser = argparse.ArgumentParser(description='检查数据不变时Pipeline不会重新发布JSON')
+    parser.add_argument('--threads', type=int, default=300, help='模拟论坛的帖子数')
+    parser.add_argument('--repeat', type=int, default=2, help='每种模式连续运行的次数')
+    parser.add_argument('--keep', action='store_true', help='保留工作目录')
+    args = parser.parse_args()
+
+    forum = stub_server.StubForum(args.threads)
+    server, base_url = stub_server.start(forum)
+    workdir = tempfile.mkdtemp(prefix='s1-check-export-')
+    failures = []
+    try:
+        for name in ('GetThread', 'Pipeline-all'):
+            result = run_entry(name, base_url, workdir, 0, [83])
+            if result['exit_code']:
+                failures.append(f"{name} 退出码 {result['exit_code']}")
+
+        mixed = non_string_fields(workdir)
+        if mixed:
+            failures.append(f"JSON中存在非字符串的值: {', '.join(mixed)}")
+
+        for name in ('Pipeline-lite', 'Pipeline-daily'):
+            for attempt in range(1, args.repeat + 1):
+                before = snapshot(workdir)
+                result = run_entry(name, base_url, workdir, 0, [83])
+                after = snapshot(workdir)
+                rows = delta_rows(workdir) if after[2] != before[2] else 0
+                status = '不变' if after[:2] == before[:2] else '已改写'
+                print(f"{name} 第 {attempt} 次: 退出码 {result['exit_code']}，database.min.json {status}，"
+                      f"增量 {rows} 行")
+                if result['exit_code']:
+                    failures.append(f"{name} 第 {attempt} 次退出码 {result['exit_code']}")
+                if after[:2] != before[:2]:
+                    failures.append(f"{name} 第 {attempt} 次改写了 database.min.json")
+                if rows:
+                    failures.append(f"{name} 第 {attempt} 次生成了 {rows} 行增量")
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"工作目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures:
+        print(f"失败: {failure}")
+    print("通过" if not failures else f"{len(failures)} 项检查失败")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import stub_server
+from bench_e2e import ENTRIES, SRC, entry_env
+
+# ====================================================================================
+# 并发抓取投票的速率检查：先用 GetThread 建立数据库，再以不同配置运行 GetVote（强制刷新全部帖子），
+# 由模拟服务记录每个投票请求的时间：
+#   扩展性: 不限速时吞吐量随 S1_POLL_WORKERS 增加（延迟固定时，并发数越多请求/秒越高）
+#   速率上限: 设置 S1_POLL_RATE（固定限速）或 S1_RATE_MAX（共享的自适应限速器）时，
+#            任意1秒窗口内的请求数不超过上限（令牌桶容量为1，允许多1个），平均速率不超过上限
+# 任何一项不满足时退出码为1
+# ====================================================================================
+UNLIMITED = {'S1_ADAPTIVE_RATE': '0', 'S1_RATE_INITIAL': '0'}   # 共享限速器不限速
+
+
+def max_window(times, window=1.0):
+    """任意 window 秒窗口内的最大请求数"""
+    best = 0
+    start = 0
+    for end, moment in enumerate(times):
+        while moment - times[start] >= window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+def run_polls(forum, base_url, workdir, env):
+    """运行一次 GetVote，返回 (退出码, 本次投票请求的时间列表)"""
+    script, _ = ENTRIES['GetVote']
+    before = len(forum.times.get('polls', []))
+    full_env = {**entry_env('GetVote', base_url, os.path.join(workdir, 'report-GetVote.json')), **env}
+    with open(os.path.join(workdir, 'log-GetVote.txt'), 'a', encoding='utf-8') as log:
+        returncode = subprocess.call([sys.executable, os.path.join(SRC, script[0])] + script[1:],
+                                     cwd=workdir, env=full_env, stdout=log, stderr=subprocess.STDOUT)
+    return returncode, sorted(forum.times.get('polls', [])[before:])
+
+def describe(times):
+    elapsed = times[-1] - times[0] if len(times) > 1 else 0
+    rate = (len(times) - 1) / elapsed if elapsed else 0
+    return rate, max_window(times)
+
+def main():
+    parser = argparse.ArgumentParser(description='检查GetVote的吞吐量扩展和速率上限')
+    parser.add_argument('--threads', type=int, default=200, help='模拟论坛的帖子数（每次运行的投票请求数）')
+    parser.add_argument('--latency', type=float, default=50, help='每个请求的延迟（毫秒）')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8], help='比较吞吐量的并发数')
+    parser.add_argument('--cap', type=float, default=20, help='检查的速率上限（次/秒）')
+    parser.add_argument('--keep', action='store_true', help='保留工作目录')
+    args = parser.parse_args()
+
+    forum = stub_server.StubForum(args.threads, latency=args.latency)
+    server, base_url = stub_server.start(forum)
+    workdir = tempfile.mkdtemp(prefix='s1-check-rate-')
+    failures = []
+    try:
+        env = entry_env('GetThread', base_url, os.path.join(workdir, 'report-GetThread.json'))
+        script, _ = ENTRIES['GetThread']
+        with open(os.path.join(workdir, 'log-GetThread.txt'), 'w', encoding='utf-8') as log:
+            if subprocess.call([sys.executable, os.path.join(SRC, script[0])] + script[1:],
+                               cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT):
+                failures.append("建立数据库的 GetThread 运行失败")
+                return 1
+
+        print(f"{'配置':<36}{'退出码':>6}{'请求':>6}{'平均请求/秒':>12}{'1秒窗口最大':>12}")
+        rates = []
+        for workers in args.workers:
+            returncode, times = run_polls(forum, base_url, workdir, {**UNLIMITED, 'S1_POLL_WORKERS': str(workers)})
+            rate, peak = describe(times)
+            rates.append(rate)
+            print(f"{f'不限速 workers={workers}':<36}{returncode:>6}{len(times):>6}{rate:>12.1f}{peak:>12}")
+            if returncode or len(times) != args.threads:
+                failures.append(f"不限速 workers={workers}: 退出码 {returncode}，请求 {len(times)} 次")
+        if any(later <= earlier * 1.5 for earlier, later in zip(rates, rates[1:])):
+            failures.append(f"吞吐量没有随并发数增加: {', '.join(f'{rate:.1f}' for rate in rates)}")
+
+        workers = str(max(args.workers))
+        cap = f"{args.cap:g}"
+        capped = (
+            (f'S1_POLL_RATE={cap} workers={workers}', {**UNLIMITED, 'S1_POLL_RATE': cap}),
+            (f'S1_RATE_MAX={cap} workers={workers}', {'S1_ADAPTIVE_RATE': '1', 'S1_RATE_INITIAL': cap, 'S1_RATE_MAX': cap}),
+        )
+        for label, extra in capped:
+            returncode, times = run_polls(forum, base_url, workdir, {**extra, 'S1_POLL_WORKERS': workers})
+            rate, peak = describe(times)
+            print(f"{label:<36}{returncode:>6}{len(times):>6}{rate:>12.1f}{peak:>12}")
+            if returncode or len(times) != args.threads:
+                failures.append(f"{label}: 退出码 {returncode}，请求 {len(times)} 次")
+            # 请求时间由服务端记录，平均速率允许2%的计时误差
+            if peak > args.cap + 1 or rate > args.cap * 1.02:
+                failures.append(f"{label}: 平均 {rate:.1f} 次/秒，1秒窗口最多 {peak} 次，超过上限 {cap}")
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"工作目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        for failure in failures:
+            print(f"失败: {failure}")
+        print("通过" if not failures else f"{len(failures)} 项检查失败")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
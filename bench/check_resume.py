@@ -0,0 +1,142 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import stub_server
+from bench_e2e import ENTRIES, SRC, entry_env
+
+# ====================================================================================
+# 断点续跑的检查：对本地模拟服务运行入口脚本，在模拟服务收到 N 个列表页/投票请求后
+# SIGKILL 该进程，再重新运行一次，检查：
+#   恢复运行的请求数 = 总数 - 被杀死前写入检查点的记录数（已完成的工作不再请求）
+#   恢复运行结束后 database.csv 包含全部帖子、投票结果与模拟服务一致、检查点已删除
+# 检查点设置为每条记录写盘一次（S1_CHECKPOINT_FLUSH_EVERY=1），使请求数可以精确比较
+#   thread: GetThread 全量爬取（统计列表页请求）
+#   vote  : 先用 GetThread 建立数据库，再对 GetVote 检查（统计投票请求）
+# 任何一项不满足时退出码为1
+# ====================================================================================
+COUNTERS = {'GetThread': 'pages', 'GetVote': 'polls'}
+
+
+def journal_records(workdir, name):
+    """检查点中完整的记录（不包括key行和末尾不完整的行）"""
+    path = os.path.join(workdir, '.checkpoint', f"{name}.jsonl")
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, 'rb') as f:
+        for line in f.read().split(b'\n')[1:-1]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+def completed(name, records):
+    """检查点记录对应的已完成请求数（同一页面可能被记录两次，按页面去重）"""
+    if name == 'GetThread':
+        return len({(record['fid'], record['orderby'], record['page']) for record in records})
+    return len({record['tid'] for record in records})
+
+def run(name, base_url, workdir, forum, kill_after=None):
+    """运行入口脚本；给出 kill_after 时在模拟服务的计数器达到该值后 SIGKILL，返回 (退出码, 本次请求数)"""
+    script, _ = ENTRIES[name]
+    counter = COUNTERS.get(name, 'pages')
+    env = {**entry_env(name, base_url, os.path.join(workdir, f"report-{name}.json")),
+           'S1_CHECKPOINT_FLUSH_EVERY': '1'}
+    before = forum.stats[counter]
+    with open(os.path.join(workdir, f"log-{name}.txt"), 'a', encoding='utf-8') as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(SRC, script[0])] + script[1:],
+                                cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if kill_after is not None:
+            while proc.poll() is None and forum.stats[counter] - before < kill_after:
+                time.sleep(0.005)
+            proc.send_signal(signal.SIGKILL)
+        returncode = proc.wait()
+    # 被杀死时仍在处理中的请求已在开始时计数，稍等服务线程结束
+    time.sleep(0.2)
+    return returncode, forum.stats[counter] - before
+
+def check_database(workdir, forum, votes):
+    """database.csv 是否包含全部帖子（votes为True时同时检查投票结果），返回问题列表"""
+    problems = []
+    with open(os.path.join(workdir, 'database.csv'), 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    expected = {thread['tid'] for thread in forum.threads}
+    tids = [row['tid'] for row in rows]
+    if len(tids) != len(set(tids)) or set(tids) != expected:
+        problems.append(f"database.csv 有 {len(tids)} 行（{len(set(tids))} 个tid），模拟服务有 {len(expected)} 个帖子")
+    if votes:
+        wrong = 0
+        for row in rows:
+            poll = forum.poll(int(row['tid']))
+            want = [str(option['votes']) for option in poll['data']] if poll['success'] else ['0'] * 5
+            if [row.get(f'votes{i}') for i in range(1, 6)] != want:
+                wrong += 1
+        if wrong:
+            problems.append(f"{wrong} 行投票结果与模拟服务不一致")
+    return problems
+
+def check(mode, args):
+    forum = stub_server.StubForum(args.threads, latency=args.latency)
+    server, base_url = stub_server.start(forum)
+    workdir = tempfile.mkdtemp(prefix=f's1-check-resume-{mode}-')
+    problems = []
+    try:
+        name = 'GetThread' if mode == 'thread' else 'GetVote'
+        if mode == 'vote':
+            returncode, _ = run('GetThread', base_url, workdir, forum)
+            if returncode:
+                return [f"建立数据库的 GetThread 退出码 {returncode}"]
+        total = forum.total_pages if mode == 'thread' else len(forum.threads)
+        kill_after = args.kill_after or total // 2
+
+        _, first = run(name, base_url, workdir, forum, kill_after)
+        done = completed(name, journal_records(workdir, name))
+        returncode, resumed = run(name, base_url, workdir, forum)
+        print(f"{name}: 共 {total} 个请求，第一次运行在 {first} 个请求后被杀死，检查点中有 {done} 个，"
+              f"恢复运行请求 {resumed} 个（应为 {total - done}）")
+
+        if returncode:
+            problems.append(f"恢复运行的退出码为 {returncode}")
+        if not done:
+            problems.append("被杀死前没有写入任何检查点记录")
+        if resumed != total - done:
+            problems.append(f"恢复运行请求了 {resumed} 个，应为 {total - done} 个")
+        if journal_records(workdir, name):
+            problems.append("运行成功后检查点未删除")
+        problems += check_database(workdir, forum, votes=mode == 'vote')
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"工作目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='检查中断后重新运行只请求剩余部分')
+    parser.add_argument('--modes', nargs='+', choices=('thread', 'vote'), default=['thread', 'vote'])
+    parser.add_argument('--threads', type=int, default=600, help='模拟论坛的帖子数')
+    parser.add_argument('--latency', type=float, default=20, help='每个请求的延迟（毫秒）')
+    parser.add_argument('--kill-after', type=int, default=0, help='收到多少个请求后杀死进程（默认为总数的一半）')
+    parser.add_argument('--keep', action='store_true', help='保留工作目录')
+    args = parser.parse_args()
+
+    problems = []
+    for mode in args.modes:
+        problems += [f"{mode}: {problem}" for problem in check(mode, args)]
+    for problem in problems:
+        print(f"失败: {problem}")
+    print("通过" if not problems else f"{len(problems)} 项检查失败")
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
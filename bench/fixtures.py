@@ -0,0 +1,138 @@
+import random
+from datetime import datetime, timedelta
+from html import escape
+
+# ====================================================================================
+# 合成的 Stage1st (Discuz! X) 板块列表页，结构与 forumdisplay 页面一致：
+# tbody[id^="normalthread_"] 帖子行、a.xst 标题、td.num 回复/查看、两个 td.by（作者/最后回复）
+# ====================================================================================
+THREADS_PER_PAGE = 50
+CATEGORIES = ('TV', 'MOV', 'OVA', 'WEB')
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+def synthetic_threads(count, seed=0, start_tid=2290000):
+    """生成按tid从大到小排列的合成帖子"""
+    rng = random.Random(seed)
+    threads = []
+    posted = NOW
+    tid = start_tid
+    for i in range(count):
+        if i:
+            tid -= rng.randint(1, 9)
+        posted -= timedelta(minutes=rng.randint(10, 3000))
+        last_reply = min(NOW, posted + timedelta(minutes=rng.randint(0, 200000)))
+        year, month = posted.year, (posted.month - 1) // 3 * 3 + 1
+        threads.append({
+            'tid': str(tid),
+            'title': f"[{year}.{month}] [{rng.choice(CATEGORIES)}.{rng.randint(1, 24)}] 合成标题{tid}／Synthetic {tid}",
+            'replies': str(rng.randint(0, 300)),
+            'views': str(rng.randint(50, 50000)),
+            'post_time': f"{posted.year}-{posted.month}-{posted.day} {posted.hour:02d}:{posted.minute:02d}",
+            'last_reply': last_reply,
+            'author': f"user{rng.randint(1, 99999)}",
+        })
+    return threads
+
+
+def _relative(moment, now):
+    """Discuz 对近期时间显示相对时间，完整时间放在 title 属性中"""
+    delta = now - moment
+    if delta < timedelta(hours=1):
+        return f"{max(1, delta.seconds // 60)}&nbsp;分钟前"
+    if delta < timedelta(days=1):
+        return f"{delta.seconds // 3600}&nbsp;小时前"
+    if delta < timedelta(days=7):
+        return f"{delta.days}&nbsp;天前"
+    return None
+
+
+def _absolute(moment):
+    return f"{moment.year}-{moment.month}-{moment.day} {moment.hour:02d}:{moment.minute:02d}"
+
+
+def thread_row(thread, fid=83, now=NOW):
+    tid = thread['tid']
+    title = escape(thread['title'])
+    author = escape(thread['author'])
+    posted = thread['post_time']
+    last_reply = thread['last_reply']
+    relative = _relative(last_reply, now)
+    if relative:
+        last_reply_html = f'<a href="forum.php?mod=redirect&amp;tid={tid}&amp;goto=lastpost#lastpost"><span title="{_absolute(last_reply)}">{relative}</span></a>'
+    else:
+        last_reply_html = f'<a href="forum.php?mod=redirect&amp;tid={tid}&amp;goto=lastpost#lastpost">{_absolute(last_reply)}</a>'
+    return f'''<tbody id="normalthread_{tid}">
+<tr>
+<td class="icn">
+<a href="thread-{tid}-1-1.html" title="有新回复 - 新窗口打开" target="_blank">
+<img src="static/image/common/folder_new.gif" />
+</a>
+</td>
+<th class="new">
+<a href="javascript:;" id="content_{tid}" class="showcontent y" title="更多操作" onclick="CONTENT_TID='{tid}';CONTENT_ID='normalthread_{tid}';showMenu({{'ctrlid':this.id,'menuid':'content_menu'}})"></a>
+<a class="tdpre y" href="javascript:void(0);" onclick="previewThread('{tid}', 'normalthread_{tid}');">预览</a>
+<a href="thread-{tid}-1-1.html" onclick="atarget(this)" class="s xst">{title}</a>
+<img src="static/image/stamp/010.small.gif" alt="投票" align="absmiddle" title="投票" />
+</th>
+<td class="by">
+<cite><a href="space-uid-1.html" c="1">{author}</a></cite>
+<em><span title="{posted}">{posted.split(' ')[0]}</span></em>
+</td>
+<td class="num"><a href="thread-{tid}-1-1.html" class="xi2">{thread['replies']}</a><em>{thread['views']}</em></td>
+<td class="by">
+<cite><a href="space-username-{author}.html" c="1">{author}</a></cite>
+<em>{last_reply_html}</em>
+</td>
+</tr>
+</tbody>'''
+
+
+def forum_page(threads, page, total_pages, fid=83, now=NOW):
+    """生成一整页列表页HTML（含页头、置顶帖、分页器等无关内容）"""
+    rows = '\n'.join(thread_row(thread, fid, now) for thread in threads)
+    nav = ''.join(f'<a href="forum.php?mod=forumdisplay&amp;fid={fid}&amp;page={p}">{p}</a>'
+                  for p in range(max(1, page - 4), min(total_pages, page + 5) + 1) if p != page)
+    next_link = (f'<a href="forum.php?mod=forumdisplay&amp;fid={fid}&amp;page={page + 1}" class="nxt">下一页</a>'
+                 if page < total_pages else '')
+    pager = (f'<div class="pg"><strong>{page}</strong>{nav}'
+             f'<a href="forum.php?mod=forumdisplay&amp;fid={fid}&amp;page={total_pages}" class="last">... {total_pages}</a>'
+             f'<label><input type="text" name="custompage" class="px" size="2" title="输入页码，按回车快速跳转" value="{page}" />'
+             f'<span title="共 {total_pages} 页"> / {total_pages} 页</span></label>{next_link}</div>')
+    menu = '\n'.join(f'<li><a href="forum.php?mod=forumdisplay&amp;fid={i}">板块{i}</a></li>' for i in range(1, 120))
+    return f'''<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+<title>动漫论坛 - Stage1st - stage1/s1 游戏动漫论坛</title>
+<script type="text/javascript">var STYLEID = '6', STATICURL = 'static/', IMGDIR = 'static/image/common', VERHASH = 'abc', charset = 'utf-8', discuz_uid = '1', cookiepre = 'B7Y9_2132_', cookiedomain = '', cookiepath = '/', showusercard = '1', attackevasive = '0', disallowfloat = 'newthread', creditnotice = '', defaultstyle = '', REPORTURL = '', SITEURL = '', JSPATH = 'data/cache/';</script>
+<link rel="stylesheet" type="text/css" href="data/cache/style_6_common.css?abc" />
+</head>
+<body id="nv_forum" class="pg_forumdisplay">
+<div id="toptb" class="cl"><div class="wp"><div class="z"><a href="./">论坛</a></div>
+<div class="y"><a href="home.php?mod=space&amp;uid=1">user</a><a href="member.php?mod=logging&amp;action=logout&amp;formhash=abcdef">退出</a></div></div></div>
+<div id="hd"><ul id="nv">{menu}</ul></div>
+<div id="wp" class="wp">
+<div id="pt" class="bm cl"><div class="z"><a href="./" class="nvhm">Stage1st</a><em>&raquo;</em><a href="forum.php?mod=forumdisplay&amp;fid={fid}">动漫论坛</a></div></div>
+<div id="pgt" class="bm bw0 pgs cl">{pager}</div>
+<div id="threadlist" class="tl bm bmw">
+<form method="post" autocomplete="off" name="moderate" id="moderate" action="forum.php?mod=topicadmin&amp;action=moderate&amp;fid={fid}">
+<table summary="forum_{fid}" cellspacing="0" cellpadding="0" id="threadlisttableid">
+<tbody id="stickthread_1"><tr><th><a href="thread-1-1-1.html" class="s xst">[公告] 版规</a></th><td class="by"><em><span>2010-1-1</span></em></td><td class="num"><a>0</a><em>0</em></td><td class="by"><em><a>2010-1-1 00:00</a></em></td></tr></tbody>
+<tbody id="separatorline"><tr class="ts"><td>&nbsp;</td><th>版块主题</th></tr></tbody>
+{rows}
+</table>
+</form>
+</div>
+<div class="bm bw0 pgs cl">{pager}</div>
+</div>
+<div id="ft" class="wp cl"><p>Powered by Discuz! X3.4</p></div>
+</body>
+</html>'''
+
+
+def forum_pages(threads, fid=83, per_page=THREADS_PER_PAGE, now=NOW):
+    """将帖子列表切分为若干页HTML"""
+    total_pages = max(1, (len(threads) + per_page - 1) // per_page)
+    return [forum_page(threads[i * per_page:(i + 1) * per_page], i + 1, total_pages, fid, now)
+            for i in range(total_pages)]
@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from fixtures import NOW, THREADS_PER_PAGE, forum_page, synthetic_threads
+
+# ====================================================================================
+# 本地模拟的 Stage1st 接口，用于离线基准测试（不需要真实账号）
+#   GET  /2b/forum.php?mod=forumdisplay&fid=..&orderby=dateline|lastpost&page=N   列表页（fixtures.forum_page）
+#        设置多个板块（fids）时合成帖子轮流分配到各板块
+#   POST /2b/member.php?mod=logging&action=login                                网页登录，设置 *_auth cookie
+#   POST /2b/api/app/user/login                                                 API登录，返回sid
+#   POST /2b/api/app/poll/options                                               投票选项（票数由tid确定）
+# 可注入延迟（latency ± jitter 毫秒）和失败（按概率返回 failure_status；failure_status=0 时不返回响应直接断开连接）；
+# stats['connections'] 统计接受的TCP连接数
+# 设置 rate_limit 时模拟服务器限流：最近1秒内的请求超过该数量时，按 throttle 返回
+#   429  : HTTP 429 + Retry-After: 1
+#   flood: HTTP 200 + Discuz防刷提示（网页为提示页，API为 success=false 的JSON）
+# 列表页带 ETag，请求的 If-None-Match 与之相同时返回304（etag=False 时不支持条件请求，与Discuz相同）
+# 脚本通过 S1_BASE_URL=http://127.0.0.1:<端口>/2b 指向本服务
+# ====================================================================================
+PREFIX = '/2b'
+SID = 'stub-sid'
+AUTH_COOKIE = 'B7Y9_2132_auth'
+NO_POLL_EVERY = 20   # 每20个帖子中有一个没有投票
+FLOOD_MESSAGE = '刷新过于频繁，请 3 秒后再试'
+
+
+class StubForum:
+    """模拟论坛的数据与故障注入配置，页面HTML按需生成并缓存"""
+
+    def __init__(self, threads=5000, seed=0, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 failure_status=503, fids=(83,), rate_limit=0, throttle='429', etag=True):
+        self.threads = synthetic_threads(threads, seed)
+        self.boards = {}
+        for i, thread in enumerate(self.threads):
+            self.boards.setdefault(str(fids[i % len(fids)]), []).append(thread)
+        self.by_lastpost = {fid: sorted(board, key=lambda thread: thread['last_reply'], reverse=True)
+                            for fid, board in self.boards.items()}
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.rate_limit = rate_limit
+        self.throttle = throttle
+        self.etag = etag
+        self.recent = deque()    # 最近1秒内被接受的请求时间
+        self.rng = random.Random(seed)
+        self.pages = {}
+        self.lock = threading.Lock()
+        self.stats = {'connections': 0, 'requests': 0, 'failures': 0, 'throttled': 0, 'pages': 0, 'not_modified': 0,
+                      'polls': 0, 'logins': 0}
+        self.times = {}          # 计数器 -> 每次计数时的 time.monotonic()（用于检查请求速率）
+
+    @property
+    def total_pages(self):
+        return sum(self.board_pages(fid) for fid in self.boards)
+
+    def board_pages(self, fid):
+        return max(1, (len(self.boards.get(fid, ())) + THREADS_PER_PAGE - 1) // THREADS_PER_PAGE)
+
+    def page(self, fid, orderby, page):
+        key = (fid, orderby, page)
+        with self.lock:
+            html = self.pages.get(key)
+        if html is None:
+            threads = self.by_lastpost.get(fid, []) if orderby == 'lastpost' else self.boards.get(fid, [])
+            start = (page - 1) * THREADS_PER_PAGE
+            html = forum_page(threads[start:start + THREADS_PER_PAGE], page, self.board_pages(fid), fid, NOW)
+            with self.lock:
+                self.pages[key] = html
+        return html
+
+    def poll(self, tid):
+        """投票选项：与tid对应的确定性票数；部分帖子没有投票"""
+        if tid % NO_POLL_EVERY == 0:
+            return {'success': False, 'message': '该帖子没有投票'}
+        votes = [(tid * (i + 7)) % (31 + i * 11) for i in range(5)]
+        return {'success': True, 'data': [{'polloptionid': i + 1, 'votes': v} for i, v in enumerate(votes)]}
+
+    def count(self, name):
+        now = time.monotonic()
+        with self.lock:
+            self.stats[name] += 1
+            self.times.setdefault(name, []).append(now)
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self.lock:
+                offset = self.rng.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, self.latency + offset))
+
+    def throttled(self):
+        """滑动窗口限流：最近1秒内接受的请求数达到 rate_limit 时拒绝本次请求"""
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and self.recent[0] <= now - 1:
+                self.recent.popleft()
+            if len(self.recent) >= self.rate_limit:
+                self.stats['throttled'] += 1
+                return True
+            self.recent.append(now)
+            return False
+
+    def should_fail(self):
+        if not self.failure_rate:
+            return False
+        with self.lock:
+            return self.rng.random() < self.failure_rate
+
+
+def make_handler(forum):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'   # 支持keep-alive，与真实站点一致
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            # 每个处理器实例对应一个TCP连接（keep-alive时在同一连接上处理多个请求）
+            super().setup()
+            forum.count('connections')
+
+        def send(self, body, content_type='text/html; charset=utf-8', status=200, headers=()):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_json(self, payload):
+            self.send(json.dumps(payload, ensure_ascii=False), 'application/json; charset=utf-8')
+
+        def begin(self, api=False):
+            """记录请求、限流、注入延迟和失败；返回False表示已返回失败响应"""
+            forum.count('requests')
+            if forum.throttled():
+                if forum.throttle == 'flood':
+                    if api:
+                        self.send_json({'success': False, 'message': FLOOD_MESSAGE})
+                    else:
+                        self.send(f"<html><body><div id=\"messagetext\"><p>{FLOOD_MESSAGE}</p></div></body></html>")
+                else:
+                    self.send('Too Many Requests', status=429, headers=[('Retry-After', '1')])
+                return False
+            forum.delay()
+            if forum.should_fail():
+                forum.count('failures')
+                if forum.failure_status:
+                    self.send('Service Unavailable', status=forum.failure_status)
+                else:
+                    self.close_connection = True
+                return False
+            return True
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            if not self.begin():
+                return
+            if parts.path == f"{PREFIX}/forum.php" and query.get('mod') == ['forumdisplay']:
+                forum.count('pages')
+                fid = query.get('fid', [''])[0]
+                page = int(query.get('page', ['1'])[0])
+                if page > forum.board_pages(fid):
+                    page = forum.board_pages(fid)   # Discuz对超出范围的页码返回最后一页
+                html = forum.page(fid, query.get('orderby', ['dateline'])[0], page)
+                if not forum.etag:
+                    self.send(html)
+                    return
+                etag = '"%s"' % hashlib.md5(html.encode('utf-8')).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    forum.count('not_modified')
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send(html, headers=[('ETag', etag)])
+            else:
+                self.send('Not Found', status=404)
+
+        def do_POST(self):
+            parts = urlsplit(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            data = parse_qs(self.rfile.read(length).decode('utf-8'))
+            if not self.begin(api='/api/' in parts.path):
+                return
+            if parts.path == f"{PREFIX}/member.php":
+                forum.count('logins')
+                self.send("<root><![CDATA[succeed]]></root>", 'text/xml; charset=utf-8',
+                          headers=[('Set-Cookie', f"{AUTH_COOKIE}=stub; Path=/; HttpOnly")])
+            elif parts.path == f"{PREFIX}/api/app/user/login":
+                forum.count('logins')
+                self.send_json({'success': True, 'data': {'sid': SID}})
+            elif parts.path == f"{PREFIX}/api/app/poll/options":
+                forum.count('polls')
+                if data.get('sid') != [SID]:
+                    self.send_json({'success': False, 'message': '请先登录'})
+                    return
+                try:
+                    tid = int(data.get('tid', [''])[0])
+                except ValueError:
+                    self.send_json({'success': False, 'message': '参数错误'})
+                    return
+                self.send_json(forum.poll(tid))
+            else:
+                self.send('Not Found', status=404)
+
+    return Handler
+
+
+def start(forum, host='127.0.0.1', port=0):
+    """在后台线程中启动服务，返回 (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(forum))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}{PREFIX}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟 Stage1st 接口')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--threads', type=int, default=5000, help='合成帖子数')
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='延迟的随机波动（毫秒）')
+    parser.add_argument('--failure-rate', type=float, default=0, help='返回失败响应的概率')
+    parser.add_argument('--failure-status', type=int, default=503, help='失败响应的状态码（0为断开连接）')
+    parser.add_argument('--rate-limit', type=int, default=0, help='每秒最多接受的请求数（0为不限流）')
+    parser.add_argument('--throttle', choices=('429', 'flood'), default='429', help='限流时的响应方式')
+    parser.add_argument('--fids', type=int, nargs='+', default=[83], help='板块fid（帖子轮流分配到各板块）')
+    parser.add_argument('--no-etag', action='store_true', help='列表页不返回ETag（不支持条件请求）')
+    args = parser.parse_args()
+
+    forum = StubForum(args.threads, latency=args.latency, jitter=args.jitter,
+                      failure_rate=args.failure_rate, failure_status=args.failure_status,
+                      fids=args.fids, rate_limit=args.rate_limit, throttle=args.throttle,
+                      etag=not args.no_etag)
+    server, base_url = start(forum, port=args.port)
+    print(f"模拟服务已启动: S1_BASE_URL={base_url}（{len(forum.threads)} 个帖子，{forum.total_pages} 页）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
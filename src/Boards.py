@@ -0,0 +1,56 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# ====================================================================================
+# 多板块爬取：S1_FORUM_FIDS 为逗号分隔的板块fid列表（默认只爬动漫论坛 83）
+#   每个板块在单独的线程中爬取，所有请求共用客户端的自适应限速器（见 RateLimiter），
+#   总耗时接近最慢的板块而不是各板块之和
+#   每行的 fid 列记录来源板块；添加 fid 列之前的行都来自 DEFAULT_FID
+#   水位线（已知最大tid）按板块分别计算：tid全站递增，活跃板块的新帖会让全局最大tid
+#   超过其他板块的所有帖子，使用全局水位线会漏掉其他板块的新帖子
+# ====================================================================================
+DEFAULT_FID = '83'
+FORUM_FIDS = [fid.strip() for fid in os.environ.get('S1_FORUM_FIDS', DEFAULT_FID).split(',') if fid.strip()]
+BOARD_WORKERS = int(os.environ.get('S1_BOARD_WORKERS', '0')) or len(FORUM_FIDS)  # 并发爬取的板块数
+PAGE_WORKERS = int(os.environ.get('S1_PAGE_WORKERS', '4'))  # 全量爬取时每个板块并发请求的列表页数（1为逐页爬取）
+CRAWL_CONNECTIONS = BOARD_WORKERS * max(PAGE_WORKERS, 1)   # 爬取时同时进行的最大请求数（用于连接池大小）
+
+
+def row_fid(row):
+    """行所属的板块fid"""
+    return row.get('fid') or DEFAULT_FID
+
+def watermarks(rows, fids=None):
+    """各板块现有的最大tid（整数），没有数据的板块为0"""
+    fids = FORUM_FIDS if fids is None else fids
+    marks = dict.fromkeys(fids, 0)
+    for row in rows:
+        fid = row_fid(row)
+        if fid in marks:
+            try:
+                marks[fid] = max(marks[fid], int(row.get('tid') or 0))
+            except ValueError:
+                pass
+    return marks
+
+def run_boards(func, fids=None, workers=None):
+    """对每个板块调用 func(fid)（多个板块时并发执行），返回按fids顺序排列的 fid -> 结果
+
+    某个板块抛出异常时，等待其他板块结束后重新抛出第一个异常
+    """
+    fids = FORUM_FIDS if fids is None else fids
+    if len(fids) == 1:
+        return {fids[0]: func(fids[0])}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers or BOARD_WORKERS, len(fids)))) as executor:
+        futures = {fid: executor.submit(func, fid) for fid in fids}
+    results = {}
+    error = None
+    for fid, future in futures.items():
+        try:
+            results[fid] = future.result()
+        except Exception as err:
+            error = error or err
+    if error is not None:
+        raise error
+    return results
@@ -0,0 +1,142 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+import Metrics
+
+# ====================================================================================
+# 断点续跑：运行过程中把已完成的工作（爬取的列表页、抓取的投票结果）追加到检查点日志，
+# 运行中断（网络故障、定时任务超时）后重新运行时，从日志中恢复这些结果，只请求剩余部分
+#
+# 日志为 JSON Lines 文件 <CHECKPOINT_DIR>/<名称>.jsonl：第一行 {"key": ...}，之后每行一条记录
+#   key 由输入文件的内容和运行参数生成，输入变化（例如上一次运行已成功写回数据库）后旧日志作废
+#   记录每 FLUSH_EVERY 条或每 FLUSH_SECONDS 秒写盘一次（中断时最多丢失这部分工作）
+#   （S1_CHECKPOINT_FLUSH_EVERY / S1_CHECKPOINT_FLUSH_SECONDS 可调整，bench/check_resume.py 设为每条写盘）
+#   末尾不完整的行（写入时被中断）读取时忽略，下次写入前截断
+#   运行成功写回数据后调用 complete() 删除日志
+# S1_CHECKPOINT_DIR 设置为空时禁用检查点
+# ====================================================================================
+CHECKPOINT_DIR = os.environ.get('S1_CHECKPOINT_DIR', '.checkpoint')
+FLUSH_EVERY = int(os.environ.get('S1_CHECKPOINT_FLUSH_EVERY', '50'))          # 累计多少条记录后写盘
+FLUSH_SECONDS = float(os.environ.get('S1_CHECKPOINT_FLUSH_SECONDS', '10'))    # 距上次写盘超过该秒数时写盘
+
+
+def input_key(paths, *params):
+    """输入文件内容的摘要加上运行参数，作为检查点的key（不存在的文件记为missing）"""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            digest.update(b'\0')
+        except OSError:
+            digest.update(b'missing\0')
+    return ':'.join([digest.hexdigest()] + [str(param) for param in params])
+
+
+class Journal:
+    """只追加的检查点日志：load 读取上次中断前的记录，record 追加记录，complete 删除日志"""
+
+    def __init__(self, name, key, directory=CHECKPOINT_DIR):
+        self.name = name
+        self.key = key
+        self.enabled = bool(directory)
+        self.path = os.path.join(directory, f"{name}.jsonl") if directory else None
+        self.entries = []       # 从日志恢复的记录
+        self.pending = []       # 尚未写盘的记录
+        self.valid_size = 0     # 日志中完整行的结束位置
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        if self.enabled:
+            # 异常退出（包括exit(1)）时写出尚未写盘的记录
+            atexit.register(self.flush)
+
+    def load(self):
+        """读取与key匹配的记录；key不匹配（输入已变化）时丢弃旧日志"""
+        if not self.enabled or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError as err:
+            print(f"读取检查点失败，将从头开始: {err}")
+            return self
+
+        entries = []
+        valid = 0
+        # 最后一段没有换行符（为空或写入时被中断），不计入
+        for number, line in enumerate(data.split(b'\n')[:-1]):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if number == 0 and entry.get('key') != self.key:
+                print(f"检查点 {self.path} 与本次输入不匹配，已丢弃")
+                self.complete()
+                return self
+            if number:
+                entries.append(entry)
+            valid += len(line) + 1
+
+        self.entries = entries
+        self.valid_size = valid
+        if entries:
+            print(f"从检查点恢复 {len(entries)} 条记录: {self.path}")
+            Metrics.count('checkpoint_resumed', len(entries))
+        return self
+
+    def record(self, entry):
+        """追加一条记录（线程安全），按条数或时间间隔写盘"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.pending.append(entry)
+            if len(self.pending) >= FLUSH_EVERY or time.monotonic() - self._last_flush >= FLUSH_SECONDS:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self.enabled or not self.pending:
+            return
+        lines = b''.join(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n' for entry in self.pending)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            with open(self.path, 'r+b' if size else 'wb') as f:
+                if size > self.valid_size:
+                    # 上次写入中断留下的不完整行（或key不同的旧日志）
+                    f.truncate(self.valid_size)
+                f.seek(self.valid_size)
+                if not self.valid_size:
+                    f.write(json.dumps({'key': self.key}).encode('utf-8') + b'\n')
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+                self.valid_size = f.tell()
+        except OSError as err:
+            # 检查点只是优化，写入失败时不影响本次运行
+            print(f"写入检查点失败，本次不再记录检查点: {err}")
+            self.enabled = False
+            return
+        Metrics.count('checkpoint_records', len(self.pending))
+        self.pending = []
+
+    def complete(self):
+        """本次运行的结果已写回，删除日志"""
+        with self._lock:
+            self.pending = []
+            self.entries = []
+            self.valid_size = 0
+            if self.path and os.path.exists(self.path):
+                try:
+                    os.remove(self.path)
+                except OSError as err:
+                    print(f"删除检查点失败: {err}")
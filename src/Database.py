@@ -0,0 +1,105 @@
+import Storage
+
+
+class Table:
+    """database.csv 的内存表：一次加载，按tid索引，记录脏行，最后一次性写回"""
+
+    def __init__(self, path=Storage.DATABASE):
+        self.path = path
+        self.storage = Storage.open_storage(path)
+        self.fieldnames = []
+        self.rows = []          # 保持原始顺序的行列表
+        self.index = {}         # tid -> 行字典
+        self.dirty = set()      # 本次运行中被修改过的tid
+        self.schema_changed = False
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def load(self):
+        """读取CSV文件，不存在时使用基础字段创建空表"""
+        if not self.storage.exists():
+            print("未发现现有数据文件，将创建新文件")
+            self.fieldnames = ['title', 'tid', 'replies', 'views', 'post_time']
+            self.schema_changed = True
+            return self
+
+        self.bytes_read += self.storage.size()
+        self.fieldnames, self.rows = self.storage.read()
+        for row in self.rows:
+            tid = row.get('tid')
+            if tid:
+                self.index[tid] = row
+        print(f"已加载 {len(self.rows)} 条记录: {self.path}")
+        return self
+
+    def max_tid(self):
+        """返回现有最大tid（整数）"""
+        max_tid = 0
+        for tid in self.index:
+            try:
+                max_tid = max(max_tid, int(tid))
+            except ValueError:
+                pass
+        return max_tid
+
+    def ensure_columns(self, columns, after=None):
+        """确保列存在；缺失的列插入到after列之后（默认追加到末尾），返回新增的列"""
+        added = [col for col in columns if col not in self.fieldnames]
+        if not added:
+            return added
+        if after in self.fieldnames:
+            pos = self.fieldnames.index(after) + 1
+            self.fieldnames[pos:pos] = added
+        else:
+            self.fieldnames.extend(added)
+        for row in self.rows:
+            for col in added:
+                row.setdefault(col, '')
+        self.schema_changed = True
+        return added
+
+    def add(self, row):
+        """添加新行并标记为脏行"""
+        for col in self.fieldnames:
+            row.setdefault(col, '')
+        self.rows.append(row)
+        tid = row.get('tid')
+        if tid:
+            self.index[tid] = row
+            self.dirty.add(tid)
+
+    def mark_dirty(self, tids):
+        self.dirty.update(tid for tid in tids if tid in self.index)
+
+    def mark_all_dirty(self):
+        self.dirty.update(self.index)
+
+    def dirty_rows(self):
+        return [row for row in self.rows if row.get('tid') in self.dirty]
+
+    def ordered_rows(self):
+        """按tid从大到小排序的行（与GetThread.py写出的顺序一致）"""
+        def tid_key(row):
+            try:
+                return int(row.get('tid', 0))
+            except ValueError:
+                return 0
+        return sorted(self.rows, key=tid_key, reverse=True)
+
+    def save(self):
+        """仅当存在修改时写回：CSV整体重写，SQLite只写入脏行后导出CSV，返回是否写入"""
+        if not self.dirty and not self.schema_changed:
+            print("数据无变化，跳过写入")
+            return False
+
+        try:
+            if isinstance(self.storage, Storage.SqliteStorage):
+                self.storage.write(self.fieldnames, self.rows, self.dirty)
+                self.bytes_written += self.storage.export_csv()
+            else:
+                self.bytes_written += self.storage.write(self.fieldnames, self.ordered_rows())
+            print(f"✅ 已保存 {len(self.rows)} 条记录（修改 {len(self.dirty)} 条）: {self.path}")
+            return True
+        except Exception as err:
+            print(f"保存数据失败: {err}")
+            return False
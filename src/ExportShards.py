@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+# Brotli为可选依赖：未安装时只生成 .gz
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ====================================================================================
+# 分片导出：按季度（1/4/7/10月新番季）和类别把JSON数据拆成小文件，并生成清单 index.json
+#   <目录>/season/2026-10.json   当季（10-12月）作品，首页只需下载这一份
+#   <目录>/category/TV.json
+#   <目录>/index.json            每个分片的路径、内容哈希、行数、字节数
+# 每个文件旁边生成预压缩的 .gz / .br；内容未变化的分片不重写，便于pages提交只包含变化的文件
+# ====================================================================================
+SHARD_DIR = os.environ.get('S1_JSON_SHARDS', '')  # 分片输出目录，为空时不生成分片
+MANIFEST = 'index.json'
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def _safe_name(value):
+    return re.sub(r'[^0-9A-Za-z._-]+', '_', value) or 'unknown'
+
+def season_key(row):
+    """季度分片键：月份归入所在季度的起始月，例如 2026-8 -> 2026-7；无法解析时归入 unknown"""
+    try:
+        year, month = int(row.get('year', '')), int(row.get('month', ''))
+    except (TypeError, ValueError):
+        return 'unknown'
+    if not 1 <= month <= 12:
+        return 'unknown'
+    return f"{year}-{(month - 1) // 3 * 3 + 1}"
+
+def category_key(row):
+    """类别分片键（统一大写，避免 Web/WEB 在不区分大小写的文件系统上冲突）"""
+    return _safe_name(row.get('category', '').upper())
+
+def _season_order(key):
+    try:
+        year, month = key.split('-')
+        return int(year), int(month)
+    except ValueError:
+        return 0, 0
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def compress_siblings(path):
+    """生成 path.gz（mtime固定为0，相同内容得到相同字节）以及 path.br（安装了brotli时）"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    with open(path + '.gz', 'wb') as raw:
+        with gzip.GzipFile(filename='', mode='wb', compresslevel=GZIP_LEVEL, fileobj=raw, mtime=0) as gz:
+            gz.write(content)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content, quality=BROTLI_QUALITY))
+
+def remove_with_siblings(path):
+    for name in (path, path + '.gz', path + '.br'):
+        if os.path.exists(name):
+            os.unlink(name)
+
+def write_if_changed(path, content):
+    """写入小文件并生成预压缩文件；内容与现有文件相同时不重写，返回是否写入"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    compress_siblings(path)
+    return True
+
+
+class _Shard:
+    """逐行写入临时文件的单个分片（内容为JSON数组）"""
+
+    def __init__(self, out_dir, relpath):
+        self.relpath = relpath
+        self.path = os.path.join(out_dir, relpath)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(
+            mode='w',
+            encoding='utf-8',
+            dir=os.path.dirname(self.path),
+            delete=False
+        )
+        self.file.write('[')
+        self.rows = 0
+        self.hash = hashlib.sha256(b'[')
+
+    def write(self, text):
+        chunk = (',' if self.rows else '') + text
+        self.file.write(chunk)
+        self.hash.update(chunk.encode('utf-8'))
+        self.rows += 1
+
+    def close(self):
+        """关闭临时文件，内容变化时替换正式文件并重新压缩，返回清单条目"""
+        self.file.write(']')
+        self.file.close()
+        self.hash.update(b']')
+        digest = self.hash.hexdigest()[:16]
+        if os.path.exists(self.path) and _file_hash(self.path) == digest:
+            os.unlink(self.file.name)
+        else:
+            os.replace(self.file.name, self.path)
+            compress_siblings(self.path)
+        return {
+            'path': self.relpath,
+            'hash': digest,
+            'rows': self.rows,
+            'bytes': os.path.getsize(self.path)
+        }
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.unlink(self.file.name)
+
+
+class ShardWriter:
+    """随JSON导出逐行接收数据，结束时写出分片与清单"""
+
+    def __init__(self, out_dir=SHARD_DIR):
+        self.out_dir = out_dir
+        self.groups = {'seasons': {}, 'categories': {}}
+
+    def _shard(self, group, key):
+        shards = self.groups[group]
+        if key not in shards:
+            folder = 'season' if group == 'seasons' else 'category'
+            shards[key] = _Shard(self.out_dir, f"{folder}/{key}.json")
+        return shards[key]
+
+    def add(self, row, text=None):
+        """添加一行；text为已经序列化好的行JSON（避免重复序列化）"""
+        if text is None:
+            text = json.dumps(row, ensure_ascii=False, separators=(',', ':'))
+        self._shard('seasons', season_key(row)).write(text)
+        self._shard('categories', category_key(row)).write(text)
+
+    def discard(self):
+        for shards in self.groups.values():
+            for shard in shards.values():
+                shard.discard()
+
+    def finish(self, update_time):
+        """写出所有分片和清单，删除已不存在的旧分片，返回清单"""
+        os.makedirs(self.out_dir or '.', exist_ok=True)
+        manifest_path = os.path.join(self.out_dir, MANIFEST)
+        previous = {}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = {}
+
+        manifest = {'update_time': update_time}
+        seasons = sorted(self.groups['seasons'], key=_season_order, reverse=True)
+        manifest['latest_season'] = next((key for key in seasons if key != 'unknown'), None)
+        manifest['seasons'] = {key: self.groups['seasons'][key].close() for key in seasons}
+        manifest['categories'] = {
+            key: self.groups['categories'][key].close() for key in sorted(self.groups['categories'])
+        }
+
+        # 删除上一次存在、本次已没有数据的分片
+        for group in ('seasons', 'categories'):
+            for key, entry in previous.get(group, {}).items():
+                if key not in manifest[group]:
+                    remove_with_siblings(os.path.join(self.out_dir, entry['path']))
+
+        write_if_changed(manifest_path, json.dumps(manifest, ensure_ascii=False, separators=(',', ':')))
+        changed = sum(1 for group in ('seasons', 'categories') for key, entry in manifest[group].items()
+                      if previous.get(group, {}).get(key, {}).get('hash') != entry['hash'])
+        print(f"已生成分片: {len(manifest['seasons'])} 个季度，{len(manifest['categories'])} 个类别，"
+              f"变化 {changed} 个: {self.out_dir}")
+        return manifest
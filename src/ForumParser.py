@@ -0,0 +1,195 @@
+import hashlib
+import os
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+import Metrics
+
+# ====================================================================================
+# 板块列表页解析：两种实现返回完全相同的结果
+#   bs4 : 用 html.parser 构建整页DOM，再用CSS选择器提取（原实现）
+#   fast: 只解析帖子行所在的HTML片段，并只构建帖子行(tbody[id^="normalthread_"])的DOM，
+#         安装了lxml时使用lxml，用 find 代替 CSS 选择器
+# ====================================================================================
+PARSER = os.environ.get('S1_HTML_PARSER', 'bs4')
+
+# 写入数据库的帖子字段；解析结果额外包含 last_reply（最后回复时间文本，有完整时间时取完整时间）
+THREAD_FIELDS = ('title', 'tid', 'replies', 'views', 'post_time')
+
+try:
+    import lxml  # noqa: F401
+    FAST_BACKEND = 'lxml'
+except ImportError:
+    FAST_BACKEND = 'html.parser'
+
+THREAD_ROW_ID = re.compile(r'^normalthread_')
+NEXT_LINK = re.compile(r'<a\b[^>]*\bclass="[^"]*\bnxt\b')
+# 分页器中的总页数：<span title="共 N 页">，或指向最后一页的 <a href="...page=N" class="last">
+PAGE_COUNT = re.compile(r'title="共\s*(\d+)\s*页"')
+LAST_PAGE_LINK = re.compile(r'<a\b[^>]*\bpage=(\d+)[^>]*\bclass="last"')
+
+def extract_tid_from_url(url):
+    """从URL中提取帖子ID(tid)"""
+    match = re.search(r'thread-(\d+)', url)
+    if match:
+        return match.group(1)
+    match = re.search(r'tid=(\d+)', url)
+    if match:
+        return match.group(1)
+    return None
+
+def _tid_from_link(relative_link, base_url):
+    tid = extract_tid_from_url(relative_link)
+    if not tid:
+        # 如果从相对链接提取失败，尝试完整链接
+        tid = extract_tid_from_url(f"{base_url}/{relative_link}")
+    if not tid:
+        print(f"警告: 无法从链接中提取tid: {relative_link}")
+    return tid
+
+def _text_or_title(tag):
+    if not tag:
+        return ''
+    return tag.get('title') if tag.has_attr('title') else tag.get_text(strip=True)
+
+def _link_time(link):
+    # 近期的最后回复时间显示为相对时间（"3 小时前"），完整时间在内层span的title属性中
+    span = link.find('span')
+    return _text_or_title(span) if span is not None else link.get_text(strip=True)
+
+def _parse_row_bs4(row, base_url):
+    title_tag = row.select_one('a.xst')
+    if not title_tag:
+        return None
+    tid = _tid_from_link(title_tag['href'], base_url)
+    if not tid:
+        return None
+
+    # 提取回复数和浏览量
+    numbers = row.select_one('td.num')
+    if numbers:
+        replies = numbers.find_all('a')[0].get_text(strip=True)
+        views = numbers.find_all('em')[0].get_text(strip=True)
+    else:
+        replies = views = ''
+
+    # 提取发帖时间
+    time_tag = row.select_one('td.by em span') or row.select_one('td.by em')
+
+    # 第二个td.by包含最后回复时间，优先从em > a标签获取
+    last_reply = ''
+    by_cells = row.select('td.by')
+    if len(by_cells) >= 2:
+        time_link = by_cells[1].select_one('em a')
+        if time_link:
+            last_reply = _link_time(time_link)
+        else:
+            em_tag = by_cells[1].select_one('em')
+            last_reply = em_tag.get_text(strip=True) if em_tag else ''
+
+    return {
+        'title': title_tag.get_text(strip=True),
+        'tid': tid,
+        'replies': replies,
+        'views': views,
+        'post_time': _text_or_title(time_tag),
+        'last_reply': last_reply
+    }
+
+def _parse_row_fast(row, base_url):
+    title_tag = row.find('a', class_='xst')
+    if not title_tag:
+        return None
+    tid = _tid_from_link(title_tag['href'], base_url)
+    if not tid:
+        return None
+
+    numbers = row.find('td', class_='num')
+    if numbers:
+        replies = numbers.find('a').get_text(strip=True)
+        views = numbers.find('em').get_text(strip=True)
+    else:
+        replies = views = ''
+
+    by_cells = row.find_all('td', class_='by')
+
+    # 与 'td.by em span' 或 'td.by em' 相同的匹配顺序
+    first_span = None
+    first_em = None
+    for cell in by_cells:
+        for em_tag in cell.find_all('em'):
+            if first_em is None:
+                first_em = em_tag
+            first_span = em_tag.find('span')
+            if first_span is not None:
+                break
+        if first_span is not None:
+            break
+    time_tag = first_span or first_em
+
+    last_reply = ''
+    if len(by_cells) >= 2:
+        time_link = None
+        em_tags = by_cells[1].find_all('em')
+        for em_tag in em_tags:
+            time_link = em_tag.find('a')
+            if time_link is not None:
+                break
+        if time_link:
+            last_reply = _link_time(time_link)
+        elif em_tags:
+            last_reply = em_tags[0].get_text(strip=True)
+
+    return {
+        'title': title_tag.get_text(strip=True),
+        'tid': tid,
+        'replies': replies,
+        'views': views,
+        'post_time': _text_or_title(time_tag),
+        'last_reply': last_reply
+    }
+
+def _rows_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.select('tbody[id^="normalthread_"]'), soup.select_one('a.nxt') is not None
+
+def _rows_fast(html):
+    has_next = NEXT_LINK.search(html) is not None
+    # 只把第一个帖子行到最后一个</tbody>之间的片段交给解析器，跳过页头、导航等内容
+    start = html.find('<tbody id="normalthread_')
+    if start < 0:
+        return [], has_next
+    end = html.rfind('</tbody>')
+    fragment = html[start:end + len('</tbody>')] if end > start else html[start:]
+    strainer = SoupStrainer('tbody', id=THREAD_ROW_ID)
+    soup = BeautifulSoup(fragment, FAST_BACKEND, parse_only=strainer)
+    return soup.find_all('tbody', id=THREAD_ROW_ID), has_next
+
+def parse_total_pages(html):
+    """从分页器读取板块列表的总页数；只有一页时Discuz不输出分页器，返回1；无法识别时返回None"""
+    match = PAGE_COUNT.search(html) or LAST_PAGE_LINK.search(html)
+    if match:
+        return int(match.group(1))
+    return None if NEXT_LINK.search(html) else 1
+
+def page_digest(html):
+    """列表页内容的摘要：只包含帖子行和分页器信息（页头、页脚时间、formhash等每次请求都不同）"""
+    start = html.find('<tbody id="normalthread_')
+    end = html.rfind('</tbody>')
+    fragment = html[start:end] if start >= 0 and end > start else ''
+    pager = f"{parse_total_pages(html)}:{NEXT_LINK.search(html) is not None}:"
+    return hashlib.blake2b((pager + fragment).encode('utf-8'), digest_size=16).hexdigest()
+
+def parse_forum_page(html, base_url, parser=None):
+    """解析板块列表页，返回 (帖子字典列表, 是否有下一页)
+
+    帖子字典包含 THREAD_FIELDS 以及 last_reply
+    """
+    with Metrics.stage('parse'):
+        if (parser or PARSER) == 'fast':
+            rows, has_next = _rows_fast(html)
+            parse_row = _parse_row_fast
+        else:
+            rows, has_next = _rows_bs4(html)
+            parse_row = _parse_row_bs4
+        threads = [thread for thread in (parse_row(row, base_url) for row in rows) if thread]
+    return threads, has_next
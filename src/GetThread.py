@@ -1,64 +1,43 @@
 import requests
-from bs4 import BeautifulSoup
 import time
 import csv
 import os
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import Boards
+import Checkpoint
+import ForumParser
+import HttpCache
+import Metrics
+import S1Client
+import TimeParser
 
 # ====================================================================================
 # 使用环境变量配置论坛信息
 # ====================================================================================
 CONFIG = {
-    'base_url': 'https://stage1st.com/2b',
-    'username': os.environ.get('S1_USERNAME', ''),  # 从环境变量获取用户名
-    'password': os.environ.get('S1_PASSWORD', ''),  # 从环境变量获取密码
-    'forum_fid': 83,
-    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
+    'base_url': S1Client.BASE_URL,
+    'username': S1Client.USERNAME,  # 从环境变量 S1_USERNAME 获取用户名
+    'password': S1Client.PASSWORD,  # 从环境变量 S1_PASSWORD 获取密码
+    'forum_fids': Boards.FORUM_FIDS,  # 从环境变量 S1_FORUM_FIDS 获取板块列表（见 Boards）
+    # full: 按发帖时间爬完整个板块；incremental: 爬到已知最大tid即停止，再按最后回复时间刷新有新回复的帖子
+    'crawl_mode': os.environ.get('S1_CRAWL_MODE', 'full'),
+    # incremental模式下，连续遇到多少个回复数未变化的帖子后停止按最后回复时间的爬取
+    'unchanged_stop': 3,
+    # full模式下每个板块并发请求的列表页数：先从第1页的分页器读取总页数，再并发请求其余页面
+    # （从环境变量 S1_PAGE_WORKERS 获取，1为逐页爬取）
+    'page_workers': Boards.PAGE_WORKERS,
+    'user_agent': S1Client.USER_AGENT
 }
 # ====================================================================================
 
-def extract_tid_from_url(url):
-    """从URL中提取帖子ID(tid)"""
-    match = re.search(r'thread-(\d+)', url)
-    if match:
-        return match.group(1)
-    match = re.search(r'tid=(\d+)', url)
-    if match:
-        return match.group(1)
-    return None
-
-def login(session, base_url, username, password):
-    # 检查凭据是否设置
-    if not username or not password:
-        print("错误：用户名或密码未设置！")
-        return False
-    
-    print("正在尝试登录...")
-    login_url = f"{base_url}/member.php?mod=logging&action=login&loginsubmit=yes"
-    data = {
-        'username': username,
-        'password': password,
-        'quickforward': 'yes',
-        'handlekey': 'ls'
-    }
-    headers = {'User-Agent': CONFIG['user_agent']}
 
-    try:
-        response = session.post(login_url, data=data, headers=headers)
-        response.raise_for_status()
-        if 'succeed' in response.text or username in response.text:
-            print("登录成功！")
-            return True
-        else:
-            print("登录失败！请检查用户名和密码。")
-            return False
-    except requests.exceptions.RequestException as e:
-        print(f"登录请求发生错误: {e}")
-        return False
+class CrawlError(Exception):
+    """列表页爬取失败；已爬取的页面保存在检查点中，重新运行时从失败的页面继续"""
 
-def scrape_forum():
-    # 检查现有数据文件
-    output_filename = "database.csv"
+
+def load_existing(output_filename):
+    """读取现有数据文件，返回以tid为key的字典、最大tid和字段名列表"""
     existing_dict = {}  # 存储现有帖子的字典，key为tid
     max_existing_tid = 0  # 现有最大tid
     fieldnames_list = []  # 存储所有字段名的有序列表
@@ -94,118 +73,313 @@ def scrape_forum():
         # 基础字段顺序
         fieldnames_list = ['title', 'tid', 'replies', 'views', 'post_time']
 
-    with requests.Session() as session:
-        if not login(session, CONFIG['base_url'], CONFIG['username'], CONFIG['password']):
+    return existing_dict, max_existing_tid, fieldnames_list
+
+def scrape_forum(journal=None):
+    # 检查现有数据文件
+    with Metrics.stage('csv_read'):
+        existing_dict, _, fieldnames_list = load_existing("database.csv")
+
+    # 连接池至少与爬取时的并发请求数相同
+    with S1Client.Client(pool_size=max(S1Client.POOL_SIZE, Boards.CRAWL_CONNECTIONS)) as client:
+        if not client.login_web():
             return None, existing_dict, fieldnames_list
 
-        new_threads = []
-        page = 1
-        forum_url = f"{CONFIG['base_url']}/forum.php?mod=forumdisplay&fid={CONFIG['forum_fid']}&filter=author&orderby=dateline"
-        print(f"\n开始爬取板块 (fid={CONFIG['forum_fid']})...")
-        has_more_pages = True
+        try:
+            new_threads, _ = crawl(client.session, existing_dict, fieldnames_list, journal)
+        except CrawlError as e:
+            # 不保存只爬取了一部分的结果（否则下次增量爬取会越过未爬取的新帖子）
+            print(f"{e}，本次不保存，重新运行时从检查点继续")
+            return None, existing_dict, fieldnames_list
+        return new_threads, existing_dict, fieldnames_list
 
-        while has_more_pages:
-            current_page_url = f"{forum_url}&page={page}"
-            print(f"正在爬取第 {page} 页...")
+def journal_params():
+    """影响列表页检查点内容的爬取参数（参数变化后旧检查点作废）"""
+    parallel = CONFIG['crawl_mode'] != 'incremental' and CONFIG['page_workers'] > 1
+    return CONFIG['crawl_mode'], ','.join(CONFIG['forum_fids']), 'parallel' if parallel else 'sequential'
 
-            headers = {'User-Agent': CONFIG['user_agent']}
+def new_journal(path="database.csv"):
+    """列表页爬取的检查点（数据库内容和爬取参数不变时才恢复）"""
+    return Checkpoint.Journal('GetThread', Checkpoint.input_key([path], *journal_params()))
 
-            try:
-                response = session.get(current_page_url, headers=headers)
-                response.raise_for_status()
-                response.encoding = 'utf-8'
+_stats_lock = threading.Lock()
 
-                soup = BeautifulSoup(response.text, 'html.parser')
-                thread_rows = soup.select('tbody[id^="normalthread_"]')
+def fetch_list_page(session, fid, orderby, page, stats):
+    """请求并解析板块fid列表的第page页，返回 (帖子列表, 是否有下一页, 分页器中的总页数)
+    
+    帖子只保留写入数据库的字段，fid 字段为来源板块，post_ts/last_reply_ts 为发帖/最后回复时间戳
+    （见 TimeParser）；请求或解析失败时抛出 CrawlError
+    """
+    list_filter = 'author' if orderby == 'dateline' else 'lastpost'
+    url = (f"{CONFIG['base_url']}/forum.php?mod=forumdisplay&fid={fid}"
+           f"&filter={list_filter}&orderby={orderby}&page={page}")
+    print(f"[fid={fid}] 正在爬取第 {page} 页...")
+    start_time = time.time()
 
-                if not thread_rows:
-                    print("在本页未找到帖子，可能已到达最后一页。")
-                    break
+    def parse(html):
+        threads, has_next = ForumParser.parse_forum_page(html, CONFIG['base_url'])
+        return [threads, has_next, ForumParser.parse_total_pages(html)]
 
-                for row in thread_rows:
-                    title_tag = row.select_one('a.xst')
-                    if not title_tag:
-                        continue
+    try:
+        # 内容与上次运行相同的页面不再解析（见 HttpCache）
+        threads, has_next, total_pages = HttpCache.shared_cache().get(
+            session, url, parse, digest=ForumParser.page_digest, headers={'User-Agent': CONFIG['user_agent']})
+        # 生成新的字典：新帖子会被加入数据库并在后续阶段修改，不能改动缓存中的结果；
+        # 相对时间（没有完整时间时）按本次请求的时间换算，不缓存换算结果
+        now = time.time()
+        threads = [{**{key: thread[key] for key in ForumParser.THREAD_FIELDS}, 'fid': fid,
+                    **TimeParser.thread_timestamps(thread, now)} for thread in threads]
+        return threads, has_next, total_pages
+    except requests.exceptions.RequestException as e:
+        raise CrawlError(f"爬取板块 {fid} 第 {page} 页时发生错误: {e}") from e
+    except Exception as e:
+        raise CrawlError(f"处理板块 {fid} 第 {page} 页时发生未知错误: {e}") from e
+    finally:
+        # 并发请求时多个线程共用同一个stats
+        with _stats_lock:
+            stats['pages'] += 1
+            stats['seconds'] += time.time() - start_time
 
-                    title = title_tag.get_text(strip=True)
-                    relative_link = title_tag['href']
-                    
-                    # 提取tid
-                    tid = extract_tid_from_url(relative_link)
-                    if not tid:
-                        # 如果从相对链接提取失败，尝试完整链接
-                        full_link = f"{CONFIG['base_url']}/{relative_link}"
-                        tid = extract_tid_from_url(full_link)
-                    
-                    if not tid:
-                        print(f"警告: 无法从链接中提取tid: {relative_link}")
-                        continue
-                    
-                    # 提取回复数和浏览量
-                    numbers = row.select_one('td.num')
-                    if numbers:
-                        replies = numbers.find_all('a')[0].get_text(strip=True)
-                        views = numbers.find_all('em')[0].get_text(strip=True)
-                    else:
-                        replies = views = ''
-
-                    # 提取发帖时间
-                    time_tag = row.select_one('td.by em span') or row.select_one('td.by em')
-                    post_time = time_tag.get('title') if time_tag and time_tag.has_attr('title') else time_tag.get_text(strip=True) if time_tag else ''
-                    
-                    # 将tid转换为整数用于比较
-                    try:
-                        tid_int = int(tid)
-                    except ValueError:
-                        tid_int = 0
-                    
-                    # 判断是否为新帖子（tid大于现有最大tid）
-                    if tid_int > max_existing_tid:
-                        print(f"发现新帖子 (tid={tid})，添加到数据库")
-                        # 创建包含基础字段的新帖子数据
-                        new_thread = {
-                            'title': title,
-                            'tid': tid,
-                            'replies': replies,
-                            'views': views,
-                            'post_time': post_time
-                        }
-                        new_threads.append(new_thread)
-                        
-                        # 检查新字段是否需要添加到字段列表
-                        for key in new_thread.keys():
-                            if key not in fieldnames_list:
-                                print(f"发现新字段 '{key}'，添加到字段列表末尾")
-                                fieldnames_list.append(key)
-                    else:
-                        # 更新现有帖子的回复数和浏览量
-                        if tid in existing_dict:
-                            print(f"更新现有帖子 (tid={tid}) 的回复数和浏览量")
-                            existing_dict[tid]['replies'] = replies
-                            existing_dict[tid]['views'] = views
-
-                # 检查是否有下一页
-                next_page_link = soup.select_one('a.nxt')
-                if not next_page_link:
-                    print("未找到'下一页'按钮，爬取结束。")
-                    has_more_pages = False
-                else:
-                    page += 1
-                    time.sleep(0.5)
-
-            except requests.exceptions.RequestException as e:
-                print(f"爬取第 {page} 页时发生错误: {e}")
-                break
-            except Exception as e:
-                print(f"处理第 {page} 页时发生未知错误: {e}")
+def _journaled_pages(journal, fid, orderby):
+    return [entry for entry in (journal.entries if journal is not None else ())
+            if entry.get('fid') == fid and entry.get('orderby') == orderby]
+
+def iter_list_pages(session, fid, orderby, stats, journal=None):
+    """按指定排序（dateline/lastpost）逐页爬取板块fid的列表，逐页产出 (页码, 帖子列表)
+    
+    stats 用于累计本次爬取的页数和耗时；journal 为检查点日志，先产出其中已爬取的页面，
+    再从下一页继续爬取，每爬取一页记录一次。请求或解析失败时抛出 CrawlError
+    """
+    page = 1
+    for entry in _journaled_pages(journal, fid, orderby):
+        yield entry['page'], entry['threads']
+        if not entry['has_next']:
+            return
+        page = entry['page'] + 1
+
+    while True:
+        threads, has_next, _ = fetch_list_page(session, fid, orderby, page, stats)
+        if not threads:
+            print("在本页未找到帖子，可能已到达最后一页。")
+            return
+
+        if journal is not None:
+            journal.record({'fid': fid, 'orderby': orderby, 'page': page, 'threads': threads, 'has_next': has_next})
+        yield page, threads
+
+        # 检查是否有下一页
+        if not has_next:
+            print("未找到'下一页'按钮，爬取结束。")
+            return
+        # 请求间隔由会话共享的自适应限速器控制（见 RateLimiter）
+        page += 1
+
+def iter_list_pages_parallel(session, fid, orderby, stats, journal=None, workers=None):
+    """与 iter_list_pages 相同，但先请求第1页并从分页器读取总页数，再以最多workers个并发请求
+    其余页面，按完成顺序（不保证页码顺序）产出 (页码, 帖子列表)
+    
+    每个页面请求完成后立即记录到检查点，恢复时只请求检查点中没有的页面。
+    爬取过程中有新帖子时，帖子会被挤到下一页，同一个帖子可能出现在两个页面中，调用方需按tid去重；
+    分页器无法识别时退回逐页爬取
+    """
+    workers = workers or CONFIG['page_workers']
+    done = {entry['page']: entry for entry in _journaled_pages(journal, fid, orderby)}
+    for page in sorted(done):
+        yield page, done[page]['threads']
+
+    total_pages = done[1].get('total_pages') if 1 in done else None
+    if total_pages is None:
+        threads, has_next, total_pages = fetch_list_page(session, fid, orderby, 1, stats)
+        if total_pages is None:
+            print(f"[fid={fid}] 未能从分页器读取总页数，改为逐页爬取")
+            yield from iter_list_pages(session, fid, orderby, stats, journal)
+            return
+        if journal is not None:
+            journal.record({'fid': fid, 'orderby': orderby, 'page': 1, 'threads': threads,
+                            'has_next': has_next, 'total_pages': total_pages})
+        if 1 not in done:
+            yield 1, threads
+
+    pending = [page for page in range(2, total_pages + 1) if page not in done]
+    if not pending:
+        return
+    print(f"[fid={fid}] 共 {total_pages} 页，以 {workers} 个并发请求爬取其余 {len(pending)} 页...")
+
+    def fetch(page):
+        threads, has_next, _ = fetch_list_page(session, fid, orderby, page, stats)
+        if threads and journal is not None:
+            journal.record({'fid': fid, 'orderby': orderby, 'page': page, 'threads': threads, 'has_next': has_next})
+        return threads
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {executor.submit(fetch, page): page for page in pending}
+        for future in as_completed(futures):
+            threads = future.result()
+            if threads:
+                yield futures[future], threads
+    finally:
+        # 出错或调用方提前结束时取消尚未开始的请求
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def new_stats(name):
+    return {'name': name, 'pages': 0, 'seconds': 0.0}
+
+def print_crawl_report(mode, stats_list, wall_seconds):
+    """输出各轮爬取的页数与耗时，便于比较不同爬取模式"""
+    total_pages = sum(stats['pages'] for stats in stats_list)
+    print(f"\n爬取统计 (模式: {mode})")
+    for stats in stats_list:
+        average = stats['seconds'] / stats['pages'] if stats['pages'] else 0
+        print(f"  {stats['name']}: {stats['pages']} 页，请求+解析 {stats['seconds']:.2f} 秒，平均每页 {average:.3f} 秒")
+    print(f"  合计: {total_pages} 页，总耗时 {wall_seconds:.2f} 秒")
+
+def update_counts(existing_row, thread, updated_tids):
+    """更新现有帖子的回复数、浏览量、来源板块（补全旧数据的fid列，或帖子被移动到其他板块）
+    和时间戳（无法解析时保留原值），有变化时记录tid"""
+    refreshed = {key: thread[key] for key in ('replies', 'views', 'fid')}
+    refreshed.update((key, thread[key]) for key in TimeParser.COLUMNS if thread.get(key))
+    if any(existing_row.get(key) != value for key, value in refreshed.items()):
+        updated_tids.add(thread['tid'])
+    existing_row.update(refreshed)
+
+def add_new_thread(thread, new_threads, fieldnames_list):
+    print(f"发现新帖子 (fid={thread['fid']}, tid={thread['tid']})，添加到数据库")
+    new_threads.append(thread)
+    
+    # 检查新字段是否需要添加到字段列表
+    for key in thread.keys():
+        if key not in fieldnames_list:
+            print(f"发现新字段 '{key}'，添加到字段列表末尾")
+            fieldnames_list.append(key)
+
+def tid_to_int(tid):
+    try:
+        return int(tid)
+    except ValueError:
+        return 0
+
+def crawl(session, existing_dict, fieldnames_list, journal=None):
+    """按 CONFIG['crawl_mode'] 选择爬取方式，并发爬取 CONFIG['forum_fids'] 中的所有板块
+    
+    每个板块使用自己的水位线（该板块现有的最大tid），返回合并后的 (新帖子列表, 有变化的tid集合)
+    """
+    # 先在主线程中补齐字段，避免各板块线程同时向字段列表追加
+    for key in ForumParser.THREAD_FIELDS + ('fid',) + TimeParser.COLUMNS:
+        if key not in fieldnames_list:
+            print(f"发现新字段 '{key}'，添加到字段列表末尾")
+            fieldnames_list.append(key)
+    # 添加时间戳列之前的数据按post_time回填
+    backfilled = TimeParser.fill_post_ts(existing_dict.values())
+    if backfilled:
+        print(f"按发帖时间回填 {len(backfilled)} 条记录的 post_ts")
+    marks = Boards.watermarks(existing_dict.values(), CONFIG['forum_fids'])
+    crawl_board = crawl_incremental if CONFIG['crawl_mode'] == 'incremental' else crawl_forum
+
+    start_time = time.time()
+    try:
+        results = Boards.run_boards(
+            lambda fid: crawl_board(session, fid, existing_dict, marks[fid], fieldnames_list, journal),
+            CONFIG['forum_fids'])
+    finally:
+        # 爬取中断时也保存已下载页面的缓存
+        HttpCache.shared_cache().save()
+    new_threads = [thread for board_new, _ in results.values() for thread in board_new]
+    updated_tids = set(backfilled).union(*(board_updated for _, board_updated in results.values()))
+    if len(results) > 1:
+        print(f"\n{len(results)} 个板块爬取完成，总耗时 {time.time() - start_time:.2f} 秒")
+    Metrics.count('threads_new', len(new_threads))
+    Metrics.count('threads_updated', len(updated_tids))
+    return new_threads, updated_tids
+
+def crawl_forum(session, fid, existing_dict, max_existing_tid, fieldnames_list, journal=None):
+    """按发帖时间爬取整个板块：收集新帖子，并就地更新现有帖子的回复数和浏览量
+    
+    返回 (新帖子列表, 回复数/浏览量发生变化的现有tid集合)
+    """
+    new_threads = []
+    updated_tids = set()
+    stats = new_stats(f'fid={fid} 按发帖时间')
+    start_time = time.time()
+    print(f"\n开始爬取板块 (fid={fid})...")
+
+    pages = iter_list_pages_parallel if CONFIG['page_workers'] > 1 else iter_list_pages
+    seen = set()
+    for page, threads in pages(session, fid, 'dateline', stats, journal):
+        for thread in threads:
+            tid = thread['tid']
+            # 爬取过程中有新帖子时，同一个帖子可能出现在相邻的两页中，按tid合并
+            if tid in seen:
+                continue
+            seen.add(tid)
+            # 判断是否为新帖子（tid大于现有最大tid）
+            if tid_to_int(tid) > max_existing_tid:
+                add_new_thread(thread, new_threads, fieldnames_list)
+            elif tid in existing_dict:
+                # 更新现有帖子的回复数和浏览量
+                print(f"更新现有帖子 (tid={tid}) 的回复数和浏览量")
+                update_counts(existing_dict[tid], thread, updated_tids)
+
+    print_crawl_report('full', [stats], time.time() - start_time)
+    return new_threads, updated_tids
+
+def crawl_incremental(session, fid, existing_dict, max_existing_tid, fieldnames_list, journal=None):
+    """增量爬取：
+    1. 按发帖时间爬取，越过已知最大tid（水位线）所在页即停止，收集新帖子
+    2. 按最后回复时间爬取，刷新有新回复的帖子的回复数和浏览量；
+       连续遇到若干个回复数未变化的帖子后停止（其后的帖子都没有新回复）
+    
+    返回 (新帖子列表, 回复数/浏览量发生变化的现有tid集合)
+    """
+    new_threads = []
+    updated_tids = set()
+    dateline_stats = new_stats(f'fid={fid} 按发帖时间')
+    lastpost_stats = new_stats(f'fid={fid} 按最后回复')
+    start_time = time.time()
+
+    print(f"\n开始增量爬取板块 (fid={fid})，水位线 tid={max_existing_tid}...")
+    for page, threads in iter_list_pages(session, fid, 'dateline', dateline_stats, journal):
+        passed_watermark = False
+        for thread in threads:
+            tid = thread['tid']
+            if tid_to_int(tid) > max_existing_tid:
+                add_new_thread(thread, new_threads, fieldnames_list)
+            else:
+                passed_watermark = True
+                if tid in existing_dict:
+                    update_counts(existing_dict[tid], thread, updated_tids)
+        if passed_watermark:
+            print(f"[fid={fid}] 已越过水位线 tid={max_existing_tid}，停止按发帖时间爬取")
+            break
+
+    print(f"\n[fid={fid}] 开始按最后回复时间刷新回复数和浏览量...")
+    new_tids = {thread['tid'] for thread in new_threads}
+    unchanged = 0
+    for page, threads in iter_list_pages(session, fid, 'lastpost', lastpost_stats, journal):
+        for thread in threads:
+            tid = thread['tid']
+            if tid in new_tids or tid not in existing_dict:
+                continue
+            existing_row = existing_dict[tid]
+            if existing_row.get('replies') == thread['replies']:
+                unchanged += 1
+            else:
+                unchanged = 0
+                print(f"更新现有帖子 (tid={tid}) 的回复数和浏览量")
+            update_counts(existing_row, thread, updated_tids)
+            if unchanged >= CONFIG['unchanged_stop']:
                 break
+        if unchanged >= CONFIG['unchanged_stop']:
+            print(f"[fid={fid}] 连续 {unchanged} 个帖子回复数未变化，停止按最后回复时间爬取")
+            break
 
-        return new_threads, existing_dict, fieldnames_list
+    print_crawl_report('incremental', [dateline_stats, lastpost_stats], time.time() - start_time)
+    return new_threads, updated_tids
 
 def save_to_csv(data, filename, fieldnames):
     if not data:
         print("没有数据可以保存。")
-        return
+        return False
 
     print(f"\n正在将 {len(data)} 条数据保存到 {filename} ...")
     print(f"字段顺序保持不变: {', '.join(fieldnames)}")
@@ -225,16 +399,20 @@ def save_to_csv(data, filename, fieldnames):
                 writer.writerow(ordered_row)
                 
         print(f"数据已成功保存到 {filename}")
+        return True
     except IOError as e:
         print(f"保存文件时出错: {e}")
+        return False
 
 if __name__ == '__main__':
+    Metrics.start_run('GetThread')
     # 检查环境变量是否设置
     if not CONFIG['username'] or not CONFIG['password']:
         print("错误：必须设置 S1_USERNAME 和 S1_PASSWORD 环境变量")
         exit(1)
     
-    new_threads, existing_dict, fieldnames_list = scrape_forum()
+    journal = new_journal().load()
+    new_threads, existing_dict, fieldnames_list = scrape_forum(journal)
     if new_threads is not None:
         # 合并数据：新数据 + 更新后的现有数据
         combined_data = list(existing_dict.values()) + new_threads
@@ -247,4 +425,9 @@ if __name__ == '__main__':
         )
         
         # 保存数据，保持原始字段顺序
-        save_to_csv(combined_data_sorted, "database.csv", fieldnames_list)
+        with Metrics.stage('csv_write'):
+            if save_to_csv(combined_data_sorted, "database.csv", fieldnames_list):
+                journal.complete()
+    else:
+        # 登录或爬取失败
+        exit(1)
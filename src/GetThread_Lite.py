@@ -1,64 +1,26 @@
 import requests
-from bs4 import BeautifulSoup
-import time
 import csv
 import os
-import re
+import Boards
+import ForumParser
+import Metrics
+import S1Client
+import TimeParser
 
 # ====================================================================================
 # 使用环境变量配置论坛信息
 # ====================================================================================
 CONFIG = {
-    'base_url': 'https://stage1st.com/2b',
-    'username': os.environ.get('S1_USERNAME', ''),
-    'password': os.environ.get('S1_PASSWORD', ''),
-    'forum_fid': 83,
-    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
+    'base_url': S1Client.BASE_URL,
+    'username': S1Client.USERNAME,  # 从环境变量 S1_USERNAME 获取用户名
+    'password': S1Client.PASSWORD,  # 从环境变量 S1_PASSWORD 获取密码
+    'forum_fids': Boards.FORUM_FIDS,  # 从环境变量 S1_FORUM_FIDS 获取板块列表（见 Boards）
+    'user_agent': S1Client.USER_AGENT
 }
 # ====================================================================================
 
-def extract_tid_from_url(url):
-    """从URL中提取帖子ID(tid)"""
-    match = re.search(r'thread-(\d+)', url)
-    if match:
-        return match.group(1)
-    match = re.search(r'tid=(\d+)', url)
-    if match:
-        return match.group(1)
-    return None
-
-def login(session, base_url, username, password):
-    # 检查凭据是否设置
-    if not username or not password:
-        print("错误：用户名或密码未设置！")
-        return False
-    
-    print("正在尝试登录...")
-    login_url = f"{base_url}/member.php?mod=logging&action=login&loginsubmit=yes"
-    data = {
-        'username': username,
-        'password': password,
-        'quickforward': 'yes',
-        'handlekey': 'ls'
-    }
-    headers = {'User-Agent': CONFIG['user_agent']}
-
-    try:
-        response = session.post(login_url, data=data, headers=headers)
-        response.raise_for_status()
-        if 'succeed' in response.text or username in response.text:
-            print("登录成功！")
-            return True
-        else:
-            print("登录失败！请检查用户名和密码。")
-            return False
-    except requests.exceptions.RequestException as e:
-        print(f"登录请求发生错误: {e}")
-        return False
-
-def scrape_forum():
-    # 检查现有数据文件
-    output_filename = "database.csv"
+def load_existing(output_filename):
+    """读取现有数据文件，返回现有tid集合、各板块的最大tid、字段名和现有数据"""
     existing_tids = set()  # 存储现有帖子的tid集合
     max_existing_tid = 0   # 现有最大tid
     existing_data = []     # 存储现有数据
@@ -67,7 +29,7 @@ def scrape_forum():
     if os.path.exists(output_filename):
         with open(output_filename, 'r', encoding='utf-8-sig') as f:
             reader = csv.DictReader(f)
-            all_fieldnames = reader.fieldnames  # 保存所有现有字段名
+            all_fieldnames = list(reader.fieldnames or [])  # 保存所有现有字段名
             
             for row in reader:
                 tid = row.get('tid')
@@ -90,118 +52,117 @@ def scrape_forum():
         # 如果没有文件，使用默认字段
         all_fieldnames = ['title', 'tid', 'replies', 'views', 'post_time']
 
-    with requests.Session() as session:
-        if not login(session, CONFIG['base_url'], CONFIG['username'], CONFIG['password']):
-            return None, existing_tids, max_existing_tid, all_fieldnames, existing_data
-
-        new_threads = []
-        page = 1
-        forum_url = f"{CONFIG['base_url']}/forum.php?mod=forumdisplay&fid={CONFIG['forum_fid']}&filter=author&orderby=dateline"
-        print(f"\n开始爬取板块 (fid={CONFIG['forum_fid']})...")
-        has_more_pages = True
-        found_max_tid = False
+    # 添加时间戳列之前的数据按post_time回填
+    TimeParser.fill_post_ts(existing_data)
 
-        while has_more_pages and not found_max_tid:
-            current_page_url = f"{forum_url}&page={page}"
-            print(f"正在爬取第 {page} 页...")
+    # 各板块分别以该板块现有的最大tid作为停止位置
+    watermarks = Boards.watermarks(existing_data, CONFIG['forum_fids'])
+    return existing_tids, watermarks, all_fieldnames, existing_data
 
-            headers = {'User-Agent': CONFIG['user_agent']}
-
-            try:
-                response = session.get(current_page_url, headers=headers)
-                response.raise_for_status()
-                response.encoding = 'utf-8'
-
-                soup = BeautifulSoup(response.text, 'html.parser')
-                thread_rows = soup.select('tbody[id^="normalthread_"]')
+def scrape_forum():
+    # 检查现有数据文件
+    with Metrics.stage('csv_read'):
+        existing_tids, watermarks, all_fieldnames, existing_data = load_existing("database.csv")
+
+    # 连接池至少与并发爬取的板块数相同
+    with S1Client.Client(pool_size=max(S1Client.POOL_SIZE, Boards.BOARD_WORKERS)) as client:
+        if not client.login_web():
+            return None, existing_tids, watermarks, all_fieldnames, existing_data
+
+        new_threads = crawl_new_threads(client.session, existing_tids, watermarks, all_fieldnames)
+        return new_threads, existing_tids, watermarks, all_fieldnames, existing_data
+
+def crawl_new_threads(session, existing_tids, watermarks, all_fieldnames):
+    """并发爬取 CONFIG['forum_fids'] 中的各板块，每个板块遇到该板块现有最大tid（watermarks）即停止，
+    返回所有板块的新帖子列表"""
+    for key in ('fid',) + TimeParser.COLUMNS:
+        if key not in all_fieldnames:
+            all_fieldnames.append(key)
+    results = Boards.run_boards(
+        lambda fid: crawl_board_new_threads(session, fid, existing_tids, watermarks.get(fid, 0), all_fieldnames),
+        CONFIG['forum_fids'])
+    new_threads = [thread for board_threads in results.values() for thread in board_threads]
+    Metrics.count('threads_new', len(new_threads))
+    return new_threads
+
+def crawl_board_new_threads(session, fid, existing_tids, max_existing_tid, all_fieldnames):
+    """按发帖时间爬取一个板块，遇到该板块现有最大tid即停止，返回新帖子列表"""
+    new_threads = []
+    page = 1
+    forum_url = f"{CONFIG['base_url']}/forum.php?mod=forumdisplay&fid={fid}&filter=author&orderby=dateline"
+    print(f"\n开始爬取板块 (fid={fid})...")
+    has_more_pages = True
+    found_max_tid = False
+
+    while has_more_pages and not found_max_tid:
+        current_page_url = f"{forum_url}&page={page}"
+        print(f"[fid={fid}] 正在爬取第 {page} 页...")
+
+        headers = {'User-Agent': CONFIG['user_agent']}
+
+        try:
+            response = session.get(current_page_url, headers=headers)
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+
+            threads, has_next = ForumParser.parse_forum_page(response.text, CONFIG['base_url'])
+
+            if not threads:
+                print("在本页未找到帖子，可能已到达最后一页。")
+                break
 
-                if not thread_rows:
-                    print("在本页未找到帖子，可能已到达最后一页。")
+            for thread in threads:
+                tid = thread['tid']
+                
+                # 将tid转换为整数用于比较
+                try:
+                    tid_int = int(tid)
+                except ValueError:
+                    tid_int = 0
+                
+                # 如果遇到该板块现有最大tid，停止爬取
+                if tid_int == max_existing_tid:
+                    print(f"[fid={fid}] 遇到现有最大tid（{max_existing_tid}），停止爬取")
+                    found_max_tid = True
                     break
-
-                for row in thread_rows:
-                    title_tag = row.select_one('a.xst')
-                    if not title_tag:
-                        continue
-
-                    title = title_tag.get_text(strip=True)
-                    relative_link = title_tag['href']
+                
+                # 如果是新帖子
+                if tid not in existing_tids:
+                    print(f"发现新帖子 (fid={fid}, tid={tid})，添加到数据库")
                     
-                    # 提取tid
-                    tid = extract_tid_from_url(relative_link)
-                    if not tid:
-                        # 如果从相对链接提取失败，尝试完整链接
-                        full_link = f"{CONFIG['base_url']}/{relative_link}"
-                        tid = extract_tid_from_url(full_link)
+                    # 创建新帖子数据，包含所有必需字段
+                    new_post = {key: thread[key] for key in ForumParser.THREAD_FIELDS}
+                    new_post['fid'] = fid
+                    new_post.update(TimeParser.thread_timestamps(thread))
                     
-                    if not tid:
-                        print(f"警告: 无法从链接中提取tid: {relative_link}")
-                        continue
+                    # 添加其他字段的空值以匹配现有结构
+                    for field in all_fieldnames:
+                        if field not in new_post:
+                            new_post[field] = ''
                     
-                    # 将tid转换为整数用于比较
-                    try:
-                        tid_int = int(tid)
-                    except ValueError:
-                        tid_int = 0
-                    
-                    # 如果遇到现有最大tid，停止爬取
-                    if tid_int == max_existing_tid:
-                        print(f"遇到现有最大tid（{max_existing_tid}），停止爬取")
-                        found_max_tid = True
-                        break
-                    
-                    # 如果是新帖子
-                    if tid not in existing_tids:
-                        numbers = row.select_one('td.num')
-                        if numbers:
-                            replies = numbers.find_all('a')[0].get_text(strip=True)
-                            views = numbers.find_all('em')[0].get_text(strip=True)
-                        else:
-                            replies = views = ''
-
-                        time_tag = row.select_one('td.by em span') or row.select_one('td.by em')
-                        post_time = time_tag.get('title') if time_tag and time_tag.has_attr('title') else time_tag.get_text(strip=True) if time_tag else ''
-
-                        print(f"发现新帖子 (tid={tid})，添加到数据库")
-                        
-                        # 创建新帖子数据，包含所有必需字段
-                        new_post = {
-                            'title': title,
-                            'tid': tid,
-                            'replies': replies,
-                            'views': views,
-                            'post_time': post_time
-                        }
-                        
-                        # 添加其他字段的空值以匹配现有结构
-                        for field in all_fieldnames:
-                            if field not in new_post:
-                                new_post[field] = ''
-                        
-                        new_threads.append(new_post)
-                    else:
-                        print(f"跳过现有帖子 (tid={tid})")
-
-                if found_max_tid:
-                    break  # 跳出外层循环
-
-                # 检查是否有下一页
-                next_page_link = soup.select_one('a.nxt')
-                if not next_page_link:
-                    print("未找到'下一页'按钮，爬取结束。")
-                    has_more_pages = False
+                    new_threads.append(new_post)
                 else:
-                    page += 1
-                    time.sleep(0.5)
+                    print(f"跳过现有帖子 (tid={tid})")
 
-            except requests.exceptions.RequestException as e:
-                print(f"爬取第 {page} 页时发生错误: {e}")
-                break
-            except Exception as e:
-                print(f"处理第 {page} 页时发生未知错误: {e}")
-                break
+            if found_max_tid:
+                break  # 跳出外层循环
+
+            # 检查是否有下一页
+            if not has_next:
+                print("未找到'下一页'按钮，爬取结束。")
+                has_more_pages = False
+            else:
+                # 请求间隔由会话共享的自适应限速器控制（见 RateLimiter）
+                page += 1
+
+        except requests.exceptions.RequestException as e:
+            print(f"爬取板块 {fid} 第 {page} 页时发生错误: {e}")
+            break
+        except Exception as e:
+            print(f"处理板块 {fid} 第 {page} 页时发生未知错误: {e}")
+            break
 
-        return new_threads, existing_tids, max_existing_tid, all_fieldnames, existing_data
+    return new_threads
 
 def save_to_csv(new_data, existing_data, filename, fieldnames):
     # 如果没有新数据，直接返回
@@ -226,12 +187,13 @@ def save_to_csv(new_data, existing_data, filename, fieldnames):
         print(f"保存文件时出错: {e}")
 
 if __name__ == '__main__':
+    Metrics.start_run('GetThread_Lite')
     # 检查环境变量
     if not CONFIG['username'] or not CONFIG['password']:
         print("错误：必须设置 S1_USERNAME 和 S1_PASSWORD 环境变量")
         exit(1)
     
-    new_threads, existing_tids, max_existing_tid, all_fieldnames, existing_data = scrape_forum()
+    new_threads, existing_tids, watermarks, all_fieldnames, existing_data = scrape_forum()
     if new_threads is not None:
         # 按tid从大到小排序新数据（确保最新帖子在最前面）
         new_threads_sorted = sorted(
@@ -241,4 +203,5 @@ if __name__ == '__main__':
         )
         
         # 保存所有数据到CSV文件（新数据在最前面）
-        save_to_csv(new_threads_sorted, existing_data, "database.csv", all_fieldnames)
+        with Metrics.stage('csv_write'):
+            save_to_csv(new_threads_sorted, existing_data, "database.csv", all_fieldnames)
@@ -5,95 +5,61 @@ import time
 import tempfile
 import shutil
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from RateLimiter import RateLimiter
+import Boards
+import Checkpoint
+import Metrics
+import PollSchedule
+import RowStream
+import S1Client
+import VoteHistory
 
 # 使用环境变量获取凭据
-username = os.environ.get('S1_USERNAME', '')  # 从环境变量获取用户名
-password = os.environ.get('S1_PASSWORD', '')  # 从环境变量获取密码
-login_url = "https://stage1st.com/2b/api/app/user/login"  # 替换为实际登录URL
-process_url = "https://stage1st.com/2b/api/app/poll/options"  # 替换为实际处理URL
+username = S1Client.USERNAME  # 从环境变量 S1_USERNAME 获取用户名
+password = S1Client.PASSWORD  # 从环境变量 S1_PASSWORD 获取密码
+process_url = f"{S1Client.BASE_URL}/api/app/poll/options"
+
+# 并发抓取配置：并发线程数与额外的固定速率上限（次/秒）
+# 请求速率由客户端共享的自适应限速器控制（见 RateLimiter），POLL_RATE 为0时不再额外限速
+POLL_WORKERS = int(os.environ.get('S1_POLL_WORKERS', '4'))
+POLL_RATE = float(os.environ.get('S1_POLL_RATE', '0'))
+# 设置为1时忽略调度，强制刷新所有帖子
+POLL_FORCE = os.environ.get('S1_POLL_FORCE', '') == '1'
 
 # 自定义请求头
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
-    "Accept": "*/*",
-    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-    "Connection": "keep-alive"
-}
-
-# 创建会话对象
-session = requests.Session()
-
-# 登录请求
-def login():
-    # 检查凭据是否设置
-    if not username or not password:
-        print("错误：用户名或密码未设置！")
-        return None
-    
-    payload = {
-        "username": username,
-        "password": password,
-        "questionid": "0",
-        "answer": ""
-    }
-    
-    try:
-        # 发送登录请求（使用会话对象）
-        response = session.post(
-            login_url, 
-            data=payload, 
-            headers=HEADERS,
-            timeout=10
-        )
-        response.raise_for_status()
-        
-        # 解析响应
-        result = response.json()
-        
-        # 检查登录结果
-        if result.get("success") is True:
-            print("✅ 登录成功")
-            return result  # 返回完整响应数据
-        else:
-            print("❌ 登录失败")
-            if "message" in result:
-                print(f"原因: {result['message']}")
-            return None
-            
-    except Exception as err:
-        print(f"登录失败: {err}")
-        return None
+HEADERS = S1Client.HEADERS
+
+# 共享客户端（连接池大小与并发数匹配，避免线程间争用连接；Pipeline 的多板块、多页面并发爬取也使用该客户端）
+client = S1Client.Client(pool_size=max(POLL_WORKERS, Boards.CRAWL_CONNECTIONS))
+session = client.session
 
-# 读取CSV文件（修改：保留原始列顺序）
+# 需要确保存在的投票列
+REQUIRED_COLUMNS = [f'votes{i}' for i in range(1, 6)] + ['message']
+
+# 逐行读取CSV文件（修改：保留原始列顺序，返回行生成器以限制内存占用）
 def read_csv(file_path):
-    rows = []
-    fieldnames = []
-    
     try:
-        with open(file_path, mode='r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            fieldnames = reader.fieldnames or []
-            
-            # 确保所有需要的列都存在（不改变顺序）
-            required_columns = [f'votes{i}' for i in range(1, 6)] + ['message']
-            existing_columns = set(fieldnames)
-            
-            # 添加缺失的列（但不改变原有列顺序）
-            for col in required_columns:
-                if col not in existing_columns:
-                    fieldnames.append(col)
-            
-            for row in reader:
-                # 确保行中有所有列
-                for col in required_columns:
-                    if col not in row:
-                        row[col] = ""  # 初始化为空字符串
-                rows.append(row)
-        
-        return rows, fieldnames
+        fieldnames, reader = RowStream.iter_csv(file_path)
     except Exception as err:
         print(f"读取CSV文件失败: {err}")
-        return [], []
+        return iter(()), []
+    
+    # 添加缺失的列（但不改变原有列顺序）
+    existing_columns = set(fieldnames)
+    for col in REQUIRED_COLUMNS:
+        if col not in existing_columns:
+            fieldnames.append(col)
+    
+    def rows():
+        for row in reader:
+            # 确保行中有所有列
+            for col in REQUIRED_COLUMNS:
+                if col not in row:
+                    row[col] = ""  # 初始化为空字符串
+            yield row
+    
+    return rows(), fieldnames
 
 # 处理tid请求并更新行数据
 def process_tid_and_update_row(sid, row, index, total):
@@ -117,8 +83,7 @@ def process_tid_and_update_row(sid, row, index, total):
         response = session.post(
             process_url, 
             data=payload, 
-            headers=HEADERS,
-            timeout=10
+            headers=HEADERS
         )
         response.raise_for_status()
         
@@ -130,14 +95,14 @@ def process_tid_and_update_row(sid, row, index, total):
             # 获取前5个投票选项的votes值
             data = result.get("data", [])
             
-            # 初始化所有votes列为0
+            # 初始化所有votes列为0（与CSV中读出的值一样保存为字符串）
             for i in range(1, 6):
-                row[f'votes{i}'] = 0
+                row[f'votes{i}'] = '0'
                 row['message'] = ''  # 清空错误信息
             
             # 更新前5个选项的votes值
             for i, option in enumerate(data[:5]):
-                row[f'votes{i+1}'] = option.get('votes', 0)
+                row[f'votes{i+1}'] = str(option.get('votes', 0))
         else:
             # 处理失败时设置错误信息
             message = result.get("message", "未知错误")
@@ -145,7 +110,7 @@ def process_tid_and_update_row(sid, row, index, total):
             
             # 重置votes列为0
             for i in range(1, 6):
-                row[f'votes{i}'] = 0
+                row[f'votes{i}'] = '0'
             
     except requests.exceptions.HTTPError as err:
         error_msg = f"HTTP错误: {err.response.status_code}"
@@ -156,6 +121,68 @@ def process_tid_and_update_row(sid, row, index, total):
     
     return row
 
+# 检查点记录：临时性错误（网络/HTTP）的结果不记录，恢复时重新请求
+def poll_entry(row):
+    message = str(row.get('message', '') or '')
+    if not row.get('tid') or message.startswith(PollSchedule.TRANSIENT_ERROR_PREFIXES):
+        return None
+    return {'tid': row['tid'], **{col: row.get(col, '') for col in REQUIRED_COLUMNS}}
+
+# 把检查点中已抓取的结果写回对应行，返回仍需请求的行
+def resume_rows(rows, done):
+    pending = []
+    for row in rows:
+        entry = done.get(row.get('tid'))
+        if entry is None:
+            pending.append(row)
+        else:
+            for col in REQUIRED_COLUMNS:
+                row[col] = str(entry.get(col, ''))
+    return pending
+
+# 并发抓取所有行的投票数据（全局限速代替逐个请求后的固定sleep）
+# start/total 用于分块调用时显示整体进度；journal 为检查点日志，每个结果抓取后立即记录
+def fetch_polls(sid, rows, workers=POLL_WORKERS, rate=POLL_RATE, start=0, total=None, limiter=None, journal=None):
+    total = len(rows) if total is None else total
+    limiter = limiter or RateLimiter(rate)
+
+    def worker(item):
+        index, row = item
+        if row.get('tid'):
+            limiter.acquire()
+        row = process_tid_and_update_row(sid, row, index, total)
+        entry = poll_entry(row) if journal is not None else None
+        if entry:
+            journal.record(entry)
+        return row
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        # map保持结果顺序与输入一致
+        return list(executor.map(worker, enumerate(rows, start)))
+
+def is_due(schedule, row, now):
+    if POLL_FORCE:
+        return bool(row.get('tid'))
+    return PollSchedule.is_due(schedule, row, now)
+
+# 分块抓取并逐行产出所有行（每块只在内存中保留 RowStream.CHUNK_SIZE 行）
+# 检查点中已有结果的行不再请求
+def poll_stream(sid, rows, schedule, now, total_due, stats, history=None, journal=None):
+    limiter = RateLimiter(POLL_RATE)
+    done = {entry['tid']: entry for entry in journal.entries} if journal is not None else {}
+    for chunk in RowStream.chunked(rows):
+        due_rows = [row for row in chunk if is_due(schedule, row, now)]
+        pending = resume_rows(due_rows, done) if done else due_rows
+        fetch_polls(sid, pending, start=stats['polled'] + stats['resumed'], total=total_due,
+                    limiter=limiter, journal=journal)
+        stats['polled'] += len(pending)
+        stats['resumed'] += len(due_rows) - len(pending)
+        stats['changed'] += sum(PollSchedule.record_poll(schedule, row, now) for row in due_rows)
+        if history is not None:
+            for row in due_rows:
+                history.record_row(row)
+        yield from chunk
+
 # 保存CSV文件（修改：不创建备份，使用安全写入方式）
 def save_csv(file_path, rows, fieldnames):
     # 创建临时文件
@@ -186,44 +213,67 @@ def save_csv(file_path, rows, fieldnames):
 
 # 主程序
 if __name__ == "__main__":
+    Metrics.start_run('GetVote')
     # 检查环境变量
     if not username or not password:
         print("错误：必须设置 S1_USERNAME 和 S1_PASSWORD 环境变量")
         exit(1)
     
     # 第一步：登录获取sid
-    login_result = login()
-    if not login_result or not login_result.get("success"):
+    sid = client.login_api()
+    if not sid:
         print("程序终止：登录失败")
         exit(1)
+    print("已获取会话ID")
     
-    # 第二步：从登录结果中获取sid
-    sid = login_result["data"]["sid"]  # 根据实际响应结构调整
-    print(f"已获取会话ID")
-    
-    # 第三步：读取CSV文件
+    # 第三步：统计行数（逐行读取，不保留数据）
     csv_file = "database.csv"  # 替换为实际文件路径
+    schedule = PollSchedule.load_schedule()
+    now = time.time()
     rows, fieldnames = read_csv(csv_file)
+    total_rows = 0
+    total_due = 0
+    with Metrics.stage('csv_read'):
+        for row in rows:
+            total_rows += 1
+            total_due += is_due(schedule, row, now)
     
-    if not rows:
+    if not total_rows:
         print("未找到有效数据，程序终止")
         exit(1)
         
-    total_rows = len(rows)
-    print(f"找到 {total_rows} 行需要处理")
+    print(f"找到 {total_rows} 行数据")
+    
+    # 第四步：根据调度状态筛选需要刷新的帖子（长期未变化的帖子按指数间隔退避）
+    skipped = total_rows - total_due
+    print(f"需要刷新 {total_due} 行，跳过 {skipped} 行（投票已稳定）")
     print("=" * 50)
     
-    # 第四步：处理每行并更新数据
-    processed_count = 0
-    for index, row in enumerate(rows):
-        row = process_tid_and_update_row(sid, row, index, total_rows)
-        processed_count += 1
-        
-        # 避免请求过于频繁
-        time.sleep(0.5)
+    # 第五步：分块并发处理并逐行写出（受全局请求速率限制）
+    print(f"并发数: {POLL_WORKERS}，速率上限: {POLL_RATE or '自适应'} 次/秒")
+    start_time = time.time()
+    stats = {'polled': 0, 'resumed': 0, 'changed': 0}
+    history = VoteHistory.VoteHistory().load()
+    # 数据库和调度文件在成功写回前不变，中断后重新运行时检查点仍然有效
+    journal = Checkpoint.Journal('GetVote', Checkpoint.input_key(
+        [csv_file, PollSchedule.SCHEDULE_FILE], POLL_FORCE)).load()
+    rows, fieldnames = read_csv(csv_file)
+    with Metrics.stage('poll_and_write'):
+        saved = save_csv(csv_file, poll_stream(sid, rows, schedule, now, total_due, stats, history, journal), fieldnames)
+    print(f"投票数据抓取耗时 {time.time() - start_time:.1f} 秒")
+    
+    if saved:
+        PollSchedule.save_schedule(schedule)
+        history.commit(now)
+        journal.complete()
+    Metrics.count('polls', stats['polled'])
+    Metrics.count('polls_resumed', stats['resumed'])
+    Metrics.count('polls_changed', stats['changed'])
+    print(f"调度统计: 请求 {stats['polled']} 次，从检查点恢复 {stats['resumed']} 次，"
+          f"跳过 {skipped} 次，投票变化 {stats['changed']} 个帖子")
     
-    # 第五步：保存更新后的CSV文件
-    if save_csv(csv_file, rows, fieldnames):
-        print(f"\n处理完成: 已更新 {total_rows} 行数据")
+    # 第六步：确认保存结果
+    if saved:
+        print(f"\n处理完成: 已更新 {stats['polled']} 行数据")
     else:
         print("\n处理完成但保存失败，请检查错误")
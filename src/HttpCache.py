@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import Metrics
+
+# ====================================================================================
+# 列表页响应缓存：按URL保存上次响应的 ETag/Last-Modified、正文摘要和解析结果
+#   请求时带上 If-None-Match/If-Modified-Since，服务器返回304时直接使用上次的解析结果；
+#   服务器不支持条件请求（Discuz的动态页面通常如此）时仍会下载页面，但正文摘要与上次相同时
+#   跳过HTML解析。摘要由调用方指定要比较的内容（列表页只比较帖子行和分页器，页脚时间、
+#   formhash 等每次都不同的内容不影响摘要）
+#   缓存只用来跳过重复的下载和解析，返回的仍是完整的解析结果，调用方照常处理每一页，
+#   因此缓存与数据库不同步（例如上次运行没有写回）时结果仍然正确
+#   超过 MAX_AGE_DAYS 天没有用到的URL（板块页数减少后多出的页面等）在保存时删除
+#   CACHE_VERSION 变化（解析结果的格式改变）时丢弃缓存
+# S1_HTTP_CACHE 设置为空时禁用缓存
+# ====================================================================================
+CACHE_FILE = os.environ.get('S1_HTTP_CACHE', '.http_cache.json')
+CACHE_VERSION = 2
+MAX_AGE_DAYS = 30
+
+
+def body_digest(text):
+    """默认的正文摘要：整个响应正文"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """URL -> 上次响应的缓存：load 后用 get 请求页面，最后 save 写回（线程安全）"""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.enabled = bool(path)
+        self.entries = {}
+        self.stats = {'not_modified': 0, 'unchanged': 0, 'parsed': 0}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not self.enabled or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as err:
+            print(f"读取响应缓存失败，将重新下载: {err}")
+            return self
+        if data.get('version') != CACHE_VERSION:
+            print("响应缓存格式已更新，丢弃旧的缓存")
+            self.dirty = True
+            return self
+        self.entries = data.get('entries', {})
+        return self
+
+    def get(self, session, url, parse, digest=body_digest, **kwargs):
+        """GET url 并返回 parse(正文) 的结果（需可序列化为JSON）
+
+        304或正文摘要与上次相同时不再解析，直接返回上次的结果；其余参数传给 session.get，
+        非2xx/304的响应由 raise_for_status 抛出异常
+        """
+        with self._lock:
+            entry = self.entries.get(url) if self.enabled else None
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = session.get(url, headers=headers, **kwargs)
+        if response.status_code == 304 and entry:
+            self._hit(url, entry, response, 'not_modified')
+            return entry['result']
+        response.raise_for_status()
+        response.encoding = 'utf-8'
+        text = response.text
+
+        page_digest = digest(text)
+        if entry and entry.get('digest') == page_digest:
+            self._hit(url, entry, response, 'unchanged')
+            return entry['result']
+
+        result = parse(text)
+        with self._lock:
+            self.stats['parsed'] += 1
+            if self.enabled:
+                self.entries[url] = {
+                    'etag': response.headers.get('ETag', ''),
+                    'last_modified': response.headers.get('Last-Modified', ''),
+                    'digest': page_digest,
+                    'used': int(time.time()),
+                    'result': result
+                }
+                self.dirty = True
+        return result
+
+    def _hit(self, url, entry, response, kind):
+        with self._lock:
+            self.stats[kind] += 1
+            # 服务器可能给出新的验证器（例如页面没变但ETag变了）
+            if response.headers.get('ETag'):
+                entry['etag'] = response.headers['ETag']
+            if response.headers.get('Last-Modified'):
+                entry['last_modified'] = response.headers['Last-Modified']
+            entry['used'] = int(time.time())
+            self.dirty = True
+
+    def save(self):
+        """删除过期条目后安全写回缓存文件（使用临时文件），返回是否写入"""
+        Metrics.count('http_cache_not_modified', self.stats['not_modified'])
+        Metrics.count('http_cache_unchanged', self.stats['unchanged'])
+        Metrics.count('http_cache_parsed', self.stats['parsed'])
+        with self._lock:
+            if not self.enabled or not self.dirty:
+                return False
+            cutoff = time.time() - MAX_AGE_DAYS * 86400
+            entries = {url: entry for url, entry in self.entries.items() if entry.get('used', 0) >= cutoff}
+            temp_file = None
+            try:
+                with tempfile.NamedTemporaryFile(
+                    mode='w',
+                    encoding='utf-8',
+                    dir=os.path.dirname(self.path) or '.',
+                    delete=False
+                ) as temp:
+                    temp_file = temp.name
+                    json.dump({'version': CACHE_VERSION, 'entries': entries}, temp,
+                              ensure_ascii=False, separators=(',', ':'))
+                os.replace(temp_file, self.path)
+            except OSError as err:
+                print(f"保存响应缓存失败: {err}")
+                if temp_file and os.path.exists(temp_file):
+                    os.remove(temp_file)
+                return False
+            self.entries = entries
+            self.dirty = False
+        print(f"响应缓存: {self.stats['not_modified']} 页未修改(304)，{self.stats['unchanged']} 页内容未变跳过解析，"
+              f"{self.stats['parsed']} 页重新解析")
+        return True
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_cache():
+    """进程内共用的列表页缓存（首次使用时读取缓存文件）"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ResponseCache().load()
+        return _shared
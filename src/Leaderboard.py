@@ -0,0 +1,103 @@
+import heapq
+import json
+import os
+
+import ExportShards
+
+# ====================================================================================
+# 排行榜：评分完成后一次遍历全部数据，为全站、每个季度、每个类别各维护一个大小固定的堆，
+# 最后输出已排好序的小文件（不需要为每个榜单单独排序整个数据库）
+#   <目录>/all.json
+#   <目录>/season/2026-7.json    季度划分与分片导出相同（见 ExportShards.season_key）
+#   <目录>/category/TV.json
+#   <目录>/index.json            所有榜单的路径与条目数
+# 排序：score 从高到低，同分时总票数多的在前，再按tid从小到大（先发的帖子在前）
+# ====================================================================================
+LEADERBOARD_DIR = os.environ.get('S1_LEADERBOARDS', '')  # 排行榜输出目录，为空时不生成
+TOP_N = int(os.environ.get('S1_LEADERBOARD_SIZE', '100'))
+MIN_VOTES = int(os.environ.get('S1_LEADERBOARD_MIN_VOTES', '10'))  # 总票数低于该值的帖子不上榜
+ENTRY_FIELDS = ('tid', 'title', 'year', 'month', 'category', 'score', 'standard_deviation')
+
+
+def _int(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def total_votes(row):
+    return sum(_int(row.get(f'votes{i}')) for i in range(1, 6))
+
+def rank_key(row):
+    """堆中的比较键（越大排名越靠前），无法参与排名时返回None"""
+    try:
+        score = float(row.get('score', ''))
+        tid = int(row.get('tid', ''))
+    except (TypeError, ValueError):
+        return None
+    return score, total_votes(row), -tid
+
+
+class LeaderboardBuilder:
+    """随JSON导出逐行接收数据，结束时写出所有榜单"""
+
+    def __init__(self, out_dir=LEADERBOARD_DIR, top_n=TOP_N, min_votes=MIN_VOTES):
+        self.out_dir = out_dir
+        self.top_n = top_n
+        self.min_votes = min_votes
+        self.boards = {}
+        self.count = 0
+
+    def _push(self, board, item):
+        heap = self.boards.setdefault(board, [])
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def add(self, row):
+        key = rank_key(row)
+        if key is None or key[1] < self.min_votes:
+            return
+        entry = {field: row.get(field, '') for field in ENTRY_FIELDS}
+        entry['votes'] = key[1]
+        # 序号保证即使出现重复tid也不会比较到entry字典
+        self.count -= 1
+        item = (key, self.count, entry)
+        self._push('all', item)
+        self._push(f"season/{ExportShards.season_key(row)}", item)
+        self._push(f"category/{ExportShards.category_key(row)}", item)
+
+    def ranked(self, board):
+        """榜单按名次排序后的条目（附带rank）"""
+        items = sorted(self.boards.get(board, []), reverse=True)
+        return [{'rank': rank, **entry} for rank, (key, seq, entry) in enumerate(items, 1)]
+
+    def finish(self):
+        """写出所有榜单和索引，删除已不存在的旧榜单，返回索引"""
+        index_path = os.path.join(self.out_dir, 'index.json')
+        previous = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = {}
+
+        index = {'top_n': self.top_n, 'min_votes': self.min_votes, 'boards': {}}
+        changed = 0
+        for board in sorted(self.boards):
+            entries = self.ranked(board)
+            path = f"{board}.json"
+            content = json.dumps({'board': board, 'min_votes': self.min_votes, 'rows': entries},
+                                 ensure_ascii=False, separators=(',', ':'))
+            changed += ExportShards.write_if_changed(os.path.join(self.out_dir, path), content)
+            index['boards'][board] = {'path': path, 'rows': len(entries)}
+
+        for board, entry in previous.get('boards', {}).items():
+            if board not in index['boards']:
+                ExportShards.remove_with_siblings(os.path.join(self.out_dir, entry['path']))
+
+        ExportShards.write_if_changed(index_path, json.dumps(index, ensure_ascii=False, separators=(',', ':')))
+        print(f"已生成排行榜: {len(index['boards'])} 个（变化 {changed} 个）: {self.out_dir}")
+        return index
@@ -0,0 +1,197 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlsplit
+
+# 资源统计只在类Unix系统上可用
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ====================================================================================
+# 运行指标：记录各阶段耗时、HTTP请求（次数、字节数、重试次数、延迟直方图）和计数器，
+# 运行结束时打印摘要，并在设置了 S1_METRICS_REPORT 时写出JSON报告，便于比较不同运行
+#   with Metrics.stage('parse'): ...   累计阶段耗时与调用次数；阶段可以嵌套，多线程中
+#                                      同一阶段的耗时为各线程之和（可能超过总耗时）
+#   Metrics.count('threads_new', n)    累加计数器
+#   HTTP请求由 S1Client.TimeoutSession 自动记录，按接口（php文件+mod / API路径）分组，
+#   延迟包含urllib3重试与退避的时间
+# ====================================================================================
+REPORT_FILE = os.environ.get('S1_METRICS_REPORT', '')  # JSON报告输出文件，为空时只打印摘要
+LATENCY_BUCKETS = (50, 100, 200, 500, 1000, 2000, 5000, 10000)  # 延迟直方图上界（毫秒），另有一档溢出
+
+_lock = threading.Lock()
+_run = {'script': None, 'started': None, 'wall_start': None, 'cpu_start': None}
+_stages = {}
+_counters = {}
+_requests = {}
+
+
+def start_run(script, report_file=None):
+    """开始记录一次运行；进程退出时（包括exit(1)）自动打印摘要并写出报告"""
+    _run.update(
+        script=script,
+        started=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        wall_start=time.perf_counter(),
+        cpu_start=time.process_time()
+    )
+    atexit.register(finish, REPORT_FILE if report_file is None else report_file)
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            entry = _stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            entry['seconds'] += elapsed
+            entry['calls'] += 1
+
+def count(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def endpoint(url):
+    """请求的分组名：forum.php?mod=forumdisplay、api/app/poll/options 等"""
+    parts = urlsplit(url)
+    path = parts.path
+    name = path[path.index('/api/') + 1:] if '/api/' in path else path.rsplit('/', 1)[-1]
+    mod = parse_qs(parts.query).get('mod')
+    return f"{name}?mod={mod[0]}" if mod else (name or '/')
+
+def _new_request_stats():
+    return {
+        'requests': 0,
+        'errors': 0,            # 连接失败/超时，以及4xx/5xx响应
+        'retries': 0,           # urllib3自动重试的次数
+        'bytes_sent': 0,
+        'bytes_received': 0,
+        'seconds': 0.0,
+        'max_ms': 0.0,
+        'status': {},
+        'histogram': [0] * (len(LATENCY_BUCKETS) + 1)
+    }
+
+def _body_size(body):
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    return len(body) if isinstance(body, bytes) else 0
+
+def record_request(url, seconds, response=None, error=None):
+    """记录一次HTTP请求；error为请求异常（此时response为None）"""
+    if response is not None:
+        status = str(response.status_code)
+        retries = getattr(getattr(response.raw, 'retries', None), 'history', None) or ()
+        sent = _body_size(response.request.body)
+        received = len(response.content)
+        failed = response.status_code >= 400
+    else:
+        status = type(error).__name__
+        retries = ()
+        sent = received = 0
+        failed = True
+
+    milliseconds = seconds * 1000
+    bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if milliseconds <= bound), len(LATENCY_BUCKETS))
+    with _lock:
+        entry = _requests.setdefault(endpoint(url), _new_request_stats())
+        entry['requests'] += 1
+        entry['errors'] += failed
+        entry['retries'] += len(retries)
+        entry['bytes_sent'] += sent
+        entry['bytes_received'] += received
+        entry['seconds'] += seconds
+        entry['max_ms'] = max(entry['max_ms'], milliseconds)
+        entry['status'][status] = entry['status'].get(status, 0) + 1
+        entry['histogram'][bucket] += 1
+
+
+def _percentile(histogram, fraction):
+    """由直方图估计百分位数（返回所在档的上界，溢出档返回None）"""
+    target = sum(histogram) * fraction
+    seen = 0
+    for bound, value in zip(LATENCY_BUCKETS + (None,), histogram):
+        seen += value
+        if value and seen >= target:
+            return bound
+    return None
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # Linux上ru_maxrss单位为KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def report():
+    """当前的运行报告（可直接序列化为JSON）"""
+    with _lock:
+        requests = {}
+        for name, entry in sorted(_requests.items()):
+            histogram = entry['histogram']
+            labels = [f"<={bound}" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+            requests[name] = {
+                **{key: entry[key] for key in ('requests', 'errors', 'retries', 'bytes_sent', 'bytes_received')},
+                'seconds': round(entry['seconds'], 3),
+                'status': dict(sorted(entry['status'].items())),
+                'latency_ms': {
+                    'mean': round(entry['seconds'] * 1000 / entry['requests'], 1),
+                    'p50': _percentile(histogram, 0.5),
+                    'p95': _percentile(histogram, 0.95),
+                    'max': round(entry['max_ms'], 1),
+                    'histogram': dict(zip(labels, histogram))
+                }
+            }
+        stages = {name: {'seconds': round(entry['seconds'], 3), 'calls': entry['calls']}
+                  for name, entry in _stages.items()}
+        counters = dict(_counters)
+
+    wall = time.perf_counter() - _run['wall_start'] if _run['wall_start'] is not None else None
+    cpu = time.process_time() - _run['cpu_start'] if _run['cpu_start'] is not None else None
+    return {
+        'script': _run['script'],
+        'started': _run['started'],
+        'wall_seconds': round(wall, 3) if wall is not None else None,
+        'cpu_seconds': round(cpu, 3) if cpu is not None else None,
+        'peak_rss_mb': _peak_rss_mb(),
+        'stages': stages,
+        'requests': requests,
+        'totals': {
+            key: sum(entry[key] for entry in requests.values())
+            for key in ('requests', 'errors', 'retries', 'bytes_sent', 'bytes_received')
+        },
+        'counters': counters
+    }
+
+def finish(report_file=REPORT_FILE):
+    """打印摘要并写出JSON报告，返回报告"""
+    result = report()
+    totals = result['totals']
+    print("=" * 50)
+    print(f"运行指标: 总耗时 {result['wall_seconds']} 秒，CPU {result['cpu_seconds']} 秒，峰值内存 {result['peak_rss_mb']} MB")
+    if result['stages']:
+        print("阶段耗时: " + "，".join(f"{name} {entry['seconds']:.2f}秒/{entry['calls']}次"
+                                     for name, entry in result['stages'].items()))
+    print(f"HTTP请求: {totals['requests']} 次，接收 {totals['bytes_received'] / 1e6:.2f} MB，"
+          f"重试 {totals['retries']} 次，失败 {totals['errors']} 次")
+    for name, entry in result['requests'].items():
+        latency = entry['latency_ms']
+        p95 = f"<= {latency['p95']}" if latency['p95'] is not None else f"> {LATENCY_BUCKETS[-1]}"
+        print(f"  {name}: {entry['requests']} 次，平均 {latency['mean']} 毫秒，P95 {p95} 毫秒")
+    if result['counters']:
+        print("计数: " + "，".join(f"{name} {value}" for name, value in result['counters'].items()))
+
+    if report_file:
+        try:
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"运行报告已写入: {report_file}")
+        except OSError as err:
+            print(f"写入运行报告失败: {err}")
+    return result
@@ -0,0 +1,196 @@
+import argparse
+import os
+import time
+
+import Boards
+import Checkpoint
+import GetThread
+import GetThread_Lite
+import GetVote
+import GetVote_Lite
+import Metrics
+import PollSchedule
+import ProcessJson
+import ProcessScore
+import S1Client
+import Storage
+import TimeParser
+import TitleParser
+import VoteHistory
+from Database import Table
+
+# ====================================================================================
+# 单进程流水线：加载一次 database.csv，依次执行 爬取 → 投票 → 评分 → 标题解析 → 导出，
+# 后三个阶段只处理本次被修改的行，最后统一写回一次
+#
+#   lite : GetThread_Lite + GetVote_Lite（每天三次）
+#   daily: GetThread      + GetVote_Lite（每天）
+#   all  : GetThread      + GetVote（每周全量）
+# GetThread 的列表页和 GetVote 的投票结果记录到检查点（见 Checkpoint），中断后重新运行时
+# 只请求剩余部分；Lite 两个阶段请求很少，不记录检查点
+# ====================================================================================
+MODES = ('lite', 'daily', 'all')
+VOTE_COLUMNS = [f'votes{i}' for i in range(1, 6)] + ['message']
+
+def stage_scrape(table, session, mode, journal=None):
+    """并发爬取各板块（见 Boards）：添加新帖子，刷新现有帖子的回复数和浏览量"""
+    if table.ensure_columns(['fid', *TimeParser.COLUMNS]):
+        table.mark_all_dirty()
+    table.mark_dirty(TimeParser.fill_post_ts(table.rows))
+    if mode == 'lite':
+        watermarks = Boards.watermarks(table.rows, GetThread_Lite.CONFIG['forum_fids'])
+        new_threads = GetThread_Lite.crawl_new_threads(session, set(table.index), watermarks, table.fieldnames)
+        updated_tids = set()
+    else:
+        new_threads, updated_tids = GetThread.crawl(session, table.index, table.fieldnames, journal)
+
+    for row in sorted(new_threads, key=lambda x: int(x['tid']), reverse=True):
+        table.add(row)
+    table.mark_dirty(updated_tids)
+    print(f"爬取阶段: 新增 {len(new_threads)} 条，更新 {len(updated_tids)} 条")
+
+def _vote_snapshot(row):
+    return [str(row.get(col, '')) for col in VOTE_COLUMNS]
+
+def stage_poll(table, session, sid, mode, journal=None):
+    """抓取投票：全量模式按调度刷新（检查点中已有结果的帖子不再请求），其余模式只刷新最近有回复的帖子
+
+    返回 (调度状态, 投票历史, 抓取时间)，由调用方在数据库写回成功后保存
+    """
+    if table.ensure_columns(VOTE_COLUMNS):
+        table.mark_all_dirty()
+
+    schedule = PollSchedule.load_schedule()
+    history = VoteHistory.VoteHistory().load()
+    now = time.time()
+    if mode == 'all':
+        rows = [row for row in table.rows if PollSchedule.is_due(schedule, row, now)]
+        print(f"需要刷新 {len(rows)} 行，跳过 {len(table.rows) - len(rows)} 行（投票已稳定）")
+        before = [_vote_snapshot(row) for row in rows]
+        done = {entry['tid']: entry for entry in journal.entries} if journal is not None else {}
+        pending = GetVote.resume_rows(rows, done)
+        if done:
+            print(f"从检查点恢复 {len(rows) - len(pending)} 行，需要请求 {len(pending)} 行")
+        GetVote.fetch_polls(sid, pending, journal=journal)
+        for row in rows:
+            PollSchedule.record_poll(schedule, row, now)
+            history.record_row(row)
+    else:
+        tids = GetVote_Lite.scrape_threads(session)
+        rows = [table.index[tid] for tid in tids if tid in table.index]
+        before = [_vote_snapshot(row) for row in rows]
+        poll_results = GetVote_Lite.fetch_poll_results(session, sid, tids)
+        GetVote_Lite.apply_poll_results(rows, poll_results, schedule, now, history)
+
+    changed = [row['tid'] for row, old in zip(rows, before) if _vote_snapshot(row) != old]
+    table.mark_dirty(changed)
+    print(f"投票阶段: 请求 {len(rows)} 次，{len(changed)} 条发生变化")
+    return schedule, history, now
+
+def stage_score(table):
+    """只为脏行重新计算评分"""
+    if table.ensure_columns(['score', 'standard_deviation']):
+        table.mark_all_dirty()
+    rows = table.dirty_rows()
+    ProcessScore.score_rows(rows)
+    print(f"评分阶段: 计算 {len(rows)} 条")
+
+    if ProcessScore.BAYES_SCORE:
+        # 贝叶斯评分依赖全站先验，对所有行批量计算，只把数值变化的行标记为脏行
+        if table.ensure_columns(ProcessScore.BAYES_COLUMNS):
+            table.mark_all_dirty()
+        columns = ProcessScore.load_votes(table.rows)
+        prior = ProcessScore.global_prior([columns])
+        changed = ProcessScore.bayes_rows(table.rows, prior, columns)
+        table.mark_dirty(row['tid'] for row in changed)
+        print(f"贝叶斯评分: 计算 {len(table.rows)} 条，变化 {len(changed)} 条")
+
+def stage_titles(table):
+    """只为脏行中year列为空的行（新帖子和此前解析失败的帖子）解析标题"""
+    if table.ensure_columns(ProcessJson.TITLE_COLUMNS, after='title'):
+        table.mark_all_dirty()
+    parsed = TitleParser.parse_rows(table.dirty_rows())
+    Metrics.count('titles_parsed', parsed)
+    print(f"标题解析阶段: 解析 {parsed} 条")
+
+def stage_export(table):
+    """按CSV字段顺序逐行导出JSON"""
+    json_data = (
+        ProcessJson.to_json_row({field: row.get(field, '') for field in table.fieldnames})
+        for row in table.ordered_rows()
+    )
+    ProcessJson.write_json(json_data)
+
+def run(mode, database=Storage.DATABASE):
+    cpu_start = time.process_time()
+    wall_start = time.time()
+    with Metrics.stage('load'):
+        table = Table(database).load()
+
+    # 数据库和调度文件在成功写回前不变，中断后重新运行时检查点仍然有效
+    key = Checkpoint.input_key([database, PollSchedule.SCHEDULE_FILE], mode, *GetThread.journal_params())
+    scrape_journal = Checkpoint.Journal(f'Pipeline-{mode}-pages', key).load() if mode != 'lite' else None
+    poll_journal = Checkpoint.Journal(f'Pipeline-{mode}-polls', key).load() if mode == 'all' else None
+
+    # 所有阶段共用GetVote的客户端（连接池按投票并发数配置），网页与API各登录一次
+    client = GetVote.client
+    session = client.session
+    if not client.login_web():
+        return False
+    with Metrics.stage('scrape'):
+        try:
+            stage_scrape(table, session, mode, scrape_journal)
+        except GetThread.CrawlError as err:
+            print(f"{err}，本次不保存，重新运行时从检查点继续")
+            return False
+    if scrape_journal is not None:
+        # 阶段结束时写盘，后续阶段中断时不必重新爬取
+        scrape_journal.flush()
+
+    sid = client.login_api()
+    if not sid:
+        return False
+    with Metrics.stage('poll'):
+        schedule, history, polled_at = stage_poll(table, session, sid, mode, poll_journal)
+    if poll_journal is not None:
+        poll_journal.flush()
+
+    with Metrics.stage('score'):
+        stage_score(table)
+    with Metrics.stage('titles'):
+        stage_titles(table)
+    with Metrics.stage('save'):
+        changed = bool(table.dirty or table.schema_changed)
+        if not table.save() and changed:
+            print("数据库保存失败，调度状态和投票历史不保存，重新运行时从检查点继续")
+            return False
+        # 调度状态和投票历史只在CSV写回后保存：否则下次运行时这些帖子不再到期，新的票数会丢失
+        PollSchedule.save_schedule(schedule)
+        history.commit(polled_at)
+        for journal in (scrape_journal, poll_journal):
+            if journal is not None:
+                journal.complete()
+    with Metrics.stage('export'):
+        stage_export(table)
+
+    json_size = os.path.getsize('database.min.json')
+    print("=" * 50)
+    print(f"总耗时 {time.time() - wall_start:.1f} 秒，CPU {time.process_time() - cpu_start:.2f} 秒")
+    print(f"读取数据库 {table.bytes_read} 字节，写入CSV {table.bytes_written} 字节，写入JSON {json_size} 字节")
+    Metrics.count('database_bytes_read', table.bytes_read)
+    Metrics.count('csv_bytes_written', table.bytes_written)
+    Metrics.count('json_bytes_written', json_size)
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='单进程更新数据库')
+    parser.add_argument('mode', choices=MODES, help='运行模式')
+    args = parser.parse_args()
+    Metrics.start_run(f'Pipeline {args.mode}')
+
+    if not S1Client.USERNAME or not S1Client.PASSWORD:
+        print("错误：必须设置 S1_USERNAME 和 S1_PASSWORD 环境变量")
+        exit(1)
+
+    if not run(args.mode):
+        exit(1)
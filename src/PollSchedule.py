@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import time
+
+import TimeParser
+
+# ====================================================================================
+# 投票刷新调度：记录每个tid的最后抓取/最后变化时间，对长期不变的帖子指数退避
+# ====================================================================================
+SCHEDULE_FILE = os.environ.get('S1_POLL_SCHEDULE', 'poll_schedule.json')
+SETTLE_POLLS = 3          # 连续多少次未变化后开始退避
+BASE_INTERVAL_DAYS = 7    # 退避起始间隔（与每周全量刷新对齐）
+MAX_INTERVAL_DAYS = 180   # 退避间隔上限
+SEED_AGE_DAYS = 365       # 首次调度时，发帖超过该天数的帖子直接视为已稳定
+SLACK_SECONDS = 12 * 3600 # 定时任务触发时间存在偏差，留出余量
+TRANSIENT_ERROR_PREFIXES = ('HTTP错误', '请求异常')
+# ====================================================================================
+
+DAY = 86400
+
+def load_schedule(path=SCHEDULE_FILE):
+    """读取调度状态文件，不存在时返回空字典"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as err:
+        print(f"读取调度文件失败，将重新开始调度: {err}")
+        return {}
+
+def save_schedule(schedule, path=SCHEDULE_FILE):
+    """安全保存调度状态文件（使用临时文件）"""
+    temp_file = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode='w',
+            encoding='utf-8',
+            dir=os.path.dirname(path) or '.',
+            delete=False
+        ) as temp:
+            temp_file = temp.name
+            json.dump(schedule, temp, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        os.replace(temp_file, path)
+        return True
+    except Exception as err:
+        print(f"保存调度文件失败: {err}")
+        if temp_file and os.path.exists(temp_file):
+            os.unlink(temp_file)
+        return False
+
+def row_votes(row):
+    """提取行中的五个投票数，统一为字符串列表便于比较"""
+    return [str(row.get(f'votes{i}', '') or '0') for i in range(1, 6)]
+
+def _post_age_days(row, now):
+    # 优先使用post_ts列，旧数据按post_time解析（北京时间）
+    posted = row.get('post_ts')
+    posted = int(posted) if posted else TimeParser.parse_absolute(row.get('post_time') or '')
+    if posted is None:
+        return 0
+    return (now - posted) / DAY
+
+def _seed_entry(row, now):
+    """为调度表中尚无记录的帖子生成初始状态，旧帖直接进入退避阶段"""
+    old = _post_age_days(row, now) > SEED_AGE_DAYS
+    return {
+        'votes': row_votes(row),
+        'last_polled': 0,
+        'last_changed': 0,
+        'stable': SETTLE_POLLS if old else 0
+    }
+
+def poll_interval(entry):
+    """根据连续未变化次数计算下一次抓取的间隔（秒）"""
+    stable = entry.get('stable', 0)
+    if stable < SETTLE_POLLS:
+        return 0
+    days = BASE_INTERVAL_DAYS * 2 ** min(stable - SETTLE_POLLS, 16)
+    return min(days, MAX_INTERVAL_DAYS) * DAY
+
+def is_due(schedule, row, now=None):
+    """判断该行是否需要重新抓取投票"""
+    now = now or time.time()
+    tid = row.get('tid')
+    if not tid:
+        return False
+    entry = schedule.get(tid)
+    if entry is None:
+        schedule[tid] = entry = _seed_entry(row, now)
+    return now - entry.get('last_polled', 0) + SLACK_SECONDS >= poll_interval(entry)
+
+def record_poll(schedule, row, now=None):
+    """记录一次抓取结果，更新最后抓取/变化时间；返回投票是否发生变化"""
+    now = int(now or time.time())
+    tid = row.get('tid')
+    message = str(row.get('message', '') or '')
+    if not tid or message.startswith(TRANSIENT_ERROR_PREFIXES):
+        # 网络类错误不算一次有效抓取，下次继续尝试
+        return False
+    entry = schedule.get(tid) or _seed_entry(row, now)
+    votes = row_votes(row)
+    changed = votes != entry.get('votes')
+    entry['votes'] = votes
+    entry['last_polled'] = now
+    if changed:
+        entry['last_changed'] = now
+        entry['stable'] = 0
+    else:
+        entry['stable'] = entry.get('stable', 0) + 1
+    schedule[tid] = entry
+    return changed
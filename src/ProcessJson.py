@@ -1,160 +1,391 @@
 import csv
-import re
 import os
 import json
 import datetime
+import hashlib
+import re
+import shutil
+import tempfile
 import time
 
+import ExportShards
+import Leaderboard
+import Metrics
+import SearchIndex
+import TitleParser
+
 def process_title(title):
-    """处理标题字段，提取年份、月份、类别、集数和纯标题"""
-    # 改进后的正则表达式，支持单数字月份
-    pattern = r'\[(\d{4})\.(\d{1,2})\]\s*\[([^\.]+)\.(\d+)\]\s*([^／/]+)'
-    match = re.match(pattern, title)
+    """处理标题字段，提取纯标题、别名、年份、月份、类别和集数（见 TitleParser）"""
+    return TitleParser.parse(title)
+
+# 标题解析生成的列，依次插入在title列之后
+TITLE_COLUMNS = ['aliases', 'year', 'month', 'category', 'ep']
+
+def apply_title(row):
+    """对字典形式的行解析标题（仅当year列为空时），返回是否进行了解析"""
+    return TitleParser.parse_rows([row]) == 1
+
+def to_json_row(row_dict):
+    """将CSV行字典转换为JSON输出格式（aliases拆分为数组）
+
+    其余字段一律输出为字符串（与从CSV读出的值相同），保证行哈希与上一次导出可比较
+    """
+    row_dict = {key: '' if value is None else str(value) for key, value in row_dict.items()}
+    # 处理aliases字段 - 按分号分割并去除空格
+    if 'aliases' in row_dict and row_dict['aliases']:
+        aliases_str = row_dict['aliases']
+        # 分割并清理每个别名
+        aliases_list = [alias.strip() for alias in aliases_str.split(';') if alias.strip()]
+        row_dict['aliases'] = aliases_list
+    else:
+        row_dict['aliases'] = []  # 确保总是数组类型
+    return row_dict
+
+def _row_text(row):
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':'))
+
+def _row_digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+def delta_filename(min_json_filename):
+    """增量文件名：database.min.json -> database.delta.json"""
+    if min_json_filename.endswith('.min.json'):
+        return min_json_filename[:-len('.min.json')] + '.delta.json'
+    return min_json_filename + '.delta'
+
+def _tid_key(tid):
+    try:
+        return int(tid)
+    except ValueError:
+        return None
+
+class PreviousExport:
+    """逐行读取上一次导出的JSON，与本次导出按顺序归并比较（内存占用与行数无关）
+
+    两次导出都按tid从大到小排列（见 Database.Table.ordered_rows），两边同步前进即可找出
+    新增/变化的行和被删除的tid；任何一边的tid不是严格递减的整数时不能归并，不生成增量文件。
+    同时计算上一次导出data部分的哈希，用于判断本次导出是否完全相同
+    """
+    CHUNK_SIZE = 1 << 16
+    HEADER = re.compile(r'\s*\{\s*"update_time"\s*:\s*(-?\d+)\s*,\s*"data"\s*:\s*\[')
+    SKIP = re.compile(r'[\s,]*')   # 行之间的逗号和空白
+    DECODER = json.JSONDecoder()
+
+    def __init__(self, f, buffer, update_time):
+        self.file = f
+        self.buffer = buffer
+        self.position = 0
+        self.update_time = update_time
+        self.data_hash = hashlib.blake2b(digest_size=16)
+        self.rows = 0
+        self.mergeable = True
+        self.removed = []
+        self.current = None     # 下一行上一次导出的 (tid整数, tid, 行哈希)，读完时为None
+        self._advance()
+
+    @classmethod
+    def open(cls, min_json_filename):
+        """打开上一次导出的JSON并读取 update_time，不存在或格式不对时返回None"""
+        if not os.path.exists(min_json_filename):
+            return None
+        f = None
+        try:
+            f = open(min_json_filename, 'r', encoding='utf-8')
+            buffer = f.read(cls.CHUNK_SIZE)
+            match = cls.HEADER.match(buffer)
+            if not match:
+                raise ValueError("缺少 update_time/data")
+            return cls(f, buffer[match.end():], int(match.group(1)))
+        except (OSError, ValueError) as err:
+            if f is not None:
+                f.close()
+            print(f"读取上一次导出的JSON失败，将完整导出: {err}")
+            return None
+
+    def _read_row(self):
+        """解析下一行，data数组结束时返回None"""
+        while True:
+            position = self.SKIP.match(self.buffer, self.position).end()
+            if position < len(self.buffer):
+                if self.buffer[position] == ']':
+                    return None
+                try:
+                    row, self.position = self.DECODER.raw_decode(self.buffer, position)
+                    return row
+                except ValueError:
+                    pass
+            # 行被缓冲区截断，读入下一块
+            chunk = self.file.read(self.CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("data数组没有结束")
+            self.buffer = self.buffer[position:] + chunk
+            self.position = 0
+
+    def _advance(self):
+        previous = self.current
+        self.current = None
+        if self.file is None:
+            return
+        try:
+            row = self._read_row()
+        except ValueError as err:
+            print(f"上一次导出的JSON不完整，不生成增量文件: {err}")
+            row = None
+            self.mergeable = False
+            self.data_hash.update(b'\0')   # 与任何完整的导出都不相同
+        if row is None:
+            self.close()
+            return
+        text = _row_text(row)
+        self.data_hash.update(b',' if self.rows else b'')
+        self.data_hash.update(text.encode('utf-8'))
+        self.rows += 1
+        tid = str(row.get('tid', ''))
+        key = _tid_key(tid)
+        if key is None or (previous is not None and previous[0] is not None and key >= previous[0]):
+            self.mergeable = False
+        self.current = (key, tid, _row_digest(text))
+
+    def changed(self, tid, digest):
+        """本次导出的下一行（tid、行哈希）与上一次相比是否新增或变化；跳过的上一次的行记为删除"""
+        key = _tid_key(tid)
+        if key is None:
+            self.mergeable = False
+        if not self.mergeable:
+            return True
+        while self.current is not None and self.current[0] > key:
+            self.removed.append(self.current[1])
+            self._advance()
+        if self.current is not None and self.current[0] == key:
+            same = self.current[2] == digest
+            self._advance()
+            return not same
+        return True
+
+    def finish(self):
+        """读完上一次导出的剩余行（计入删除和哈希），返回data部分的哈希"""
+        while self.current is not None:
+            if self.mergeable:
+                self.removed.append(self.current[1])
+            self._advance()
+        return self.data_hash.digest()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def write_delta(path, update_time, since, changed, removed):
+    """写入增量文件：since 为上一次导出的 update_time，changed 为逐行写入 "tid":行 片段（逗号分隔）的临时文件
+
+    输出与 json.dump({"update_time", "since", "changed": {tid: 行}, "removed"}) 相同
+    """
+    changed.seek(0)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'{{"update_time":{update_time},"since":{since},"changed":{{')
+        shutil.copyfileobj(changed, f)
+        f.write('},"removed":')
+        json.dump(removed, f, ensure_ascii=False, separators=(',', ':'))
+        f.write('}')
+
+def write_search_index(index, path, shard_dir=''):
+    """写出搜索索引；启用分片导出时同时生成预压缩文件"""
+    if index.write(path) or (shard_dir and not os.path.exists(path + '.gz')):
+        if shard_dir:
+            ExportShards.compress_siblings(path)
+
+def write_json(json_data, min_json_filename='database.min.json', shard_dir=ExportShards.SHARD_DIR,
+               search_index=SearchIndex.INDEX_FILE, leaderboard_dir=Leaderboard.LEADERBOARD_DIR):
+    """写入带时间戳的压缩版JSON文件，返回更新时间戳
+
+    json_data 可以是生成器：逐行序列化写出，输出与一次性json.dump完全相同。
+    与上一次导出逐行归并比较哈希（见 PreviousExport）：数据完全相同时不写入并保留原 update_time，
+    否则同时写出只包含新增/变化行的增量文件（见 delta_filename）。
+    给出 shard_dir 时同时写出分片、清单以及预压缩文件（见 ExportShards），
+    给出 search_index 时同时写出标题/别名搜索索引（见 SearchIndex），
+    给出 leaderboard_dir 时同时写出排行榜（见 Leaderboard）
+    """
+    previous = PreviousExport.open(min_json_filename)
     
-    if match:
-        year = match.group(1)
-        # 处理月份：去掉前导零，保留单数字月份
-        month = match.group(2).lstrip('0')
-        month = month if month != '' else '0'  # 处理"00"变为"0"的情况
-        
-        category = match.group(3)
-        
-        # 处理集数：去掉前导零
-        ep = match.group(4).lstrip('0')
-        ep = ep if ep != '' else '0'  # 处理"00"变为"0"的情况
-        
-        pure_title = match.group(5).strip()  # 去掉前后空格
+    # 获取当前时间戳（秒级）
+    current_timestamp = int(time.time())
+    
+    # 写入压缩版JSON文件（无缩进/空格），结构为 {"update_time": 时间戳, "data": [...]}
+    # 新增/变化的行写入临时文件（内存占用与变化的行数无关）
+    changed = tempfile.TemporaryFile(mode='w+', encoding='utf-8', dir=os.path.dirname(min_json_filename) or '.')
+    changed_rows = 0
+    rows = 0
+    last_key = None
+    data_hash = hashlib.blake2b(digest_size=16)
+    shards = ExportShards.ShardWriter(shard_dir) if shard_dir else None
+    index = SearchIndex.IndexBuilder() if search_index else None
+    leaderboards = Leaderboard.LeaderboardBuilder(leaderboard_dir) if leaderboard_dir else None
+    temp_file = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode='w',
+            encoding='utf-8',
+            dir=os.path.dirname(min_json_filename) or '.',
+            delete=False
+        ) as f:
+            temp_file = f.name
+            f.write(f'{{"update_time":{current_timestamp},"data":[')
+            for i, row in enumerate(json_data):
+                text = _row_text(row)
+                if i:
+                    f.write(',')
+                f.write(text)
+                if shards:
+                    shards.add(row, text)
+                if index:
+                    index.add(row)
+                if leaderboards:
+                    leaderboards.add(row)
+                data_hash.update(b',' if i else b'')
+                data_hash.update(text.encode('utf-8'))
+                
+                rows += 1
+                if previous:
+                    tid = str(row.get('tid', ''))
+                    key = _tid_key(tid)
+                    if key is None or (last_key is not None and key >= last_key):
+                        # 本次导出不是按tid从大到小排列
+                        previous.mergeable = False
+                    last_key = key
+                    if previous.changed(tid, _row_digest(text)) and previous.mergeable:
+                        changed.write(f"{',' if changed_rows else ''}{json.dumps(tid, ensure_ascii=False)}:{text}")
+                        changed_rows += 1
+            f.write(']}')
+        Metrics.count('rows_exported', rows)
         
-        return pure_title, '', year, month, category, ep  # 添加空别名
-    return title, '', '', '', '', ''  # 如果匹配失败返回原始值
+        if previous and previous.finish() == data_hash.digest():
+            os.unlink(temp_file)
+            print(f"JSON数据无变化，跳过写入: {min_json_filename}")
+            print(f"保留更新时间戳: {previous.update_time}")
+            with Metrics.stage('export_extras'):
+                if shards:
+                    shards.finish(previous.update_time)
+                    if not os.path.exists(min_json_filename + '.gz'):
+                        ExportShards.compress_siblings(min_json_filename)
+                if index:
+                    write_search_index(index, search_index, shard_dir)
+                if leaderboards:
+                    leaderboards.finish()
+            return previous.update_time
+        os.replace(temp_file, min_json_filename)
+        print(f"已生成压缩版JSON文件: {min_json_filename}")
+        print(f"更新时间戳: {current_timestamp} ({datetime.datetime.fromtimestamp(current_timestamp).isoformat()})")
+
+        delta_file = delta_filename(min_json_filename)
+        if previous and previous.mergeable:
+            write_delta(delta_file, current_timestamp, previous.update_time, changed, previous.removed)
+            print(f"已生成增量文件: {delta_file}（新增/变化 {changed_rows} 行，删除 {len(previous.removed)} 行）")
+        elif os.path.exists(delta_file):
+            # 没有可比较的上一次导出时，旧的增量文件已无意义
+            os.unlink(delta_file)
+    except Exception:
+        if temp_file and os.path.exists(temp_file):
+            os.unlink(temp_file)
+        if shards:
+            shards.discard()
+        raise
+    finally:
+        if previous:
+            previous.close()
+        changed.close()
+    
+    # 分片、搜索索引与排行榜的收尾（写文件、压缩）
+    with Metrics.stage('export_extras'):
+        if shards:
+            shards.finish(current_timestamp)
+            ExportShards.compress_siblings(min_json_filename)
+        if index:
+            write_search_index(index, search_index, shard_dir)
+        if leaderboards:
+            leaderboards.finish()
+    return current_timestamp
 
 def process_csv_file(input_file):
-    """处理整个CSV文件并覆盖原文件，然后另存为JSON"""
-    # 读取输入CSV
-    rows = []
-    with open(input_file, 'r', encoding='utf-8-sig') as f:
+    """逐行处理CSV文件并覆盖原文件，同时逐行写出JSON（内存占用与行数无关）"""
+    temp_file = input_file + '.tmp'
+    with open(input_file, 'r', encoding='utf-8-sig', newline='') as f:
         reader = csv.reader(f)
-        rows = list(reader)
-    
-    if not rows:
-        print("CSV文件为空")
-        return
-    
-    # 获取列索引
-    header = rows[0]
-    title_idx = header.index('title')
-    
-    # 检查是否已有别名等列
-    required_cols = ['aliases', 'year', 'month', 'category', 'ep']
-    has_all_cols = all(col in header for col in required_cols)
-    
-    # 创建新标题行 - 只在需要时添加新列
-    if not has_all_cols:
-        # 在title列后添加新列
-        new_header = (
-            header[:title_idx+1] + 
-            required_cols + 
-            header[title_idx+1:]
-        )
+        header = next(reader, None)
+        
+        if header is None:
+            print("CSV文件为空")
+            return
         
-        # 更新数据行，为每行添加五个空值
-        for i in range(1, len(rows)):
-            rows[i] = (
-                rows[i][:title_idx+1] + 
-                ['', '', '', '', ''] +  # 五个空值对应五个新列
-                rows[i][title_idx+1:]
+        # 获取列索引
+        title_idx = header.index('title')
+        
+        # 检查是否已有别名等列
+        required_cols = TITLE_COLUMNS
+        has_all_cols = all(col in header for col in required_cols)
+        
+        # 创建新标题行 - 只在需要时添加新列（在title列后添加五个新列）
+        if not has_all_cols:
+            new_header = (
+                header[:title_idx+1] + 
+                required_cols + 
+                header[title_idx+1:]
             )
-    else:
-        # 如果已有这些列，保持原样
-        new_header = header
-    
-    # 获取新列的索引
-    col_indices = {}
-    for col in required_cols:
-        col_indices[col] = new_header.index(col) if col in new_header else -1
-    
-    title_idx = new_header.index('title')  # 更新title索引位置
-    
-    # 处理数据行
-    processed_rows = []
-    for row in rows[1:]:
-        # 只有当year列为空时才处理标题
-        if col_indices['year'] != -1 and row[col_indices['year']] == '':
-            # 处理title字段
-            processed_title, aliases, year, month, category, ep = process_title(row[title_idx])
-            
-            # 更新纯标题
-            row[title_idx] = processed_title
+        else:
+            # 如果已有这些列，保持原样
+            new_header = header
+        
+        # 获取新列的索引
+        col_indices = {}
+        for col in required_cols:
+            col_indices[col] = new_header.index(col) if col in new_header else -1
+        
+        new_title_idx = new_header.index('title')  # 更新title索引位置
+        
+        def process_row(row):
+            if not has_all_cols:
+                # 为每行添加五个空值对应五个新列
+                row = row[:title_idx+1] + ['', '', '', '', ''] + row[title_idx+1:]
             
-            # 更新新列的值
-            if col_indices['aliases'] != -1: row[col_indices['aliases']] = aliases
-            if col_indices['year'] != -1: row[col_indices['year']] = year
-            if col_indices['month'] != -1: row[col_indices['month']] = month
-            if col_indices['category'] != -1: row[col_indices['category']] = category
-            if col_indices['ep'] != -1: row[col_indices['ep']] = ep
+            # 只有当year列为空时才处理标题
+            if col_indices['year'] != -1 and row[col_indices['year']] == '':
+                # 处理title字段
+                with Metrics.stage('titles'):
+                    processed_title, aliases, year, month, category, ep = process_title(row[new_title_idx])
+                
+                # 更新纯标题
+                row[new_title_idx] = processed_title
+                
+                # 更新新列的值
+                if col_indices['aliases'] != -1: row[col_indices['aliases']] = aliases
+                if col_indices['year'] != -1: row[col_indices['year']] = year
+                if col_indices['month'] != -1: row[col_indices['month']] = month
+                if col_indices['category'] != -1: row[col_indices['category']] = category
+                if col_indices['ep'] != -1: row[col_indices['ep']] = ep
+            return row
         
-        processed_rows.append(row)
-    
-    # 创建临时文件路径
-    temp_file = input_file + '.tmp'
-    
-    # 写入处理后的数据到临时文件
-    with open(temp_file, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(new_header)
-        writer.writerows(processed_rows)
+        # 写入处理后的数据到临时文件，每写一行CSV就产出对应的JSON行
+        with open(temp_file, 'w', encoding='utf-8-sig', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(new_header)
+            
+            def json_rows():
+                for row in reader:
+                    row = process_row(row)
+                    writer.writerow(row)
+                    yield to_json_row(dict(zip(new_header, row)))
+            
+            write_json(json_rows())
     
     # 替换原文件
     os.replace(temp_file, input_file)
     print(f"文件处理完成，已覆盖原文件: {input_file}")
-    
-    # 构建JSON数据
-    json_data = []
-    
-    # 将处理后的行转换为字典列表
-    for row in processed_rows:
-        row_dict = dict(zip(new_header, row))
-        
-        # 处理aliases字段 - 按分号分割并去除空格
-        if 'aliases' in row_dict and row_dict['aliases']:
-            aliases_str = row_dict['aliases']
-            # 分割并清理每个别名
-            aliases_list = [alias.strip() for alias in aliases_str.split(';') if alias.strip()]
-            row_dict['aliases'] = aliases_list
-        else:
-            row_dict['aliases'] = []  # 确保总是数组类型
-        
-        json_data.append(row_dict)
-    
-    # 获取当前时间戳（秒级）
-    current_timestamp = int(time.time())
-    
-    # 创建包含时间戳和数据的JSON对象
-    final_json = {
-        "update_time": current_timestamp,
-        "data": json_data
-    }
-    
-    # 固定JSON文件名
-    # json_filename = 'database.json'
-    min_json_filename = 'database.min.json'
-    
-    # 写入格式化的JSON文件
-    # with open(json_filename, 'w', encoding='utf-8') as f:
-        # json.dump(final_json, f, ensure_ascii=False, indent=2)
-    
-    # 写入压缩版JSON文件（无缩进/空格）
-    with open(min_json_filename, 'w', encoding='utf-8') as f:
-        json.dump(final_json, f, ensure_ascii=False, separators=(',', ':'))
-    
-    # print(f"已将处理后的数据保存为JSON文件: {json_filename}")
-    print(f"已生成压缩版JSON文件: {min_json_filename}")
-    print(f"更新时间戳: {current_timestamp} ({datetime.datetime.fromtimestamp(current_timestamp).isoformat()})")
 
 # 主程序
 if __name__ == "__main__":
+    Metrics.start_run('ProcessJson')
     # 输入文件路径
     input_file = 'database.csv'
     
-    # 处理CSV文件
-    process_csv_file(input_file)
+    # 处理CSV文件（CSV读写与JSON导出在同一次遍历中完成）
+    with Metrics.stage('export'):
+        process_csv_file(input_file)
@@ -1,5 +1,26 @@
-import csv
 import math
+import os
+from array import array
+
+import Metrics
+import RowStream
+import Storage
+
+# NumPy为可选依赖：安装时使用向量化计算，否则退回到基于array的逐列计算
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 贝叶斯评分（可选）：设置 S1_BAYES_SCORE=1 时额外输出以下列，原有score列不受影响
+#   bayes_score      以全站投票分布为先验的后验平均分（票数少的帖子向全站平均收缩），范围[-200,200]
+#   ci_low, ci_high  后验平均分的置信区间
+BAYES_SCORE = os.environ.get('S1_BAYES_SCORE', '') == '1'
+BAYES_COLUMNS = ['bayes_score', 'ci_low', 'ci_high']
+PRIOR_WEIGHT = os.environ.get('S1_BAYES_PRIOR_WEIGHT', '')  # 先验相当于多少票，为空时取有票帖子的平均票数
+CI_Z = 1.96               # 95%置信区间
+OPTION_VALUES = (2, 1, 0, -1, -2)  # 五个选项对应的分值（与calculate_score一致）
+VOTE_KEYS = [f'votes{i}' for i in range(1, 6)]
 
 def calculate_score(row):
     """根据投票数据计算分数"""
@@ -62,67 +83,192 @@ def calculate_std_dev(row):
     
     return std_dev_formatted
 
-# 源文件名
-source_filename = 'database.csv'
+def load_votes(rows):
+    """将所有行的五个投票数载入五个整数列（空值视为0）"""
+    return [array('q', [int(row.get(key) or 0) for row in rows]) for key in VOTE_KEYS]
+
+def _batch_statistics_numpy(columns):
+    votes = np.array(columns, dtype=np.int64)  # 5 x N
+    v1, v2, v3, v4, v5 = votes
+    total = votes.sum(axis=0)
+    nonzero = total != 0
+    safe_total = np.where(nonzero, total, 1)
+
+    # 与calculate_score相同的运算顺序，保证浮点结果逐位一致
+    raw = 2*v1 + v2 - v4 - 2*v5
+    score = np.where(nonzero, 100 * (raw / safe_total), 0.0)
+
+    # 与calculate_std_dev相同的运算顺序（按评分1..5依次累加）
+    mean = (v1 + 2*v2 + 3*v3 + 4*v4 + 5*v5) / safe_total
+    variance = v1 * (1 - mean)**2
+    for rating, v in ((2, v2), (3, v3), (4, v4), (5, v5)):
+        variance = variance + v * (rating - mean)**2
+    std_dev = np.where(nonzero, np.sqrt(variance / safe_total), 0.0)
+    return {'score': score.tolist(), 'standard_deviation': std_dev.tolist()}
+
+def _batch_statistics_python(columns):
+    # 方差展开为与calculate_std_dev相同顺序的加法（不用生成器求和），结果逐位一致
+    sqrt = math.sqrt
+    scores = []
+    std_devs = []
+    for v1, v2, v3, v4, v5 in zip(*columns):
+        total = v1 + v2 + v3 + v4 + v5
+        if total == 0:
+            scores.append(0.0)
+            std_devs.append(0.0)
+            continue
+        scores.append(100 * ((2*v1 + v2 - v4 - 2*v5) / total))
+        mean = (v1 + 2*v2 + 3*v3 + 4*v4 + 5*v5) / total
+        std_devs.append(sqrt((v1 * (1 - mean) ** 2 + v2 * (2 - mean) ** 2 + v3 * (3 - mean) ** 2
+                              + v4 * (4 - mean) ** 2 + v5 * (5 - mean) ** 2) / total))
+    return {'score': scores, 'standard_deviation': std_devs}
+
+def batch_statistics(columns):
+    """一次性计算所有行的统计量，返回 列名 -> 浮点数列表"""
+    if np is not None:
+        return _batch_statistics_numpy(columns)
+    return _batch_statistics_python(columns)
+
+def global_prior(column_chunks, weight=PRIOR_WEIGHT):
+    """由全部投票计算先验伪计数（五个选项各自的票数比例 × 先验权重）
+
+    column_chunks 为若干组 load_votes 的结果，便于流式处理时逐块累计；
+    比例保留4位小数、权重取整，避免每次运行先验的微小变化改动所有行
+    """
+    sums = [0] * 5
+    voted = 0
+    for columns in column_chunks:
+        for i, column in enumerate(columns):
+            sums[i] += sum(column)
+        voted += sum(1 for votes in zip(*columns) if any(votes))
+    total = sum(sums)
+    if not total:
+        return (1.0,) * 5
+    prior_weight = float(weight) if weight else max(round(total / voted), 1)
+    return tuple(prior_weight * round(s / total, 4) for s in sums)
+
+def _bayes_statistics_numpy(columns, prior):
+    votes = np.array(columns, dtype=np.float64)  # 5 x N
+    posterior = votes + np.array(prior, dtype=np.float64)[:, None]
+    total = posterior.sum(axis=0)
+    mean = np.zeros(total.shape)
+    second = np.zeros(total.shape)
+    for value, counts in zip(OPTION_VALUES, posterior):
+        share = counts / total
+        mean = mean + value * share
+        second = second + value * value * share
+    # Dirichlet后验下平均分的方差
+    spread = CI_Z * np.sqrt(np.maximum(second - mean * mean, 0.0) / (total + 1))
+    return {
+        'bayes_score': (100 * mean).tolist(),
+        'ci_low': (100 * np.maximum(mean - spread, -2.0)).tolist(),
+        'ci_high': (100 * np.minimum(mean + spread, 2.0)).tolist()
+    }
+
+def _bayes_statistics_python(columns, prior):
+    results = {name: [] for name in BAYES_COLUMNS}
+    for votes in zip(*columns):
+        posterior = [v + a for v, a in zip(votes, prior)]
+        total = sum(posterior)
+        mean = 0.0
+        second = 0.0
+        for value, counts in zip(OPTION_VALUES, posterior):
+            share = counts / total
+            mean = mean + value * share
+            second = second + value * value * share
+        spread = CI_Z * math.sqrt(max(second - mean * mean, 0.0) / (total + 1))
+        results['bayes_score'].append(100 * mean)
+        results['ci_low'].append(100 * max(mean - spread, -2.0))
+        results['ci_high'].append(100 * min(mean + spread, 2.0))
+    return results
+
+def bayes_statistics(columns, prior):
+    """一次性计算所有行的贝叶斯评分与置信区间，返回 列名 -> 浮点数列表"""
+    if np is not None:
+        return _bayes_statistics_numpy(columns, prior)
+    return _bayes_statistics_python(columns, prior)
+
+def bayes_rows(rows, prior, columns=None):
+    """批量为每行计算贝叶斯评分列（就地修改），返回值发生变化的行"""
+    stats = bayes_statistics(columns if columns is not None else load_votes(rows), prior)
+    changed = []
+    for row, *values in zip(rows, *(stats[name] for name in BAYES_COLUMNS)):
+        updated = False
+        for name, value in zip(BAYES_COLUMNS, values):
+            text = "{:.4f}".format(value)
+            if row.get(name) != text:
+                row[name] = text
+                updated = True
+        if updated:
+            changed.append(row)
+    return changed
+
+def score_rows(rows):
+    """批量为每行计算score和standard_deviation（就地修改），结果与逐行计算一致"""
+    stats = batch_statistics(load_votes(rows))
+    for name, values in stats.items():
+        for row, text in zip(rows, map("{:.4f}".format, values)):
+            row[name] = text
+    return rows
+
+def score_stream(rows, chunk_size=RowStream.CHUNK_SIZE, prior=None):
+    """按块批量计算评分并逐行产出，内存占用只与块大小有关；给出prior时同时计算贝叶斯评分"""
+    for chunk in RowStream.chunked(rows, chunk_size):
+        with Metrics.stage('score'):
+            score_rows(chunk)
+            if prior is not None:
+                bayes_rows(chunk, prior)
+        yield from chunk
+
+def main():
+    # 源文件名
+    source_filename = 'database.csv'
+
+    # 逐行读取，保存原始列顺序
+    original_fieldnames, rows = RowStream.iter_csv(source_filename)
 
-# 读取所有数据到内存
-rows = []
-with open(source_filename, 'r', encoding='utf-8-sig') as infile:
-    reader = csv.DictReader(infile)
-    original_fieldnames = reader.fieldnames  # 保存原始列顺序
-    
     # 检查是否已有score列和standard_deviation列
     has_score = 'score' in original_fieldnames
     has_std_dev = 'standard_deviation' in original_fieldnames
-    
-    # 处理每一行
-    for row in reader:
-        # 计算分数
-        score_formatted = calculate_score(row)
-        
-        # 如果已有score列，则覆盖数据
-        if has_score:
-            row['score'] = score_formatted
-        # 否则添加新列
-        else:
-            row['score'] = score_formatted
-        
-        # 计算标准差
-        std_dev_formatted = calculate_std_dev(row)
-        
-        # 如果已有standard_deviation列，则覆盖数据
-        if has_std_dev:
-            row['standard_deviation'] = std_dev_formatted
-        # 否则添加新列
-        else:
-            row['standard_deviation'] = std_dev_formatted
-        
-        rows.append(row)
 
-# 覆盖写回源文件
-with open(source_filename, 'w', encoding='utf-8-sig', newline='') as outfile:
-    # 准备字段名列表，保持原始顺序
+    # 准备字段名列表，保持原始顺序（已有列则覆盖数据，否则添加到末尾）
     fieldnames = original_fieldnames.copy()
-    
-    # 如果没有score列，添加到末尾
-    if not has_score and 'score' not in fieldnames:
+    if not has_score:
         fieldnames.append('score')
-    
-    # 如果没有standard_deviation列，添加到末尾
-    if not has_std_dev and 'standard_deviation' not in fieldnames:
+    if not has_std_dev:
         fieldnames.append('standard_deviation')
-    
-    writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(rows)
-
-print(f"计算完成！已处理 {len(rows)} 条记录")
-if has_score:
-    print("已覆盖原有score列的数据")
-else:
-    print("已在文件末尾添加score列")
-    
-if has_std_dev:
-    print("已覆盖原有standard_deviation列的数据")
-else:
-    print("已在文件末尾添加standard_deviation列")
+
+    # 贝叶斯评分需要全站先验：先逐行统计一遍投票分布
+    prior = None
+    if BAYES_SCORE:
+        chunks = RowStream.chunked(RowStream.iter_csv(source_filename)[1])
+        with Metrics.stage('prior'):
+            prior = global_prior(load_votes(chunk) for chunk in chunks)
+        fieldnames.extend(col for col in BAYES_COLUMNS if col not in fieldnames)
+        print(f"贝叶斯先验伪计数: {', '.join(f'{a:.2f}' for a in prior)}")
+
+    # 边读边算边写，通过临时文件覆盖写回源文件（score阶段只包含计算，其余为CSV读写）
+    processed = 0
+    def counted(scored):
+        nonlocal processed
+        for row in scored:
+            processed += 1
+            yield row
+    with Metrics.stage('score_and_write'):
+        Storage.write_csv(source_filename, fieldnames, counted(score_stream(rows, prior=prior)))
+    Metrics.count('rows_scored', processed)
+
+    print(f"计算完成！已处理 {processed} 条记录")
+    if has_score:
+        print("已覆盖原有score列的数据")
+    else:
+        print("已在文件末尾添加score列")
+        
+    if has_std_dev:
+        print("已覆盖原有standard_deviation列的数据")
+    else:
+        print("已在文件末尾添加standard_deviation列")
+
+if __name__ == "__main__":
+    Metrics.start_run('ProcessScore')
+    main()
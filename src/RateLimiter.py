@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+import Metrics
+
+# ====================================================================================
+# 自适应限速（AIMD）：所有经过 S1Client 会话的请求共用一个限速器
+#   响应正常且不慢时速率缓慢增加（每秒约增加 RATE_INCREASE 次/秒）；
+#   遇到429/5xx、urllib3发生过重试、响应慢于 SLOW_SECONDS、或Discuz防刷提示时速率减半，
+#   服务器给出 Retry-After 时在该时间内暂停所有请求；被限流的请求（429或防刷提示）由
+#   S1Client 在限速器减速后重新排队重试
+# 设置 S1_ADAPTIVE_RATE=0 时退回固定速率 RATE_INITIAL（与原来每个请求后sleep(0.5)相当）
+# ====================================================================================
+ADAPTIVE = os.environ.get('S1_ADAPTIVE_RATE', '1') == '1'
+RATE_INITIAL = float(os.environ.get('S1_RATE_INITIAL', '2'))   # 初始速率（次/秒）
+RATE_MIN = float(os.environ.get('S1_RATE_MIN', '0.2'))
+RATE_MAX = float(os.environ.get('S1_RATE_MAX', '10'))
+RATE_INCREASE = 1.0      # 加性增：每个正常响应增加 RATE_INCREASE / 当前速率
+RATE_DECREASE = 0.5      # 乘性减：拥塞时速率乘以该系数
+SLOW_SECONDS = 3.0       # 慢于该时间的响应视为服务器过载
+FLOOD_MARKERS = ('刷新过于频繁', '请求过于频繁', '访问过于频繁', '服务器繁忙', 'Too Many Requests')
+FLOOD_PAGE_MAX = 8192    # 防刷提示页都很短，只在较短的响应中查找提示（避免帖子标题误判）
+THROTTLE_RETRIES = 3     # 被限流（429或防刷提示）时减速后重试的次数
+FLOOD_PATTERNS = tuple(marker.encode('utf-8') for marker in FLOOD_MARKERS)
+
+
+class RateLimiter:
+    """线程安全的令牌桶限速器，限制全局每秒请求数"""
+
+    def __init__(self, rate, burst=1):
+        # rate: 每秒允许的请求数；rate <= 0 表示不限速
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到获得一个令牌"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                # 按经过的时间补充令牌，最多补满桶容量
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def observe(self, response, seconds):
+        """请求完成后的反馈（固定速率限速器忽略）"""
+
+
+def is_flood(response):
+    """响应是否为Discuz防刷提示（状态码为200，需要检查内容）"""
+    content = response.content
+    return len(content) <= FLOOD_PAGE_MAX and any(pattern in content for pattern in FLOOD_PATTERNS)
+
+def is_throttled(response):
+    """请求是否被服务器限流（应减速后重试）"""
+    return response.status_code == 429 or is_flood(response)
+
+def is_congested(response, seconds):
+    """响应是否表明服务器过载或触发了限流；response为None表示请求异常"""
+    if response is None or seconds > SLOW_SECONDS:
+        return True
+    if response.status_code == 429 or response.status_code >= 500:
+        return True
+    retries = getattr(getattr(response.raw, 'retries', None), 'history', None)
+    return bool(retries) or is_flood(response)
+
+def retry_after(response):
+    """Retry-After 头（秒数形式），没有时返回0"""
+    if response is None:
+        return 0
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """AIMD限速器：正常时加性增加速率，拥塞时乘性减小；一次拥塞（例如并发请求同时被限流）
+    只减速一次，减速后的一个请求间隔内的拥塞信号不再重复减速"""
+
+    def __init__(self, rate=RATE_INITIAL, min_rate=RATE_MIN, max_rate=RATE_MAX,
+                 increase=RATE_INCREASE, decrease=RATE_DECREASE):
+        super().__init__(min(max(rate, min_rate), max_rate))
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._cooldown_until = 0.0
+        self._paused_until = 0.0
+        self.stats = {'increases': 0, 'decreases': 0, 'peak_rate': self.rate}
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        super().acquire()
+
+    def observe(self, response, seconds):
+        congested = is_congested(response, seconds)
+        pause = retry_after(response) if congested else 0
+        with self._lock:
+            now = time.monotonic()
+            if pause:
+                self._paused_until = max(self._paused_until, now + pause)
+            if congested:
+                if now >= self._cooldown_until:
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self._cooldown_until = now + pause + 1 / self.rate
+                    self.stats['decreases'] += 1
+                    Metrics.count('rate_decreases')
+            elif self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+                self.stats['increases'] += 1
+                self.stats['peak_rate'] = max(self.stats['peak_rate'], self.rate)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_limiter():
+    """进程内共用的限速器（GetThread*/GetVote*/Pipeline 的所有请求共享同一个速率）"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = AdaptiveRateLimiter() if ADAPTIVE else RateLimiter(RATE_INITIAL)
+        return _shared
@@ -0,0 +1,32 @@
+import csv
+import os
+from itertools import islice
+
+# ====================================================================================
+# 流式行处理：逐行读取CSV、按固定大小分块，内存占用与总行数无关
+# 写入端使用 Storage.write_csv / ProcessJson.write_json，二者都接受生成器
+# ====================================================================================
+CHUNK_SIZE = int(os.environ.get('S1_CHUNK_SIZE', '10000'))  # 需要批量处理时每块的行数
+
+
+def iter_csv(path):
+    """逐行读取CSV，返回 (字段名列表, 行字典生成器)；生成器耗尽后关闭文件"""
+    f = open(path, 'r', encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(f)
+    fieldnames = list(reader.fieldnames or [])
+
+    def rows():
+        with f:
+            yield from reader
+
+    return fieldnames, rows()
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    """把行迭代器切分为若干列表，每块最多size行"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, max(size, 1)))
+        if not chunk:
+            return
+        yield chunk
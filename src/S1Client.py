@@ -0,0 +1,380 @@
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import requests
+import Metrics
+import RateLimiter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ====================================================================================
+# 共享HTTP客户端：连接池、默认超时、带抖动的指数退避重试，以及网页/App API的一次性登录
+# ====================================================================================
+BASE_URL = os.environ.get('S1_BASE_URL', 'https://stage1st.com/2b')
+USERNAME = os.environ.get('S1_USERNAME', '')
+PASSWORD = os.environ.get('S1_PASSWORD', '')
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
+
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "*/*",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Connection": "keep-alive"
+}
+
+TIMEOUT = (5, 20)        # (连接超时, 读取超时) 秒
+POOL_SIZE = 10           # 每个主机保持的最大连接数
+RETRIES = 5              # 5xx/连接重置的最大重试次数
+BACKOFF_FACTOR = 0.5     # 指数退避基数：0.5, 1, 2, 4... 秒，再叠加随机抖动
+RETRY_STATUS = (500, 502, 503, 504)       # 429 由 TimeoutSession 经过限速器重试
+
+# 登录状态缓存：保存论坛cookie与API sid，未过期时跳过登录；设为空字符串可禁用
+SESSION_CACHE = os.environ.get('S1_SESSION_CACHE', '.s1_session.json')
+WEB_TTL = 24 * 3600      # 论坛cookie没有过期时间时（会话cookie）的最长复用时间
+SID_TTL = 24 * 3600      # API sid 的最长复用时间
+LOGOUT_MARKER = 'action=logout'          # 已登录的页面包含退出链接
+SID_REJECTED_MARKERS = ('登录', 'sid')   # API因sid失效拒绝请求时的提示
+# ====================================================================================
+
+
+class JitterRetry(Retry):
+    """在urllib3的指数退避基础上叠加随机抖动，避免多个请求同时重试"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return backoff + random.uniform(0, backoff) if backoff else 0
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        # urllib3默认对带Retry-After的429直接重试；交给 TimeoutSession 经过限速器重试
+        if status_code == 429:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class TimeoutSession(requests.Session):
+    """未显式指定timeout的请求使用默认超时，并把每个请求记录到运行指标
+
+    设置了limiter时每个请求先经过限速器，完成后把响应反馈给限速器（见 RateLimiter）；
+    被限流（429或防刷提示）时在限速器减速后重试（最多 RateLimiter.THROTTLE_RETRIES 次）
+    """
+
+    def __init__(self, timeout=TIMEOUT, limiter=None):
+        super().__init__()
+        self.timeout = timeout
+        self.limiter = limiter
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if not self.limiter:
+            return self._timed_request(method, url, **kwargs)
+        for attempt in range(RateLimiter.THROTTLE_RETRIES + 1):
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self._timed_request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self.limiter.observe(None, time.perf_counter() - start)
+                raise
+            self.limiter.observe(response, time.perf_counter() - start)
+            if not RateLimiter.is_throttled(response):
+                break
+            Metrics.count('throttled_responses')
+        return response
+
+    def _timed_request(self, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.exceptions.RequestException as err:
+            Metrics.record_request(url, time.perf_counter() - start, error=err)
+            raise
+        Metrics.record_request(url, time.perf_counter() - start, response)
+        return response
+
+
+class ClientSession(TimeoutSession):
+    """属于Client的会话：自动替换过期的sid，登录状态被拒绝时重新登录并重试一次"""
+
+    def __init__(self, client, limiter=None):
+        super().__init__(limiter=limiter)
+        self.client = client
+
+    def request(self, method, url, **kwargs):
+        data = kwargs.get('data')
+        sid = data.get('sid') if isinstance(data, dict) else None
+        if sid and self.client.sid and sid != self.client.sid:
+            # 其他线程已经重新登录，直接使用新的sid
+            kwargs['data'] = {**data, 'sid': self.client.sid}
+        response = super().request(method, url, **kwargs)
+
+        if sid and self.client.sid_rejected(url, response):
+            new_sid = self.client.relogin_api(kwargs['data']['sid'])
+            if new_sid:
+                kwargs['data'] = {**data, 'sid': new_sid}
+                response = super().request(method, url, **kwargs)
+        elif method.upper() == 'GET' and self.client.web_rejected(url, response):
+            if self.client.relogin_web():
+                response = super().request(method, url, **kwargs)
+        return response
+
+
+def create_session(pool_size=POOL_SIZE, session=None):
+    """创建带连接池和重试策略的会话"""
+    if session is None:
+        session = TimeoutSession()
+    retry = JitterRetry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        status=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset(['GET', 'POST']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 1), max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def _account_key(username):
+    # 缓存中不保存明文用户名，只用于确认缓存属于当前账号和站点
+    return hashlib.sha256(f"{BASE_URL}\n{username}".encode('utf-8')).hexdigest()
+
+
+class Client:
+    """一个进程共用一个会话；网页登录与API登录各自最多执行一次
+
+    登录状态保存在 SESSION_CACHE 中，缓存未过期时直接复用（不发送登录请求），
+    服务器拒绝缓存的登录状态时才重新登录
+    """
+
+    def __init__(self, username=None, password=None, pool_size=POOL_SIZE, cache_file=None, limiter=None):
+        self.username = USERNAME if username is None else username
+        self.password = PASSWORD if password is None else password
+        self.cache_file = SESSION_CACHE if cache_file is None else cache_file
+        # 默认使用进程内共享的自适应限速器，同一进程中的所有客户端共用一个请求速率
+        limiter = RateLimiter.shared_limiter() if limiter is None else limiter
+        self.session = create_session(pool_size, ClientSession(self, limiter))
+        self.web_logged_in = False
+        self.web_expires = 0
+        self.web_unverified = False     # 网页登录状态来自缓存，尚未被页面确认
+        self.sid = None
+        self.sid_expires = 0
+        self.lock = threading.Lock()
+        self.load_cache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def has_credentials(self):
+        # 检查凭据是否设置
+        if not self.username or not self.password:
+            print("错误：用户名或密码未设置！")
+            return False
+        return True
+
+    def load_cache(self):
+        """读取登录状态缓存，只恢复属于当前账号且未过期的部分"""
+        if not self.cache_file or not self.username or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as err:
+            print(f"读取登录缓存失败，将重新登录: {err}")
+            return
+        if cache.get('account') != _account_key(self.username):
+            return
+
+        now = time.time()
+        if cache.get('web_expires', 0) > now and cache.get('cookies'):
+            for cookie in cache['cookies']:
+                if cookie.get('expires') and cookie['expires'] <= now:
+                    continue
+                self.session.cookies.set(
+                    cookie['name'], cookie['value'],
+                    domain=cookie.get('domain', ''),
+                    path=cookie.get('path', '/'),
+                    expires=cookie.get('expires'),
+                    secure=cookie.get('secure', False)
+                )
+            self.web_logged_in = True
+            self.web_unverified = True
+            self.web_expires = cache['web_expires']
+        if cache.get('sid_expires', 0) > now and cache.get('sid'):
+            self.sid = cache['sid']
+            self.sid_expires = cache['sid_expires']
+        if self.web_logged_in or self.sid:
+            print("已从缓存恢复登录状态")
+
+    def save_cache(self):
+        """安全保存登录状态缓存（临时文件权限为仅当前用户可读写）"""
+        if not self.cache_file:
+            return
+        cookies = [
+            {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'expires': cookie.expires,
+                'secure': cookie.secure
+            }
+            for cookie in self.session.cookies
+        ]
+        cache = {
+            'account': _account_key(self.username),
+            'cookies': cookies if self.web_logged_in else [],
+            'web_expires': self.web_expires if self.web_logged_in else 0,
+            'sid': self.sid,
+            'sid_expires': self.sid_expires if self.sid else 0
+        }
+        temp_file = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                mode='w',
+                encoding='utf-8',
+                dir=os.path.dirname(self.cache_file) or '.',
+                delete=False
+            ) as temp:
+                temp_file = temp.name
+                json.dump(cache, temp)
+            os.replace(temp_file, self.cache_file)
+        except Exception as err:
+            print(f"保存登录缓存失败: {err}")
+            if temp_file and os.path.exists(temp_file):
+                os.unlink(temp_file)
+
+    def _web_expiry(self, now):
+        # Discuz的登录cookie（*_auth）带过期时间时以其为准，否则按会话cookie处理
+        expires = now + WEB_TTL
+        for cookie in self.session.cookies:
+            if cookie.name.endswith('_auth') and cookie.expires:
+                expires = min(expires, cookie.expires)
+        return expires
+
+    def login_web(self):
+        """登录论坛网页（member.php），成功返回True"""
+        if self.web_logged_in:
+            return True
+        if not self.has_credentials():
+            return False
+
+        print("正在尝试登录论坛...")
+        login_url = f"{BASE_URL}/member.php?mod=logging&action=login&loginsubmit=yes"
+        data = {
+            'username': self.username,
+            'password': self.password,
+            'quickforward': 'yes',
+            'handlekey': 'ls'
+        }
+        try:
+            with Metrics.stage('login'):
+                response = self.session.post(login_url, data=data)
+            response.raise_for_status()
+            if 'succeed' in response.text or self.username in response.text:
+                print("论坛登录成功！")
+                self.web_logged_in = True
+                self.web_unverified = False
+                self.web_expires = self._web_expiry(time.time())
+                self.save_cache()
+                return True
+            print("论坛登录失败！请检查用户名和密码。")
+            return False
+        except requests.exceptions.RequestException as e:
+            print(f"论坛登录请求发生错误: {e}")
+            return False
+
+    def login_api(self):
+        """登录App API获取sid，失败返回None"""
+        if self.sid:
+            return self.sid
+        if not self.has_credentials():
+            return None
+
+        print("正在尝试登录API...")
+        payload = {
+            "username": self.username,
+            "password": self.password,
+            "questionid": "0",
+            "answer": ""
+        }
+        try:
+            with Metrics.stage('login'):
+                response = self.session.post(f"{BASE_URL}/api/app/user/login", data=payload)
+            response.raise_for_status()
+            result = response.json()
+
+            if result.get("success") is True:
+                print("✅ API登录成功")
+                self.sid = result['data']['sid']
+                self.sid_expires = time.time() + SID_TTL
+                self.save_cache()
+                return self.sid
+            print("❌ API登录失败")
+            if "message" in result:
+                print(f"原因: {result['message']}")
+            return None
+        except Exception as err:
+            print(f"API登录失败: {err}")
+            return None
+
+    def sid_rejected(self, url, response):
+        """API是否因sid失效拒绝了请求"""
+        if not url.startswith(f"{BASE_URL}/api/app/") or not response.ok:
+            return False
+        try:
+            result = response.json()
+        except ValueError:
+            return False
+        if not isinstance(result, dict) or result.get('success') is True:
+            return False
+        message = str(result.get('message', ''))
+        return any(marker in message for marker in SID_REJECTED_MARKERS)
+
+    def web_rejected(self, url, response):
+        """缓存恢复的论坛登录状态是否已失效；第一个包含退出链接的页面确认登录有效"""
+        if not self.web_unverified or not url.startswith(f"{BASE_URL}/forum.php") or not response.ok:
+            return False
+        if response.status_code == 304:
+            # 条件请求（见 HttpCache）未修改的响应没有正文，无法确认登录状态
+            return False
+        if LOGOUT_MARKER in response.text:
+            self.web_unverified = False
+            return False
+        return True
+
+    def relogin_api(self, rejected_sid):
+        """sid被拒绝时重新登录；并发请求中只有第一个线程真正登录"""
+        with self.lock:
+            if self.sid and self.sid != rejected_sid:
+                return self.sid
+            print("缓存的sid已失效，重新登录API")
+            Metrics.count('relogin_api')
+            self.sid = None
+            return self.login_api()
+
+    def relogin_web(self):
+        """缓存的cookie被拒绝时清除cookie并重新登录"""
+        with self.lock:
+            if not self.web_unverified:
+                return self.web_logged_in
+            print("缓存的论坛登录状态已失效，重新登录")
+            Metrics.count('relogin_web')
+            self.session.cookies.clear()
+            self.web_logged_in = False
+            self.web_unverified = False
+            return self.login_web()
@@ -0,0 +1,164 @@
+import json
+import os
+import unicodedata
+from itertools import accumulate
+
+# ====================================================================================
+# 标题/别名搜索索引：导出时构建，作为独立文件发布（search.min.json）
+#   规范化：NFKC + casefold，只保留字母、数字和CJK字符（"Re:Zero" 与 "rezero" 等价）
+#   索引：规范化文本的相邻二字（bigram）倒排表，中日文无需分词即可做子串匹配；另对每个标题/别名的
+#         前1~2个字建立前缀倒排表（键以 ^ 开头）。倒排表使用差值编码。不为单字建立倒排表，
+#         前缀只取两个字（更长的前缀与bigram倒排表大小相当）
+#   查询：标题/别名以查询串开头的结果排在前面（来自前缀倒排表，查询串超过两个字时再校验），
+#         其余结果取查询串中最短的bigram倒排表作为候选，再做子串校验；单字查询的其余结果扫描 texts。
+#         给出 limit 时找够即返回，结果与线性扫描一致
+# ====================================================================================
+INDEX_FILE = os.environ.get('S1_SEARCH_INDEX', '')  # 索引输出文件，为空时不生成
+INDEX_VERSION = 3
+SEPARATOR = '\x1f'  # 连接同一帖子的标题与别名；规范化后的查询串不会包含该字符
+PREFIX = '^'        # 前缀倒排表的键前缀（不是字母数字，不会与普通词元冲突）
+PREFIX_LENGTH = 2   # 前缀倒排表覆盖的最大长度
+
+
+def normalize(text):
+    """规范化文本：全角转半角、统一大小写，去掉空白和标点"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return ''.join(char for char in text if char.isalnum())
+
+def grams(text):
+    """文本的bigram以及前缀词元集合"""
+    result = {text[i:i + 2] for i in range(len(text) - 1)}
+    result.update(PREFIX + text[:i] for i in range(1, min(len(text), PREFIX_LENGTH) + 1))
+    return result
+
+def row_texts(row):
+    """参与搜索的文本：标题以及别名（aliases为列表或分号分隔的字符串）"""
+    aliases = row.get('aliases') or []
+    if isinstance(aliases, str):
+        aliases = aliases.split(';')
+    texts = [normalize(row.get('title', ''))] + [normalize(alias) for alias in aliases]
+    return [text for text in texts if text]
+
+
+class IndexBuilder:
+    """随JSON导出逐行接收数据，结束时写出索引文件"""
+
+    def __init__(self):
+        self.tids = []
+        self.texts = []
+        self.postings = {}
+
+    def add(self, row):
+        doc = len(self.tids)
+        texts = row_texts(row)
+        self.tids.append(str(row.get('tid', '')))
+        self.texts.append(SEPARATOR.join(texts))
+        for gram in set().union(*(grams(text) for text in texts)):
+            self.postings.setdefault(gram, []).append(doc)
+
+    def to_json(self):
+        """序列化为紧凑JSON：倒排表使用差值编码"""
+        encoded = {}
+        for gram in sorted(self.postings):
+            docs = self.postings[gram]
+            encoded[gram] = [docs[0]] + [b - a for a, b in zip(docs, docs[1:])]
+        index = {
+            'version': INDEX_VERSION,
+            'tids': self.tids,
+            'texts': self.texts,
+            'grams': encoded
+        }
+        return json.dumps(index, ensure_ascii=False, separators=(',', ':'))
+
+    def write(self, path=INDEX_FILE):
+        """写出索引文件（内容未变化时不重写），返回是否写入"""
+        content = self.to_json()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                if f.read() == content:
+                    print(f"搜索索引无变化: {path}")
+                    return False
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        print(f"已生成搜索索引: {path}（{len(self.tids)} 条，{len(self.postings)} 个词元）")
+        return True
+
+
+class SearchIndex:
+    """加载索引文件并回答查询"""
+
+    def __init__(self, tids, texts, postings):
+        self.tids = tids
+        self.texts = texts
+        self.encoded = postings   # 差值编码的倒排表，查询时按需解码
+        self.decoded = {}
+
+    @classmethod
+    def load(cls, path='search.min.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != INDEX_VERSION:
+            raise ValueError(f"不支持的索引版本: {index.get('version')}")
+        return cls(index['tids'], index['texts'], index['grams'])
+
+    @classmethod
+    def build(cls, rows):
+        """直接从行构建内存中的索引（不经过文件）"""
+        builder = IndexBuilder()
+        for row in rows:
+            builder.add(row)
+        return cls.loads(builder.to_json())
+
+    @classmethod
+    def loads(cls, content):
+        index = json.loads(content)
+        return cls(index['tids'], index['texts'], index['grams'])
+
+    def _postings(self, gram):
+        docs = self.decoded.get(gram)
+        if docs is None:
+            docs = list(accumulate(self.encoded.get(gram, ())))
+            self.decoded[gram] = docs
+        return docs
+
+    def _candidates(self, query):
+        """包含查询串的帖子（按导出顺序逐个产生）：单字查询扫描全部文本，否则取查询串中最稀有的bigram的
+        倒排表，查询串超过两个字时再做子串校验"""
+        if len(query) == 1:
+            return (doc for doc, text in enumerate(self.texts) if query in text)
+        docs = min((self._postings(query[i:i + 2]) for i in range(len(query) - 1)), key=len)
+        if len(query) == 2:
+            return docs
+        return (doc for doc in docs if query in self.texts[doc])
+
+    def _prefix_matches(self, query, limit=None):
+        """标题或别名以查询串开头的帖子（给出 limit 时最多找 limit 个）"""
+        docs = self._postings(PREFIX + query[:PREFIX_LENGTH])
+        if len(query) <= PREFIX_LENGTH:
+            return docs
+        matches = []
+        for doc in docs:
+            if self.texts[doc].startswith(query) or SEPARATOR + query in self.texts[doc]:
+                matches.append(doc)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+    def search(self, query, limit=None):
+        """返回标题或别名包含查询串的tid列表：前缀匹配在前，其余按导出顺序"""
+        query = normalize(query)
+        if not query:
+            return []
+        prefix = self._prefix_matches(query, limit)
+        if limit is not None and len(prefix) >= limit:
+            return [self.tids[doc] for doc in prefix[:limit]]
+
+        results = [self.tids[doc] for doc in prefix]
+        prefix = set(prefix)
+        for doc in self._candidates(query):
+            if doc in prefix:
+                continue
+            results.append(self.tids[doc])
+            if limit is not None and len(results) >= limit:
+                break
+        return results
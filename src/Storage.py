@@ -0,0 +1,228 @@
+import csv
+import os
+import sqlite3
+import tempfile
+
+# ====================================================================================
+# 存储层：CSV（默认）与 SQLite 两种后端，提供统一的读取/按tid查询/就地更新接口
+# S1_DATABASE 指向 .sqlite/.db 文件时使用 SQLite，database.csv 作为导出文件生成
+# ====================================================================================
+DATABASE = os.environ.get('S1_DATABASE', 'database.csv')
+CSV_EXPORT = 'database.csv'
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def _quote(name):
+    """把字段名（来自CSV表头）作为SQL标识符引用：双引号包围，内部的双引号加倍"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _tid(tid):
+    """tid转为整数主键；不是纯数字时返回None（这些行无法存入SQLite）"""
+    tid = _text(tid).strip()
+    return int(tid) if tid.isdecimal() else None
+
+
+def write_csv(path, fieldnames, rows):
+    """安全写入CSV文件（使用临时文件），返回写入的字节数"""
+    temp_file = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode='w',
+            encoding='utf-8-sig',
+            newline='',
+            dir=os.path.dirname(path) or '.',
+            delete=False
+        ) as temp:
+            temp_file = temp.name
+            writer = csv.DictWriter(temp, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_file, path)
+        return os.path.getsize(path)
+    except Exception:
+        if temp_file and os.path.exists(temp_file):
+            os.unlink(temp_file)
+        raise
+
+
+class CsvStorage:
+    """以 database.csv 为唯一存储：读取整个文件，写入时整体重写
+
+    CSV无法就地修改，所有写入（包括 update_rows）都有意整体重写文件：每次运行只写一次，
+    需要按tid就地更新时请使用 SqliteStorage
+    """
+
+    def __init__(self, path=CSV_EXPORT):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def read(self):
+        """返回 (字段名列表, 行字典列表)"""
+        with open(self.path, 'r', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            return list(reader.fieldnames or []), list(reader)
+
+    def get(self, tid):
+        return self.get_rows([tid]).get(tid)
+
+    def get_rows(self, tids):
+        """返回 tid -> 行字典（需要读取整个文件）"""
+        wanted = set(tids)
+        fieldnames, rows = self.read()
+        return {row['tid']: row for row in rows if row.get('tid') in wanted}
+
+    def update_rows(self, updates):
+        """按tid更新部分字段：updates为 tid -> {字段: 值}，返回更新的行数（读取并整体重写文件）"""
+        fieldnames, rows = self.read()
+        updated = 0
+        for row in rows:
+            fields = updates.get(row.get('tid'))
+            if fields:
+                for key in fields:
+                    if key not in fieldnames:
+                        fieldnames.append(key)
+                row.update(fields)
+                updated += 1
+        write_csv(self.path, fieldnames, rows)
+        return updated
+
+    def write(self, fieldnames, rows, dirty_tids=None):
+        """写回所有行（CSV无法就地更新，dirty_tids被忽略），返回写入的字节数"""
+        return write_csv(self.path, fieldnames, rows)
+
+    def size(self):
+        return os.path.getsize(self.path) if self.exists() else 0
+
+    def close(self):
+        pass
+
+
+class SqliteStorage:
+    """以tid为主键的SQLite存储：支持按tid查询和就地更新，CSV仅作为导出文件"""
+
+    def __init__(self, path, csv_path=CSV_EXPORT):
+        self.path = path
+        self.csv_path = csv_path
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS fields (pos INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS threads (tid INTEGER PRIMARY KEY)')
+        if is_new and os.path.exists(csv_path):
+            # 首次使用时从现有CSV导入
+            fieldnames, rows = CsvStorage(csv_path).read()
+            self.write(fieldnames, rows)
+            print(f"已从 {csv_path} 导入 {len(rows)} 条记录到 {path}")
+
+    def exists(self):
+        return bool(self.fieldnames())
+
+    def fieldnames(self):
+        return [name for (name,) in self.conn.execute('SELECT name FROM fields ORDER BY pos')]
+
+    def _columns(self):
+        return {info[1] for info in self.conn.execute('PRAGMA table_info(threads)')}
+
+    def _ensure_columns(self, fieldnames):
+        """同步字段顺序表，并为threads表补充缺失的列"""
+        columns = self._columns()
+        for name in fieldnames:
+            if name != 'tid' and name not in columns:
+                self.conn.execute(f"ALTER TABLE threads ADD COLUMN {_quote(name)} TEXT NOT NULL DEFAULT ''")
+        if fieldnames != self.fieldnames():
+            self.conn.execute('DELETE FROM fields')
+            self.conn.executemany('INSERT INTO fields (pos, name) VALUES (?, ?)', enumerate(fieldnames))
+
+    def _row(self, names, values):
+        row = dict(zip(names, values))
+        row['tid'] = str(row['tid'])
+        return row
+
+    def read(self):
+        """返回 (字段名列表, 按tid从大到小排序的行字典列表)"""
+        fieldnames = self.fieldnames()
+        quoted = ', '.join(map(_quote, fieldnames))
+        cursor = self.conn.execute(f'SELECT {quoted} FROM threads ORDER BY tid DESC')
+        return fieldnames, [self._row(fieldnames, values) for values in cursor]
+
+    def get(self, tid):
+        """按tid查询单行（tid不是数字时返回None）"""
+        key = _tid(tid)
+        if key is None:
+            return None
+        names = ['tid'] + [name for name in self.fieldnames() if name != 'tid']
+        quoted = ', '.join(map(_quote, names))
+        values = self.conn.execute(f'SELECT {quoted} FROM threads WHERE tid = ?', (key,)).fetchone()
+        return self._row(names, values) if values else None
+
+    def get_rows(self, tids):
+        """逐个按主键查询，返回 tid -> 行字典"""
+        rows = {}
+        for tid in tids:
+            row = self.get(tid)
+            if row:
+                rows[tid] = row
+        return rows
+
+    def update_rows(self, updates):
+        """按tid就地更新部分字段：updates为 tid -> {字段: 值}，返回更新的行数（跳过不是数字的tid）"""
+        updated = 0
+        with self.conn:
+            fieldnames = self.fieldnames()
+            new_fields = [key for fields in updates.values() for key in fields if key not in fieldnames]
+            if new_fields:
+                self._ensure_columns(fieldnames + list(dict.fromkeys(new_fields)))
+            for tid, fields in updates.items():
+                key = _tid(tid)
+                if key is None or not fields:
+                    continue
+                assignments = ', '.join(f'{_quote(name)} = ?' for name in fields)
+                cursor = self.conn.execute(
+                    f'UPDATE threads SET {assignments} WHERE tid = ?',
+                    [_text(value) for value in fields.values()] + [key]
+                )
+                updated += cursor.rowcount
+        return updated
+
+    def write(self, fieldnames, rows, dirty_tids=None):
+        """写入行：给出dirty_tids时只插入/更新这些tid对应的行，返回写入的行数（跳过不是数字的tid）"""
+        if dirty_tids is not None:
+            rows = [row for row in rows if row.get('tid') in dirty_tids]
+        keyed = [(_tid(row.get('tid')), row) for row in rows]
+        skipped = sum(1 for key, _ in keyed if key is None)
+        if skipped:
+            print(f"跳过 {skipped} 行tid不是数字的记录")
+        names = [name for name in fieldnames if name != 'tid']
+        quoted = ', '.join(map(_quote, ['tid'] + names))
+        placeholders = ', '.join('?' for _ in range(len(names) + 1))
+        with self.conn:
+            self._ensure_columns(fieldnames)
+            self.conn.executemany(
+                f'INSERT OR REPLACE INTO threads ({quoted}) VALUES ({placeholders})',
+                ([key] + [_text(row.get(name)) for name in names]
+                 for key, row in keyed if key is not None)
+            )
+        return len(rows) - skipped
+
+    def export_csv(self, path=None):
+        """导出为CSV文件，返回写入的字节数"""
+        fieldnames, rows = self.read()
+        return write_csv(path or self.csv_path, fieldnames, rows)
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def close(self):
+        self.conn.close()
+
+
+def open_storage(path=DATABASE):
+    """根据文件扩展名选择存储后端"""
+    if path.endswith(('.sqlite', '.sqlite3', '.db')):
+        return SqliteStorage(path)
+    return CsvStorage(path)
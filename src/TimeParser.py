@@ -0,0 +1,93 @@
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+# ====================================================================================
+# Discuz 时间解析：列表页和数据库中的时间都是北京时间（UTC+8），统一转换为整数时间戳（秒）
+#   绝对时间: 2026-8-15 17:48、2026-08-15 17:48:05、2026-8-15（月/日/时可不补零）
+#   相对时间: 刚刚、N 秒前、N 分钟前、半小时前、N 小时前、N 天前、昨天 17:48、前天 17:48
+#            （相对于 now 计算；列表页中近期的时间通常在 title 属性中另有绝对时间）
+# 绝对时间按字符串缓存（同一页中大量重复的日期、数据库中逐行回填时只需解析一次）
+# 数据库中 post_ts / last_reply_ts 列保存发帖时间和最后回复时间的时间戳（未知时为空），
+# 排序和时间窗口判断直接比较整数；post_time 列保留原始字符串
+# ====================================================================================
+TZ = timezone(timedelta(hours=8))   # Asia/Shanghai（1991年后没有夏令时）
+COLUMNS = ('post_ts', 'last_reply_ts')
+
+ABSOLUTE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})(?:\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?)?$')
+RELATIVE = re.compile(r'(\d+|半)\s*(秒|分钟|小时|天)前$')
+DAY_CLOCK = re.compile(r'(今天|昨天|前天)\s*(\d{1,2}):(\d{1,2})$')
+UNIT_SECONDS = {'秒': 1, '分钟': 60, '小时': 3600, '天': 86400}
+DAYS_AGO = {'今天': 0, '昨天': 1, '前天': 2}
+
+
+def _clean(text):
+    # &nbsp; 在 get_text 后为 \xa0
+    return text.replace('\xa0', ' ').strip()
+
+@lru_cache(maxsize=65536)
+def parse_absolute(text):
+    """解析绝对时间，返回时间戳；不是绝对时间时返回None"""
+    match = ABSOLUTE.match(_clean(text))
+    if not match:
+        return None
+    year, month, day, hour, minute, second = (int(group) if group else 0 for group in match.groups())
+    try:
+        return int(datetime(year, month, day, hour, minute, second, tzinfo=TZ).timestamp())
+    except ValueError:
+        return None
+
+def parse_relative(text, now=None):
+    """解析相对时间（相对于时间戳now，默认为当前时间），返回时间戳；不是相对时间时返回None"""
+    text = _clean(text)
+    now = time.time() if now is None else now
+    if text == '刚刚':
+        return int(now)
+    match = RELATIVE.match(text)
+    if match:
+        amount = 0.5 if match.group(1) == '半' else int(match.group(1))
+        return int(now - amount * UNIT_SECONDS[match.group(2)])
+    match = DAY_CLOCK.match(text)
+    if match:
+        day = datetime.fromtimestamp(now, TZ) - timedelta(days=DAYS_AGO[match.group(1)])
+        moment = day.replace(hour=int(match.group(2)), minute=int(match.group(3)), second=0, microsecond=0)
+        return int(moment.timestamp())
+    return None
+
+def parse(text, now=None):
+    """解析Discuz时间字符串，返回整数时间戳；为空或无法识别时返回None"""
+    if not text:
+        return None
+    timestamp = parse_absolute(text)
+    if timestamp is None:
+        timestamp = parse_relative(text, now)
+    return timestamp
+
+def format_time(timestamp):
+    """时间戳 -> 与Discuz相同的 2026-8-15 17:48 格式（北京时间）"""
+    moment = datetime.fromtimestamp(timestamp, TZ)
+    return f"{moment.year}-{moment.month}-{moment.day} {moment.hour:02d}:{moment.minute:02d}"
+
+def _column(timestamp):
+    # CSV中未知的时间为空字符串
+    return '' if timestamp is None else str(timestamp)
+
+def thread_timestamps(thread, now=None):
+    """列表页解析出的帖子 -> {'post_ts': ..., 'last_reply_ts': ...}（CSV中的字符串形式）"""
+    return {
+        'post_ts': _column(parse(thread.get('post_time', ''), now)),
+        'last_reply_ts': _column(parse(thread.get('last_reply', ''), now))
+    }
+
+def fill_post_ts(rows):
+    """为post_ts列为空的行（添加该列之前的数据）按post_time回填，返回回填的tid列表"""
+    filled = []
+    for row in rows:
+        if row.get('post_ts') or not row.get('post_time'):
+            continue
+        timestamp = parse_absolute(row['post_time'])
+        if timestamp is not None:
+            row['post_ts'] = str(timestamp)
+            filled.append(row.get('tid'))
+    return filled
@@ -0,0 +1,62 @@
+import re
+
+# ====================================================================================
+# 标题解析：板块标题的格式为 [年.月] [类别.集数] 标题／别名1／别名2
+# 预编译的模式依次尝试（绝大多数标题命中第一个）：
+#   standard : [2025.7] [TV.12] 标题／别名      月份和集数可带前导零，方括号之间的空格可省略
+#   relaxed  : 【2025.07】【TV.12】标题          全角方括号/句点，日期写作 2025-7、2025/7、2025年7月，
+#              [2025.7] [MOV] 标题              或者没有集数（剧场版等）
+# 标题与别名按第一个全角“／”或半角“/”分开，与原来的解析规则相同（Fate/stay night 的标题为 Fate）：
+# 解析成功的行title列被替换为纯标题、原始标题不再保存，已有的行无法按新规则重新解析，
+# 因此纯标题必须与原规则一致；原规则丢弃的其余部分按同样的分隔符拆分为别名，以分号连接
+# （与 aliases 列的格式一致）
+# 解析成功的行year列不再为空，以后不会再被解析；每次运行只解析新帖子和此前解析失败的行
+# ====================================================================================
+
+# 解析结果依次对应的列（title为去掉前缀和别名后的纯标题）
+FIELDS = ('title', 'aliases', 'year', 'month', 'category', 'ep')
+
+# 分组依次为 年、月、类别、集数、纯标题（到第一个斜杠为止），斜杠之后的部分为别名
+STANDARD = re.compile(r'\[(\d{4})\.(\d{1,2})\]\s*\[([^.\]]+)\.(\d+)\]\s*([^／/]+)')
+RELAXED = re.compile(
+    r'\s*[\[【]\s*(\d{4})\s*(?:[.．\-/]|年)\s*(\d{1,2})\s*月?\s*[\]】]'
+    r'\s*[\[【]\s*([^.．\]】\s]+)\s*(?:[.．]\s*(\d+)\s*)?[\]】]\s*([^／/]+)')
+ALIAS_SEPARATOR = re.compile(r'\s*[／/]\s*')
+
+
+def failed(title):
+    """解析失败的结果：保留原标题，其余列为空"""
+    return (title, '', '', '', '', '')
+
+def parse(title):
+    """解析一个原始标题，返回按 FIELDS 排列的元组；不匹配任何模式时返回 failed(title)"""
+    # 先试标准格式，只有不匹配时才用宽松的模式
+    match = STANDARD.match(title) or RELAXED.match(title)
+    if not match:
+        return failed(title)
+    year, month, category, ep, name = match.groups()
+    rest = title[match.end():].strip()
+    return (
+        name.strip(),
+        ';'.join(filter(None, ALIAS_SEPARATOR.split(rest))) if rest else '',
+        year,
+        month.lstrip('0') or '0',   # 去掉前导零，"00" 视为 "0"
+        category,
+        (ep.lstrip('0') or '0') if ep else ''
+    )
+
+
+def needs_parse(row):
+    """year列为空的行（新帖子或此前解析失败的帖子）需要解析"""
+    return row.get('year', '') == ''
+
+def parse_rows(rows):
+    """批量解析字典形式的行（仅 needs_parse 的行），就地写入 FIELDS 各列，返回解析的行数"""
+    parsed = 0
+    for row in rows:
+        if not needs_parse(row):
+            continue
+        for field, value in zip(FIELDS, parse(row['title'])):
+            row[field] = value
+        parsed += 1
+    return parsed
@@ -0,0 +1,258 @@
+import os
+import tempfile
+
+import PollSchedule
+
+# ====================================================================================
+# 投票历史：只追加的二进制文件，每次运行只记录投票发生变化的帖子
+#
+# 文件 = 文件头 MAGIC + 若干数据块，每个数据块为 类型(1字节) + 负载长度(varint) + 负载
+#   RUN 块（每次运行追加一个）：时间戳, 条数, 然后按tid升序每条为
+#          tid差值, 五个选项相对该帖子上一次记录的票数差值(zigzag)
+#   COMPACTED 块（空负载）：标记压缩的位置，之后的RUN块才计入下一次压缩
+# 所有整数使用varint（LEB128）编码；未知类型的块读取时跳过，便于以后扩展格式
+# 上次压缩后追加的RUN块累计到 COMPACT_EVERY 个时自动压缩：超过 DAILY_AFTER_DAYS 天的记录
+# 每个帖子每天只保留最后一个点，然后按时间戳重新合并为RUN块（同一时间戳只存一次）
+# ====================================================================================
+HISTORY_FILE = os.environ.get('S1_VOTE_HISTORY', 'vote_history.bin')
+COMPACT_EVERY = 50        # 累计多少个RUN块后压缩
+DAILY_AFTER_DAYS = 90     # 压缩时对早于该天数的点按天抽稀
+
+MAGIC = b'S1VH\x01'
+RUN = 1
+COMPACTED = 2
+DAY = 86400
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+class _Reader:
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+
+    def varint(self):
+        result = 0
+        shift = 0
+        data = self.data
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def signed(self):
+        return _unzigzag(self.varint())
+
+
+def _encode_votes(out, votes, previous):
+    for v, p in zip(votes, previous):
+        _write_varint(out, _zigzag(v - p))
+
+def _decode_votes(reader, previous):
+    return tuple(p + reader.signed() for p in previous)
+
+def _block(kind, payload):
+    out = bytearray([kind])
+    _write_varint(out, len(payload))
+    return bytes(out) + bytes(payload)
+
+def _encode_run(timestamp, changes, last):
+    """编码一个RUN块的负载（changes: tid -> 票数），同时更新last"""
+    payload = bytearray()
+    _write_varint(payload, int(timestamp))
+    _write_varint(payload, len(changes))
+    previous_tid = 0
+    for tid in sorted(changes):
+        votes = changes[tid]
+        _write_varint(payload, tid - previous_tid)
+        _encode_votes(payload, votes, last.get(tid, (0,) * 5))
+        last[tid] = votes
+        previous_tid = tid
+    return payload
+
+def scan_blocks(data):
+    """只读取块头，返回 (上次压缩后的RUN块数量, 完整数据块的结束位置)；末尾不完整的块不计入"""
+    if not data:
+        return 0, 0
+    if not data.startswith(MAGIC):
+        raise ValueError("不是投票历史文件")
+    runs = 0
+    reader = _Reader(data, len(MAGIC))
+    valid = reader.pos
+    while reader.pos < len(data):
+        kind = data[reader.pos]
+        reader.pos += 1
+        try:
+            end = reader.varint()
+        except IndexError:
+            break
+        end += reader.pos
+        if end > len(data):
+            break
+        reader.pos = valid = end
+        runs = 0 if kind == COMPACTED else runs + (kind == RUN)
+    return runs, valid
+
+def iter_points(data):
+    """按文件顺序逐个产出 (tid, 时间戳, 五个票数)"""
+    if not data:
+        return
+    if not data.startswith(MAGIC):
+        raise ValueError("不是投票历史文件")
+    last = {}
+    reader = _Reader(data, len(MAGIC))
+    while reader.pos < len(data):
+        kind = data[reader.pos]
+        reader.pos += 1
+        end = reader.varint()
+        end += reader.pos
+        if kind == RUN:
+            timestamp = reader.varint()
+            tid = 0
+            for _ in range(reader.varint()):
+                tid += reader.varint()
+                votes = _decode_votes(reader, last.get(tid, (0,) * 5))
+                last[tid] = votes
+                yield tid, timestamp, votes
+        reader.pos = end  # 跳过未知类型的块
+
+
+def _thin(points, cutoff):
+    """早于cutoff的点每天只保留最后一个（按UTC日期）"""
+    kept = []
+    for point in points:
+        timestamp = point[0]
+        if (kept and kept[-1][0] < cutoff and timestamp < cutoff
+                and kept[-1][0] // DAY == timestamp // DAY):
+            kept[-1] = point
+        else:
+            kept.append(point)
+    return kept
+
+
+class VoteHistory:
+    """投票历史存储：load 后用 record_row 记录本次抓取结果，commit 追加一个RUN块"""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.enabled = True
+        self.last = {}          # tid -> 最近一次记录的五个票数
+        self.pending = {}       # 本次运行发生变化的 tid -> 票数
+        self.runs = 0           # 上次压缩后的RUN块数量
+        self.valid_size = 0     # 文件中完整数据块的结束位置
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            self.runs, self.valid_size = scan_blocks(data)
+            for tid, timestamp, votes in iter_points(data[:self.valid_size]):
+                self.last[tid] = votes
+        except (OSError, ValueError, IndexError) as err:
+            # 文件损坏时不再追加，避免在损坏的数据后继续写入
+            print(f"读取投票历史失败，本次不记录投票历史: {err}")
+            self.enabled = False
+        return self
+
+    def record(self, tid, votes):
+        """记录一个帖子的当前票数，与上一次记录相同时忽略"""
+        tid = int(tid)
+        votes = tuple(int(v or 0) for v in votes)
+        if self.pending.get(tid, self.last.get(tid)) != votes:
+            self.pending[tid] = votes
+
+    def record_row(self, row):
+        """记录一行的投票数据；临时性错误（网络/HTTP）时票数不可信，跳过"""
+        tid = row.get('tid')
+        message = str(row.get('message', '') or '')
+        if not tid or message.startswith(PollSchedule.TRANSIENT_ERROR_PREFIXES):
+            return
+        try:
+            self.record(tid, [row.get(f'votes{i}') for i in range(1, 6)])
+        except (TypeError, ValueError):
+            pass
+
+    def commit(self, timestamp):
+        """把本次变化追加为一个RUN块，返回记录的帖子数"""
+        if not self.pending or not self.enabled:
+            return 0
+        payload = _encode_run(timestamp, self.pending, self.last)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        with open(self.path, 'r+b' if size else 'wb') as f:
+            if size > self.valid_size:
+                # 上次写入中断留下的不完整数据块
+                print(f"投票历史末尾有 {size - self.valid_size} 字节不完整数据，已截断")
+                f.truncate(self.valid_size)
+            f.seek(0, os.SEEK_END)
+            if not self.valid_size:
+                f.write(MAGIC)
+            f.write(_block(RUN, payload))
+            self.valid_size = f.tell()
+        count = len(self.pending)
+        self.pending = {}
+        self.runs += 1
+        print(f"投票历史: 记录 {count} 个帖子的变化（{len(payload)} 字节）")
+        if self.runs >= COMPACT_EVERY:
+            self.compact(timestamp)
+        return count
+
+    def compact(self, now, daily_after_days=DAILY_AFTER_DAYS):
+        """对旧记录按天抽稀，并把所有记录按时间戳重新合并为RUN块"""
+        with open(self.path, 'rb') as f:
+            data = f.read()[:self.valid_size]
+        series = {}
+        for tid, timestamp, votes in iter_points(data):
+            series.setdefault(tid, []).append((timestamp, votes))
+
+        cutoff = now - daily_after_days * DAY
+        runs = {}
+        for tid, points in series.items():
+            for timestamp, votes in _thin(sorted(points, key=lambda point: point[0]), cutoff):
+                runs.setdefault(timestamp, {})[tid] = votes
+
+        last = {}
+        blocks = [MAGIC]
+        for timestamp in sorted(runs):
+            blocks.append(_block(RUN, _encode_run(timestamp, runs[timestamp], last)))
+        blocks.append(_block(COMPACTED, b''))
+        content = b''.join(blocks)
+
+        temp_file = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.path) or '.', delete=False) as temp:
+                temp_file = temp.name
+                temp.write(content)
+            os.replace(temp_file, self.path)
+        except Exception:
+            if temp_file and os.path.exists(temp_file):
+                os.unlink(temp_file)
+            raise
+        self.runs = 0
+        self.valid_size = len(content)
+        print(f"投票历史已压缩: {len(data)} -> {len(content)} 字节，{len(series)} 个帖子，{len(runs)} 个时间点")
+
+def get_curve(tid, path=HISTORY_FILE):
+    """返回一个帖子的投票曲线：按时间排序的 (时间戳, (votes1..votes5)) 列表"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    data = data[:scan_blocks(data)[1]]
+    tid = int(tid)
+    curve = [(timestamp, votes) for point_tid, timestamp, votes in iter_points(data) if point_tid == tid]
+    return sorted(curve, key=lambda point: point[0])